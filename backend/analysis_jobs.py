@@ -0,0 +1,305 @@
+"""
+Asynchronous wallet analysis jobs for SoReL
+Analyses can be enqueued in the analysis_jobs collection and answered
+right away with a job id. Workers in any server process claim queued jobs
+with a lease they renew while the analysis runs, so a crashed worker's
+jobs are picked up again, until a job has used up its attempts. Clients
+poll or long-poll the job for its result.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from rate_limiter import RateLimitedError, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_JOB_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', '4'))
+ANALYSIS_JOB_LEASE_SECONDS = int(os.environ.get('ANALYSIS_JOB_LEASE_SECONDS', '120'))
+ANALYSIS_JOB_MAX_ATTEMPTS = int(os.environ.get('ANALYSIS_JOB_MAX_ATTEMPTS', '3'))
+ANALYSIS_JOB_RETENTION_SECONDS = int(os.environ.get('ANALYSIS_JOB_RETENTION_SECONDS', '86400'))
+# Rate-limited jobs wait before they can be claimed again, doubling per attempt
+ANALYSIS_JOB_RETRY_BASE_SECONDS = float(os.environ.get('ANALYSIS_JOB_RETRY_BASE_SECONDS', '5'))
+ANALYSIS_JOB_RETRY_MAX_SECONDS = float(os.environ.get('ANALYSIS_JOB_RETRY_MAX_SECONDS', '120'))
+
+# Idle workers check Mongo this often for jobs enqueued by other processes
+POLL_SECONDS = 1.0
+
+ACTIVE_STATUSES = ['queued', 'running']
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class AnalysisJobQueue:
+    """Mongo-backed job queue with leased claims and long-polling"""
+
+    def __init__(
+        self,
+        db,
+        run: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        workers: int = ANALYSIS_JOB_WORKERS,
+        lease_seconds: int = ANALYSIS_JOB_LEASE_SECONDS,
+        max_attempts: int = ANALYSIS_JOB_MAX_ATTEMPTS
+    ):
+        self.db = db
+        self.run = run
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Each worker claims as <process_id>-<n>
+        self.process_id = uuid.uuid4().hex
+        self._wakeup = asyncio.Event()
+        # One event per long-poll waiter, removed when the waiter returns
+        self._waiters: Dict[str, Set[asyncio.Event]] = {}
+        self._swept_at = 0.0
+        self.enqueued = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    async def enqueue(self, wallet_address: str, force: bool = False, backfill: bool = False) -> Dict[str, Any]:
+        """Queue an analysis, or return the job already active for this wallet
+
+        A forced analysis only coalesces with another forced one; an active
+        unforced job may answer from the freshness cache. Concurrent
+        enqueues race on the unique index over active jobs, and the loser
+        returns the winner's job.
+        """
+        query = {"wallet_address": wallet_address, "status": {"$in": ACTIVE_STATUSES}, "backfill": backfill}
+        if force:
+            query["force"] = True
+        while True:
+            active = await self.db.analysis_jobs.find_one(query, {"_id": 0})
+            if active is not None:
+                self.coalesced += 1
+                return active
+
+            job = {
+                "job_id": str(uuid.uuid4()),
+                "wallet_address": wallet_address,
+                "force": force,
+                "backfill": backfill,
+                "status": "queued",
+                "attempts": 0,
+                "not_before": None,
+                "created_at": _now().isoformat(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None
+            }
+            try:
+                await self.db.analysis_jobs.insert_one(dict(job))
+                break
+            except DuplicateKeyError:
+                # Another request queued this wallet first; look it up again
+                continue
+
+        self.enqueued += 1
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.analysis_jobs.find_one({"job_id": job_id}, {"_id": 0})
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: return the job once finished or when the timeout expires"""
+        deadline = asyncio.get_running_loop().time() + timeout
+        # Jobs finished in this process wake the waiter immediately;
+        # jobs run elsewhere are picked up on the next poll
+        event = asyncio.Event()
+        self._waiters.setdefault(job_id, set()).add(event)
+        try:
+            while True:
+                job = await self.get(job_id)
+                if job is None or job['status'] not in ACTIVE_STATUSES:
+                    return job
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=min(remaining, POLL_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            waiters = self._waiters.get(job_id)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    del self._waiters[job_id]
+
+    async def _fail_exhausted(self, now: datetime):
+        """Fail jobs whose workers died on every attempt, instead of claiming them forever"""
+        exhausted = await self.db.analysis_jobs.update_many(
+            {
+                "status": "running",
+                "lease_expires_at": {"$lt": now.isoformat()},
+                "attempts": {"$gte": self.max_attempts}
+            },
+            {
+                "$set": {
+                    "status": "failed",
+                    "error": f"Worker lost on all {self.max_attempts} attempts",
+                    "finished_at": now.isoformat(),
+                    "expires_at": now + timedelta(seconds=ANALYSIS_JOB_RETENTION_SECONDS)
+                },
+                "$unset": {"lease_expires_at": ""}
+            }
+        )
+        if exhausted.modified_count:
+            self.failed += exhausted.modified_count
+            logger.error(f"Failed {exhausted.modified_count} analysis jobs after {self.max_attempts} lost attempts")
+
+    async def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Take the oldest due queued job, or one whose worker's lease ran out
+
+        Jobs that have used up their attempts are never claimed again.
+        """
+        now = _now()
+        if time.monotonic() - self._swept_at >= POLL_SECONDS:
+            self._swept_at = time.monotonic()
+            await self._fail_exhausted(now)
+
+        return await self.db.analysis_jobs.find_one_and_update(
+            {
+                "attempts": {"$lt": self.max_attempts},
+                "$and": [
+                    {"$or": [
+                        {"status": "queued"},
+                        {"status": "running", "lease_expires_at": {"$lt": now.isoformat()}}
+                    ]},
+                    {"$or": [
+                        {"not_before": None},
+                        {"not_before": {"$lte": now.isoformat()}}
+                    ]}
+                ]
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": worker_id,
+                    "started_at": now.isoformat(),
+                    "lease_expires_at": (now + timedelta(seconds=self.lease_seconds)).isoformat()
+                },
+                "$inc": {"attempts": 1}
+            },
+            projection={"_id": 0},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _heartbeat(self, job: Dict[str, Any]):
+        """Extend the job's lease while it runs, so a long analysis is not claimed twice"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await self.db.analysis_jobs.update_one(
+                    {"job_id": job['job_id'], "worker_id": job['worker_id'], "status": "running"},
+                    {"$set": {"lease_expires_at": (_now() + timedelta(seconds=self.lease_seconds)).isoformat()}}
+                )
+            except Exception as e:
+                logger.warning(f"Renewing the lease on analysis job {job['job_id']} failed: {e}")
+                continue
+            if renewed.matched_count == 0:
+                logger.warning(f"Analysis job {job['job_id']} was claimed by another worker")
+                return
+
+    async def _finish(self, job: Dict[str, Any], update: Dict[str, Any]):
+        now = _now()
+        update.update({
+            "finished_at": now.isoformat(),
+            # BSON date for the TTL index that removes finished jobs
+            "expires_at": now + timedelta(seconds=ANALYSIS_JOB_RETENTION_SECONDS)
+        })
+        await self.db.analysis_jobs.update_one(
+            {"job_id": job['job_id'], "worker_id": job['worker_id']},
+            {"$set": update, "$unset": {"lease_expires_at": ""}}
+        )
+        for event in self._waiters.pop(job['job_id'], ()):
+            event.set()
+
+    async def process(self, job: Dict[str, Any]):
+        # A worker cancelled mid-job leaves it running; its lease expiry
+        # hands the job to another worker
+        heartbeat = asyncio.ensure_future(self._heartbeat(job))
+        try:
+            result = await self.run(job)
+        except Exception as e:
+            if isinstance(e, RateLimitedError) and job['attempts'] < self.max_attempts:
+                self.retried += 1
+                # Equal jitter: at least half the doubled delay, so the job
+                # is not claimed again straight into the same rate limit
+                ceiling = min(ANALYSIS_JOB_RETRY_MAX_SECONDS, ANALYSIS_JOB_RETRY_BASE_SECONDS * 2 ** (job['attempts'] - 1))
+                delay = ceiling / 2 + backoff_delay(
+                    job['attempts'] - 1, ANALYSIS_JOB_RETRY_BASE_SECONDS / 2, ANALYSIS_JOB_RETRY_MAX_SECONDS / 2
+                )
+                await self.db.analysis_jobs.update_one(
+                    {"job_id": job['job_id'], "worker_id": job['worker_id']},
+                    {
+                        "$set": {
+                            "status": "queued",
+                            "error": str(e),
+                            "not_before": (_now() + timedelta(seconds=delay)).isoformat()
+                        },
+                        "$unset": {"lease_expires_at": ""}
+                    }
+                )
+                return
+            self.failed += 1
+            logger.error(f"Analysis job {job['job_id']} for {job['wallet_address']} failed: {e}")
+            await self._finish(job, {"status": "failed", "error": str(e) or type(e).__name__})
+            return
+        finally:
+            heartbeat.cancel()
+
+        self.completed += 1
+        await self._finish(job, {"status": "succeeded", "result": result, "error": None})
+
+    async def _worker(self, worker_id: str):
+        while True:
+            try:
+                job = await self.claim(worker_id)
+            except Exception as e:
+                logger.error(f"Claiming analysis job failed: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self.process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Recording analysis job {job['job_id']} failed: {e}")
+
+    async def run_workers(self):
+        """Process jobs until cancelled"""
+        await asyncio.gather(*(self._worker(f"{self.process_id}-{i}") for i in range(self.workers)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'process_id': self.process_id,
+            'workers': self.workers,
+            'enqueued': self.enqueued,
+            'coalesced': self.coalesced,
+            'completed': self.completed,
+            'failed': self.failed,
+            'retried': self.retried
+        }
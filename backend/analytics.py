@@ -0,0 +1,181 @@
+"""
+Incrementally maintained analytics for SoReL
+Running platform totals are updated on every wallet write so the stats
+endpoint is O(1), with a periodic reconciliation against MongoDB to
+correct drift from other workers. Reputation history is also rolled up
+into daily and hourly buckets as it is written, so trends never scan
+raw history.
+"""
+
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReplaceOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_WINDOW_SECONDS = 24 * 60 * 60
+
+# Rollup bucket keys are prefixes of the ISO timestamps stored in history
+ROLLUP_GRANULARITIES = {
+    'day': 10,    # 2025-01-31
+    'hour': 13,   # 2025-01-31T14
+}
+
+
+class AnalyticsCounters:
+    """Wallet count, score and transaction sums, and a sliding 24h active set"""
+
+    def __init__(self, window_seconds: int = ACTIVE_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self.total_wallets = 0
+        self.score_sum = 0.0
+        self.transaction_sum = 0
+        self._last_active: Dict[str, float] = {}
+        self._expiry: List[Tuple[float, str]] = []
+        self.ready = False
+        self.reconciled_at: Optional[datetime] = None
+
+    def record_upsert(
+        self,
+        wallet_address: str,
+        previous: Optional[Dict],
+        reputation_score: float,
+        transaction_count: int,
+        analyzed_at: datetime
+    ):
+        """Apply one wallet write; previous is the stored document before it, if any"""
+        if previous:
+            self.score_sum -= previous.get('reputation_score') or 0
+            self.transaction_sum -= (previous.get('metrics') or {}).get('transaction_count') or 0
+        else:
+            self.total_wallets += 1
+
+        self.score_sum += reputation_score
+        self.transaction_sum += transaction_count
+        self._mark_active(wallet_address, analyzed_at.timestamp())
+
+    def _mark_active(self, wallet_address: str, timestamp: float):
+        if timestamp <= self._last_active.get(wallet_address, 0):
+            return
+        self._last_active[wallet_address] = timestamp
+        heapq.heappush(self._expiry, (timestamp, wallet_address))
+
+    def active_wallets(self) -> int:
+        """Distinct wallets analyzed within the window, expiring lazily"""
+        cutoff = time.time() - self.window_seconds
+        while self._expiry and self._expiry[0][0] < cutoff:
+            timestamp, wallet_address = heapq.heappop(self._expiry)
+            # Skip heap entries superseded by a later analysis of the wallet
+            if self._last_active.get(wallet_address) == timestamp:
+                del self._last_active[wallet_address]
+        return len(self._last_active)
+
+    def average_score(self) -> float:
+        return self.score_sum / self.total_wallets if self.total_wallets else 0.0
+
+    async def reconcile(self, db):
+        """Recompute every counter from MongoDB and log any drift"""
+        pipeline = [
+            {"$group": {
+                "_id": None,
+                "total_wallets": {"$sum": 1},
+                "score_sum": {"$sum": "$reputation_score"},
+                "total_transactions": {"$sum": "$metrics.transaction_count"}
+            }}
+        ]
+        result = await db.wallets.aggregate(pipeline).to_list(1)
+        totals = result[0] if result else {}
+
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.window_seconds)
+        last_active: Dict[str, float] = {}
+        async for doc in db.wallets.find(
+            {"last_analyzed": {"$gte": cutoff.isoformat()}},
+            {"_id": 0, "wallet_address": 1, "last_analyzed": 1}
+        ):
+            last_active[doc['wallet_address']] = datetime.fromisoformat(doc['last_analyzed']).timestamp()
+
+        total_wallets = totals.get('total_wallets', 0)
+        if self.ready and total_wallets != self.total_wallets:
+            logger.info(f"Analytics counters drifted: {self.total_wallets} -> {total_wallets} wallets")
+
+        self.total_wallets = total_wallets
+        self.score_sum = totals.get('score_sum', 0.0)
+        self.transaction_sum = totals.get('total_transactions', 0)
+        self._last_active = last_active
+        self._expiry = [(timestamp, address) for address, timestamp in last_active.items()]
+        heapq.heapify(self._expiry)
+        self.ready = True
+        self.reconciled_at = datetime.now(timezone.utc)
+
+
+def rollup_updates(history_docs: List[Dict]) -> List[UpdateOne]:
+    """Upserts folding reputation_history entries into their day and hour buckets"""
+    buckets: Dict[Tuple[str, str], Dict] = {}
+    for doc in history_docs:
+        for granularity, length in ROLLUP_GRANULARITIES.items():
+            key = (granularity, doc['timestamp'][:length])
+            bucket = buckets.setdefault(key, {'count': 0, 'score_sum': 0.0, 'min_score': None, 'max_score': None})
+            score = doc['score']
+            bucket['count'] += 1
+            bucket['score_sum'] += score
+            bucket['min_score'] = score if bucket['min_score'] is None else min(bucket['min_score'], score)
+            bucket['max_score'] = score if bucket['max_score'] is None else max(bucket['max_score'], score)
+
+    return [
+        UpdateOne(
+            {'granularity': granularity, 'bucket': bucket_key},
+            {
+                '$inc': {'count': bucket['count'], 'score_sum': bucket['score_sum']},
+                '$min': {'min_score': bucket['min_score']},
+                '$max': {'max_score': bucket['max_score']}
+            },
+            upsert=True
+        )
+        for (granularity, bucket_key), bucket in buckets.items()
+    ]
+
+
+async def backfill_rollups(db, since: Optional[str] = None) -> Dict[str, int]:
+    """Rebuild rollup buckets from raw reputation_history, optionally from a day (YYYY-MM-DD) onwards
+
+    Buckets are replaced, not incremented, so the backfill can be re-run
+    safely. Writes landing in a bucket while it is rebuilt may be lost, so
+    run it before enabling traffic or for past days only.
+    """
+    match = {'timestamp': {'$gte': since}} if since else {}
+    written = {}
+    for granularity, length in ROLLUP_GRANULARITIES.items():
+        pipeline = [
+            {'$match': match},
+            {'$group': {
+                # $substr is $substrBytes under its original name; timestamps
+                # are ASCII, and mongomock only implements this spelling
+                '_id': {'$substr': ['$timestamp', 0, length]},
+                'count': {'$sum': 1},
+                'score_sum': {'$sum': '$score'},
+                'min_score': {'$min': '$score'},
+                'max_score': {'$max': '$score'}
+            }}
+        ]
+        operations = []
+        async for bucket in db.reputation_history.aggregate(pipeline, allowDiskUse=True):
+            operations.append(ReplaceOne(
+                {'granularity': granularity, 'bucket': bucket['_id']},
+                {
+                    'granularity': granularity,
+                    'bucket': bucket['_id'],
+                    'count': bucket['count'],
+                    'score_sum': bucket['score_sum'],
+                    'min_score': bucket['min_score'],
+                    'max_score': bucket['max_score']
+                },
+                upsert=True
+            ))
+        if operations:
+            await db.reputation_rollups.bulk_write(operations, ordered=False)
+        written[granularity] = len(operations)
+    return written
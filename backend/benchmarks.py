@@ -0,0 +1,274 @@
+"""
+Offline microbenchmarks for SoReL's per-request CPU paths
+Times scoring, model construction and dumping, the leaderboard's
+last_analyzed parsing loop, FastAPI's response_model validation and
+rendering of leaderboard lists, and the cached snapshot JSON that
+replaced it on the read path. Each runs over realistic wallet documents
+at 1, 100 and 10k wallets. Nothing touches Mongo or RPC.
+
+Timings are also expressed relative to a fixed pure-Python calibration
+loop, so the tracked baseline in benchmark_baseline.json stays comparable
+across machines. A case more than BENCHMARK_TOLERANCE slower than its
+baseline fails the run.
+
+Usage:
+    python benchmarks.py            # run and compare with the baseline
+    python benchmarks.py save       # run and record a new baseline
+"""
+
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+# The Motor client is created at import but never connects here
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'sorel_benchmark')
+
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import serialize_response
+
+import server
+from leaderboard import LeaderboardSnapshot
+from rescore import synthetic_metrics
+from server import ReputationEngine, WalletData, WalletMetrics, wallet_json, wallet_to_doc
+
+BENCHMARK_BASELINE = Path(os.environ.get('BENCHMARK_BASELINE', str(Path(__file__).parent / 'benchmark_baseline.json')))
+# Allowed slowdown, relative to calibration, before a case counts as a regression
+BENCHMARK_TOLERANCE = float(os.environ.get('BENCHMARK_TOLERANCE', '0.25'))
+# Each case repeats until it has run at least this long, keeping the fastest repeat
+BENCHMARK_MIN_SECONDS = float(os.environ.get('BENCHMARK_MIN_SECONDS', '0.3'))
+
+SIZES = (1, 100, 10_000)
+# Wallets processed per timed repeat, so tiny sizes are not lost in timer noise
+WALLETS_PER_REPEAT = 10_000
+
+
+def stored_docs(count: int, seed: int = 42) -> List[Dict]:
+    """Wallet documents as they sit in Mongo, last_analyzed still an ISO string"""
+    analyzed = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    docs = []
+    for i, metrics in enumerate(synthetic_metrics(count, seed)):
+        wallet_data = WalletData(
+            wallet_address=f"Wa11et{i:038d}",
+            reputation_score=round(ReputationEngine.calculate_score(WalletMetrics(**metrics)), 2),
+            metrics=WalletMetrics(**metrics),
+            last_analyzed=analyzed - timedelta(minutes=i)
+        )
+        docs.append(wallet_to_doc(wallet_data))
+    return docs
+
+
+def leaderboard_entries(count: int) -> List[Dict]:
+    """Ranked entries shaped like leaderboard snapshot entries"""
+    entries = sorted(stored_docs(count), key=lambda doc: -doc['reputation_score'])
+    for rank, entry in enumerate(entries, start=1):
+        entry['last_analyzed'] = datetime.fromisoformat(entry['last_analyzed'])
+        entry['rank'] = rank
+    return entries
+
+
+def _leaderboard_route_field():
+    for route in server.app.routes:
+        if getattr(route, 'path', None) == '/api/wallets/leaderboard/top':
+            return route.response_field
+    raise RuntimeError("Leaderboard route not found")
+
+
+# Each case: setup(size) builds one input untimed; run(input) is the timed work
+def _score_setup(size: int):
+    return [WalletMetrics(**metrics) for metrics in synthetic_metrics(size)]
+
+
+def _score_run(metrics: List[WalletMetrics]):
+    for m in metrics:
+        ReputationEngine.calculate_score(m)
+
+
+def _metrics_construct_run(docs: List[Dict]):
+    for doc in docs:
+        WalletMetrics(**doc)
+
+
+def _wallet_construct_run(docs: List[Dict]):
+    for doc in docs:
+        WalletData(**doc)
+
+
+def _wallet_dump_setup(size: int):
+    return [WalletData(**doc) for doc in stored_docs(size)]
+
+
+def _wallet_dump_run(wallets: List[WalletData]):
+    for wallet in wallets:
+        wallet.model_dump()
+
+
+def _wallet_to_doc_run(wallets: List[WalletData]):
+    for wallet in wallets:
+        wallet_to_doc(wallet)
+
+
+def _fromisoformat_run(wallets: List[Dict]):
+    # The loop get_leaderboard runs over documents read from Mongo
+    for i, wallet in enumerate(wallets):
+        if isinstance(wallet['last_analyzed'], str):
+            wallet['last_analyzed'] = datetime.fromisoformat(wallet['last_analyzed'])
+        wallet['rank'] = i + 1
+
+
+LEADERBOARD_FIELD = _leaderboard_route_field()
+
+
+async def _leaderboard_response_run(entries: List[Dict]):
+    # What FastAPI does with a List[WalletData] route's return value
+    content = await serialize_response(field=LEADERBOARD_FIELD, response_content=entries)
+    JSONResponse(content)
+
+
+def _cached_json_setup(size: int):
+    snapshot = LeaderboardSnapshot(1, datetime.now(timezone.utc), leaderboard_entries(size), wallet_json)
+    snapshot.entries_json(0, size)
+    return snapshot
+
+
+def _cached_json_run(snapshot: LeaderboardSnapshot):
+    # The leaderboard read path once a snapshot's entries are encoded
+    Response(snapshot.entries_json(0, len(snapshot.entries)), media_type="application/json")
+
+
+CASES: Dict[str, Dict[str, Any]] = {
+    'calculate_score': {'setup': _score_setup, 'run': _score_run, 'mutates': False},
+    'wallet_metrics_construct': {'setup': synthetic_metrics, 'run': _metrics_construct_run, 'mutates': False},
+    'wallet_data_construct': {'setup': stored_docs, 'run': _wallet_construct_run, 'mutates': False},
+    'wallet_data_model_dump': {'setup': _wallet_dump_setup, 'run': _wallet_dump_run, 'mutates': False},
+    'wallet_to_doc': {'setup': _wallet_dump_setup, 'run': _wallet_to_doc_run, 'mutates': False},
+    'leaderboard_fromisoformat': {'setup': stored_docs, 'run': _fromisoformat_run, 'mutates': True},
+    'leaderboard_response_model': {'setup': leaderboard_entries, 'run': _leaderboard_response_run, 'mutates': False},
+    'leaderboard_cached_json': {'setup': _cached_json_setup, 'run': _cached_json_run, 'mutates': False},
+}
+
+
+def _calibration_run(_):
+    # Fixed pure-Python work: dict lookups, arithmetic and a comparison per step
+    table = {i: i * 0.5 for i in range(64)}
+    total = 0.0
+    for i in range(WALLETS_PER_REPEAT):
+        value = table[i & 63] * 1.0001
+        if value > 16:
+            total += value
+    return total
+
+
+def time_case(setup: Callable[[int], Any], run: Callable, size: int, mutates: bool) -> float:
+    """Fastest seconds per wallet across repeats"""
+    loops = max(1, WALLETS_PER_REPEAT // size)
+    template = setup(size)
+    is_async = asyncio.iscoroutinefunction(run)
+    loop = asyncio.new_event_loop() if is_async else None
+
+    def fresh_inputs():
+        if not mutates:
+            return [template] * loops
+        return [[dict(doc) for doc in template] for _ in range(loops)]
+
+    async def run_async(inputs):
+        start = time.perf_counter()
+        for data in inputs:
+            await run(data)
+        return time.perf_counter() - start
+
+    def run_sync(inputs):
+        start = time.perf_counter()
+        for data in inputs:
+            run(data)
+        return time.perf_counter() - start
+
+    best = float('inf')
+    spent = 0.0
+    repeats = 0
+    try:
+        while spent < BENCHMARK_MIN_SECONDS or repeats < 3:
+            inputs = fresh_inputs()
+            # As timeit does: a collection mid-repeat is noise, not the code under test
+            gc.collect()
+            gc.disable()
+            try:
+                elapsed = loop.run_until_complete(run_async(inputs)) if is_async else run_sync(inputs)
+            finally:
+                gc.enable()
+            best = min(best, elapsed)
+            spent += elapsed
+            repeats += 1
+    finally:
+        if loop is not None:
+            loop.close()
+    return best / (loops * size)
+
+
+def run_benchmarks() -> Dict:
+    calibration = time_case(lambda size: None, _calibration_run, WALLETS_PER_REPEAT, False)
+    print(f"🏁 Calibration: {calibration * 1e9:.1f} ns per step")
+
+    results = {}
+    for name, case in CASES.items():
+        for size in SIZES:
+            seconds = time_case(case['setup'], case['run'], size, case['mutates'])
+            key = f"{name}[{size}]"
+            results[key] = {
+                'us_per_wallet': round(seconds * 1e6, 4),
+                'relative': round(seconds / calibration, 2)
+            }
+            print(f"   - {key:<36} {seconds * 1e6:>10.3f} µs/wallet  ({results[key]['relative']:>8.2f}x calibration)")
+
+    return {
+        'python': sys.version.split()[0],
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'calibration_ns': round(calibration * 1e9, 3),
+        'results': results
+    }
+
+
+def compare(baseline: Dict, current: Dict, tolerance: float = BENCHMARK_TOLERANCE) -> bool:
+    """Report cases slower than baseline, relative to calibration; False on regression"""
+    regressions = []
+    for key, result in current['results'].items():
+        before = baseline['results'].get(key)
+        if before is None:
+            print(f"   - {key}: new case, no baseline")
+            continue
+        change = (result['relative'] - before['relative']) / before['relative']
+        if change > tolerance:
+            regressions.append(key)
+            print(f"   ⚠️  {key}: {before['relative']}x -> {result['relative']}x ({change:+.0%})")
+        elif change < -tolerance:
+            print(f"   🚀 {key}: {before['relative']}x -> {result['relative']}x ({change:+.0%})")
+
+    if regressions:
+        print(f"❌ {len(regressions)} case(s) regressed more than {tolerance:.0%}")
+        return False
+    print(f"✅ No case regressed more than {tolerance:.0%}")
+    return True
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'compare'
+    current = run_benchmarks()
+
+    if command == 'save':
+        BENCHMARK_BASELINE.write_text(json.dumps(current, indent=2) + '\n')
+        print(f"💾 Baseline written to {BENCHMARK_BASELINE}")
+        sys.exit(0)
+
+    if not BENCHMARK_BASELINE.exists():
+        print(f"⚠️  No baseline at {BENCHMARK_BASELINE}; run 'python benchmarks.py save' first")
+        sys.exit(0)
+
+    baseline = json.loads(BENCHMARK_BASELINE.read_text())
+    print(f"📊 Comparing with baseline from {baseline.get('timestamp')}")
+    sys.exit(0 if compare(baseline, current) else 1)
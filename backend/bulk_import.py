@@ -0,0 +1,251 @@
+"""
+Resumable bulk import of wallet addresses for SoReL
+Streams an address file (one per line, or the first CSV column), validates
+each address, skips wallets already stored, and analyzes the rest through
+SolanaDataFetcher with bounded concurrency. Results go to MongoDB as bulk
+writes through a write-behind buffer. After every batch is written, the
+line reached is checkpointed next to the input file, so a crashed or
+interrupted run picks up where it stopped. Addresses that still fail after
+retries are appended to <file>.failed for a later run.
+
+Usage:
+    python bulk_import.py <address_file> [concurrency] [backfill] [restart]
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from solders.pubkey import Pubkey
+
+from rate_limiter import RateLimitedError
+from server import (
+    PREVIOUS_WALLET_PROJECTION,
+    ReputationEngine,
+    build_wallet_data,
+    client,
+    cursor_to_doc,
+    db,
+    fetcher,
+    history_doc_for,
+    load_cursors,
+    wallet_to_doc
+)
+from write_buffer import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CONCURRENCY = int(os.environ.get('IMPORT_CONCURRENCY', '16'))
+# Lines per batch: dedupe query, checkpoint and flush granularity
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '1000'))
+IMPORT_RETRIES = int(os.environ.get('IMPORT_RETRIES', '3'))
+IMPORT_REPORT_SECONDS = 2
+
+
+def parse_address(line: str) -> Optional[str]:
+    """The address on a line; blank lines, # comments and CSV headers give None"""
+    value = line.split(',', 1)[0].strip().strip('"')
+    if not value or value.startswith('#') or value.lower() in ('address', 'wallet', 'wallet_address'):
+        return None
+    return value
+
+
+def read_batches(path: Path, start_line: int, batch_size: int) -> Iterator[Tuple[int, List[str]]]:
+    """Lines after start_line in batches, with the line number each batch ends on"""
+    batch = []
+    line_number = start_line
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if line_number <= start_line:
+                continue
+            batch.append(line)
+            if len(batch) >= batch_size:
+                yield line_number, batch
+                batch = []
+    if batch:
+        yield line_number, batch
+
+
+def count_lines(path: Path) -> int:
+    with open(path, 'rb') as f:
+        return sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b''))
+
+
+class ImportProgress:
+    """Checkpointed counters; line is the last input line fully written"""
+
+    FIELDS = ('line', 'imported', 'existing', 'duplicate', 'invalid', 'failed')
+
+    def __init__(self, **counts):
+        for field in self.FIELDS:
+            setattr(self, field, counts.get(field, 0))
+
+    @classmethod
+    def load(cls, path: Path) -> 'ImportProgress':
+        if not path.exists():
+            return cls()
+        return cls(**json.loads(path.read_text()))
+
+    def save(self, path: Path):
+        # Write then rename, so a crash mid-write never corrupts the checkpoint
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_text(json.dumps({field: getattr(self, field) for field in self.FIELDS}))
+        os.replace(tmp, path)
+
+
+class BulkImporter:
+    def __init__(
+        self,
+        path: Path,
+        concurrency: int = IMPORT_CONCURRENCY,
+        batch_size: int = IMPORT_BATCH_SIZE,
+        backfill: bool = False
+    ):
+        self.path = path
+        self.checkpoint_path = path.with_name(path.name + '.checkpoint')
+        self.failed_path = path.with_name(path.name + '.failed')
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.backfill = backfill
+        self.progress = ImportProgress()
+        # Always buffered here, whatever WRITE_BEHIND_ENABLED says for the API
+        self.buffer = WriteBehindBuffer(
+            db, PREVIOUS_WALLET_PROJECTION, flush_size=batch_size, max_pending=batch_size * 4, enabled=True
+        )
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze(self, wallet_address: str, pubkey: Pubkey, cursor) -> bool:
+        async with self._semaphore:
+            for attempt in range(IMPORT_RETRIES):
+                try:
+                    metrics = await fetcher.analyze_wallet(
+                        wallet_address, cursor=cursor, backfill=self.backfill, pubkey=pubkey
+                    )
+                    break
+                except RateLimitedError:
+                    await asyncio.sleep(2 ** attempt)
+                except Exception as e:
+                    logger.warning(f"Analysis of {wallet_address} failed: {e}")
+                    await asyncio.sleep(2 ** attempt)
+            else:
+                return False
+
+        wallet_data = build_wallet_data(wallet_address, metrics, ReputationEngine.calculate_score(metrics))
+        await self.buffer.add(wallet_to_doc(wallet_data), history_doc_for(wallet_data), cursor_to_doc(cursor))
+        return True
+
+    async def import_batch(self, lines: List[str]):
+        pubkeys: Dict[str, Pubkey] = {}
+        for line in lines:
+            address = parse_address(line)
+            if address is None:
+                continue
+            if address in pubkeys:
+                self.progress.duplicate += 1
+                continue
+            try:
+                pubkeys[address] = Pubkey.from_string(address)
+            except ValueError:
+                self.progress.invalid += 1
+
+        existing = {
+            doc['wallet_address']
+            async for doc in db.wallets.find(
+                {"wallet_address": {"$in": list(pubkeys)}}, {"_id": 0, "wallet_address": 1}
+            )
+        }
+        self.progress.existing += len(existing)
+        pending = [address for address in pubkeys if address not in existing]
+        if not pending:
+            return
+
+        cursors = await load_cursors(pending)
+        results = await asyncio.gather(*(
+            self.analyze(address, pubkeys[address], cursors[address]) for address in pending
+        ))
+
+        failed = [address for address, ok in zip(pending, results) if not ok]
+        self.progress.imported += len(pending) - len(failed)
+        self.progress.failed += len(failed)
+        if failed:
+            with open(self.failed_path, 'a', encoding='utf-8') as f:
+                f.writelines(f"{address}\n" for address in failed)
+
+    def report(self, total_lines: int, start: ImportProgress, started: float, final: bool = False):
+        elapsed = time.perf_counter() - started
+        rate = (self.progress.line - start.line) / elapsed if elapsed else 0.0
+        analysis_rate = (self.progress.imported - start.imported) / elapsed if elapsed else 0.0
+        remaining = max(total_lines - self.progress.line, 0)
+        eta = f"{remaining / rate / 60:.1f}m" if rate and not final else "-"
+        print(
+            f"\r   📈 line {self.progress.line:,}/{total_lines:,} | "
+            f"imported {self.progress.imported:,} | existing {self.progress.existing:,} | "
+            f"invalid {self.progress.invalid:,} | failed {self.progress.failed:,} | "
+            f"{rate:,.1f} lines/s, {analysis_rate:,.1f} analyses/s | ETA {eta}   ",
+            end='\n' if final else '',
+            flush=True
+        )
+
+    async def run(self, restart: bool = False):
+        if not restart:
+            self.progress = ImportProgress.load(self.checkpoint_path)
+        start = ImportProgress(**vars(self.progress))
+        start_line = start.line
+        total_lines = count_lines(self.path)
+
+        print(f"📥 Importing {self.path} ({total_lines:,} lines) with concurrency {self.concurrency}")
+        if start_line:
+            print(f"   ↪️  Resuming after line {start_line:,}")
+
+        started = time.perf_counter()
+        last_report = 0.0
+        for end_line, lines in read_batches(self.path, start_line, self.batch_size):
+            await self.import_batch(lines)
+            # Only checkpoint once everything up to end_line is in Mongo
+            failed_writes = self.buffer.failed
+            await self.buffer.drain()
+            if self.buffer.failed > failed_writes:
+                raise RuntimeError(f"{self.buffer.failed - failed_writes} wallet writes failed after line {self.progress.line:,}; rerun to resume")
+            self.progress.line = end_line
+            self.progress.save(self.checkpoint_path)
+
+            if time.perf_counter() - last_report >= IMPORT_REPORT_SECONDS:
+                last_report = time.perf_counter()
+                self.report(total_lines, start, started)
+
+        self.report(total_lines, start, started, final=True)
+        print(f"✅ Import complete: {self.progress.imported:,} analyzed, {self.progress.existing:,} already stored, "
+              f"{self.progress.duplicate:,} duplicates, {self.progress.invalid:,} invalid, {self.progress.failed:,} failed")
+        if self.progress.failed:
+            print(f"   ⚠️  Failed addresses written to {self.failed_path}")
+
+
+async def main(path: Path, concurrency: int, backfill: bool, restart: bool):
+    try:
+        await BulkImporter(path, concurrency=concurrency, backfill=backfill).run(restart=restart)
+    except Exception as e:
+        print(f"\n❌ Error importing wallets: {e}")
+        raise
+    finally:
+        await fetcher.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python bulk_import.py <address_file> [concurrency] [backfill] [restart]")
+        sys.exit(2)
+
+    flags = set(sys.argv[2:])
+    numbers = [arg for arg in sys.argv[2:] if arg.isdigit()]
+    asyncio.run(main(
+        Path(sys.argv[1]),
+        concurrency=int(numbers[0]) if numbers else IMPORT_CONCURRENCY,
+        backfill='backfill' in flags,
+        restart='restart' in flags
+    ))
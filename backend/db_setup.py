@@ -9,6 +9,8 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 from pathlib import Path
 
+from analytics import backfill_rollups
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -46,6 +48,13 @@ async def setup_database():
         )
         print("   ✅ Created index on reputation_score (descending)")
         
+        # 2b. Compound index matching the leaderboard snapshot order
+        await db.wallets.create_index(
+            [("reputation_score", -1), ("wallet_address", 1)],
+            name="reputation_score_address_idx"
+        )
+        print("   ✅ Created compound index on reputation_score + wallet_address")
+        
         # 3. Index on last_analyzed (for analytics queries)
         await db.wallets.create_index(
             [("last_analyzed", -1)],  # Descending for recent first
@@ -59,7 +68,14 @@ async def setup_database():
             name="last_analyzed_reputation_idx"
         )
         print("   ✅ Created compound index on last_analyzed + reputation_score")
-        
+
+        # 5. Index on score_version (for re-scoring outdated wallets)
+        await db.wallets.create_index(
+            [("score_version", 1)],
+            name="score_version_idx"
+        )
+        print("   ✅ Created index on score_version")
+
         # ============================================
         # REPUTATION_HISTORY COLLECTION INDEXES
         # ============================================
@@ -93,6 +109,123 @@ async def setup_database():
         )
         print("   ✅ Created compound index on timestamp + score")
         
+        # ============================================
+        # INGESTION_CURSORS COLLECTION INDEXES
+        # ============================================
+        print("\n🧭 Creating indexes for 'ingestion_cursors' collection...")
+        
+        # 1. Unique index on wallet_address (one cursor per wallet)
+        await db.ingestion_cursors.create_index(
+            [("wallet_address", 1)],
+            unique=True,
+            name="cursor_wallet_address_unique_idx"
+        )
+        print("   ✅ Created unique index on wallet_address")
+        
+        # ============================================
+        # PARSED_TRANSACTIONS COLLECTION INDEXES
+        # ============================================
+        print("\n🧾 Creating indexes for 'parsed_transactions' collection...")
+        
+        # 1. Unique index on signature (parse cache key)
+        await db.parsed_transactions.create_index(
+            [("signature", 1)],
+            unique=True,
+            name="parsed_signature_unique_idx"
+        )
+        print("   ✅ Created unique index on signature")
+        
+        # ============================================
+        # LEADERBOARD_SNAPSHOTS COLLECTION INDEXES
+        # ============================================
+        print("\n🏆 Creating indexes for 'leaderboard_snapshots' collection...")
+        
+        # 1. Unique index on version (latest snapshot lookup)
+        await db.leaderboard_snapshots.create_index(
+            [("version", -1)],
+            unique=True,
+            name="snapshot_version_unique_idx"
+        )
+        print("   ✅ Created unique index on version")
+        
+        # 2. Index on built_at (age-based expiry of old versions)
+        await db.leaderboard_snapshots.create_index(
+            [("built_at", 1)],
+            name="snapshot_built_at_idx"
+        )
+        print("   ✅ Created index on built_at")
+        
+        # ============================================
+        # LEADERBOARD_SNAPSHOT_CHUNKS COLLECTION INDEXES
+        # ============================================
+        print("\n🧩 Creating indexes for 'leaderboard_snapshot_chunks' collection...")
+        
+        # 1. Unique index on version + chunk (loading a snapshot's entries)
+        await db.leaderboard_snapshot_chunks.create_index(
+            [("version", 1), ("chunk", 1)],
+            unique=True,
+            name="snapshot_chunk_unique_idx"
+        )
+        print("   ✅ Created unique index on version + chunk")
+        
+        # ============================================
+        # REPUTATION_ROLLUPS COLLECTION INDEXES
+        # ============================================
+        print("\n📅 Creating indexes for 'reputation_rollups' collection...")
+        
+        # 1. Unique index on granularity + bucket (one document per bucket)
+        await db.reputation_rollups.create_index(
+            [("granularity", 1), ("bucket", 1)],
+            unique=True,
+            name="rollup_granularity_bucket_unique_idx"
+        )
+        print("   ✅ Created unique index on granularity + bucket")
+
+        # ============================================
+        # ANALYSIS_JOBS COLLECTION INDEXES
+        # ============================================
+        print("\n📨 Creating indexes for 'analysis_jobs' collection...")
+
+        # 1. Unique index on job_id (status lookups)
+        await db.analysis_jobs.create_index(
+            [("job_id", 1)],
+            unique=True,
+            name="job_id_unique_idx"
+        )
+        print("   ✅ Created unique index on job_id")
+
+        # 2. Compound index for claiming the oldest queued job
+        await db.analysis_jobs.create_index(
+            [("status", 1), ("created_at", 1)],
+            name="job_status_created_idx"
+        )
+        print("   ✅ Created compound index on status + created_at")
+
+        # 3. Compound index for finding a wallet's active job
+        await db.analysis_jobs.create_index(
+            [("wallet_address", 1), ("status", 1)],
+            name="job_wallet_status_idx"
+        )
+        print("   ✅ Created compound index on wallet_address + status")
+
+        # 4. At most one active job per wallet, backfill and force flag, so
+        #    concurrent enqueues coalesce ($in partial filters need MongoDB 6.0+)
+        await db.analysis_jobs.create_index(
+            [("wallet_address", 1), ("backfill", 1), ("force", 1)],
+            unique=True,
+            partialFilterExpression={"status": {"$in": ["queued", "running"]}},
+            name="job_active_wallet_unique_idx"
+        )
+        print("   ✅ Created partial unique index on active wallet_address + backfill + force")
+
+        # 5. TTL index removing finished jobs
+        await db.analysis_jobs.create_index(
+            [("expires_at", 1)],
+            expireAfterSeconds=0,
+            name="job_expires_ttl_idx"
+        )
+        print("   ✅ Created TTL index on expires_at")
+
         # ============================================
         # VERIFY INDEXES
         # ============================================
@@ -186,6 +319,26 @@ async def show_query_performance():
     finally:
         client.close()
 
+async def backfill_trend_rollups(since: str = None):
+    """Rebuild daily and hourly trend rollups from reputation_history"""
+    
+    mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+    db_name = os.environ.get('DB_NAME', 'sorel_production')
+    
+    print(f"🔗 Connecting to MongoDB: {mongo_url}")
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+    
+    try:
+        print(f"\n📅 Backfilling trend rollups{f' since {since}' if since else ''}...")
+        written = await backfill_rollups(db, since=since)
+        for granularity, count in written.items():
+            print(f"   ✅ {count:,} {granularity} buckets written")
+    except Exception as e:
+        print(f"❌ Error backfilling rollups: {e}")
+    finally:
+        client.close()
+
 if __name__ == "__main__":
     import sys
     
@@ -198,5 +351,8 @@ if __name__ == "__main__":
             print("❌ Cancelled")
     elif len(sys.argv) > 1 and sys.argv[1] == "analyze":
         asyncio.run(show_query_performance())
+    elif len(sys.argv) > 1 and sys.argv[1] == "rollups":
+        # Optional start day, e.g. python db_setup.py rollups 2025-01-01
+        asyncio.run(backfill_trend_rollups(sys.argv[2] if len(sys.argv) > 2 else None))
     else:
         asyncio.run(setup_database())
@@ -0,0 +1,194 @@
+"""
+Streaming export of the SoReL wallets collection
+Wallets are read through a Mongo cursor one batch at a time and written as
+NDJSON or CSV as they arrive, so memory stays flat whatever the size of
+the collection. Shared by the /api/wallets/export endpoint and the CLI
+below.
+
+Usage:
+    python export.py <ndjson|csv> [output_file] [score_min=N] [since=YYYY-MM-DD]
+"""
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+EXPORT_PROJECTION = {
+    '_id': 0,
+    'wallet_address': 1,
+    'reputation_score': 1,
+    'metrics': 1,
+    'last_analyzed': 1,
+    'score_version': 1
+}
+
+METRIC_COLUMNS = [
+    'transaction_count',
+    'total_volume',
+    'contract_interactions',
+    'wallet_age_days',
+    'activity_frequency',
+    'unique_programs'
+]
+CSV_COLUMNS = ['wallet_address', 'reputation_score'] + METRIC_COLUMNS + ['last_analyzed', 'score_version']
+
+
+def parse_since(value: str) -> datetime:
+    """A date or datetime; naive values are taken as UTC"""
+    since = datetime.fromisoformat(value)
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return since.astimezone(timezone.utc)
+
+
+def export_query(score_min: Optional[float] = None, since: Optional[datetime] = None) -> Dict:
+    query: Dict = {}
+    if score_min is not None:
+        query['reputation_score'] = {'$gte': score_min}
+    if since is not None:
+        # last_analyzed is stored as a UTC ISO string, which sorts chronologically
+        query['last_analyzed'] = {'$gte': since.isoformat()}
+    return query
+
+
+class ExportStats:
+    def __init__(self):
+        self.rows = 0
+        self.start = time.perf_counter()
+
+    @property
+    def seconds(self) -> float:
+        return time.perf_counter() - self.start
+
+    @property
+    def rows_per_second(self) -> float:
+        seconds = self.seconds
+        return self.rows / seconds if seconds else 0.0
+
+    def summary(self) -> Dict:
+        return {
+            'rows': self.rows,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 2)
+        }
+
+
+def _csv_row(doc: Dict) -> List:
+    metrics = doc.get('metrics') or {}
+    return (
+        [doc.get('wallet_address'), doc.get('reputation_score')]
+        + [metrics.get(column) for column in METRIC_COLUMNS]
+        + [doc.get('last_analyzed'), doc.get('score_version')]
+    )
+
+
+async def export_wallets(
+    db,
+    fmt: str = 'ndjson',
+    score_min: Optional[float] = None,
+    since: Optional[datetime] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+    stats: Optional[ExportStats] = None
+) -> AsyncIterator[bytes]:
+    """Encoded rows, one chunk per cursor batch"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {sorted(EXPORT_FORMATS)}")
+    stats = stats or ExportStats()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer is not None:
+        writer.writerow(CSV_COLUMNS)
+
+    batch_rows = 0
+    cursor = db.wallets.find(export_query(score_min, since), EXPORT_PROJECTION).batch_size(batch_size)
+    async for doc in cursor:
+        if writer is not None:
+            writer.writerow(_csv_row(doc))
+        else:
+            buffer.write(json.dumps(doc, default=str))
+            buffer.write('\n')
+        batch_rows += 1
+
+        if batch_rows >= batch_size:
+            stats.rows += batch_rows
+            batch_rows = 0
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    stats.rows += batch_rows
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def export_to_file(fmt: str, output: Optional[str], score_min: Optional[float], since: Optional[datetime]):
+    mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+    db_name = os.environ.get('DB_NAME', 'sorel_production')
+
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+    stats = ExportStats()
+    # Progress goes to stderr so NDJSON/CSV on stdout stays clean
+    out = open(output, 'wb') if output else sys.stdout.buffer
+    print(f"📤 Exporting wallets from {db_name} as {fmt}", file=sys.stderr)
+
+    try:
+        last_report = time.perf_counter()
+        async for chunk in export_wallets(db, fmt, score_min, since, stats=stats):
+            out.write(chunk)
+            if time.perf_counter() - last_report >= 2:
+                last_report = time.perf_counter()
+                print(f"   - {stats.rows:,} rows ({stats.rows_per_second:,.0f} rows/s)", file=sys.stderr)
+    finally:
+        out.flush()
+        if output:
+            out.close()
+        client.close()
+
+    summary = stats.summary()
+    print(
+        f"✅ Exported {summary['rows']:,} rows in {summary['seconds']}s "
+        f"({summary['rows_per_second']:,.0f} rows/s)" + (f" to {output}" if output else ""),
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    positional = [arg for arg in sys.argv[1:] if '=' not in arg]
+    options = dict(arg.split('=', 1) for arg in sys.argv[1:] if '=' in arg)
+
+    fmt = positional[0] if positional else 'ndjson'
+    if fmt not in EXPORT_FORMATS:
+        print(f"❌ Unknown format '{fmt}'; use one of {', '.join(EXPORT_FORMATS)}", file=sys.stderr)
+        sys.exit(2)
+
+    asyncio.run(export_to_file(
+        fmt,
+        positional[1] if len(positional) > 1 else None,
+        float(options['score_min']) if 'score_min' in options else None,
+        parse_since(options['since']) if 'since' in options else None
+    ))
@@ -0,0 +1,377 @@
+"""
+Local Solana JSON-RPC stand-in for SoReL load testing
+Serves getSignaturesForAddress, getBalance, getTransaction, getVersion,
+getSlot and getEpochInfo for synthetic wallets, so the whole analysis
+pipeline can be benchmarked offline and reproducibly. Every wallet's
+history is derived from its address and a seed, and signatures encode the
+wallet and position they belong to, so the server keeps no state.
+Latency, jitter, errors and 429s can be injected.
+
+Usage:
+    python fake_rpc.py [port]
+    HELIUS_RPC_URL=http://127.0.0.1:8899 uvicorn server:app
+    HELIUS_RPC_URL=http://127.0.0.1:8899 python monitoring.py
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from solders.hash import Hash
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+
+FAKE_RPC_PORT = int(os.environ.get('FAKE_RPC_PORT', '8899'))
+FAKE_RPC_SEED = os.environ.get('FAKE_RPC_SEED', 'sorel')
+# Average signatures per wallet; each wallet gets between half and 1.5x this
+FAKE_RPC_TRANSACTIONS = int(os.environ.get('FAKE_RPC_TRANSACTIONS', '300'))
+FAKE_RPC_LATENCY_MS = float(os.environ.get('FAKE_RPC_LATENCY_MS', '20'))
+FAKE_RPC_JITTER_MS = float(os.environ.get('FAKE_RPC_JITTER_MS', '10'))
+# Fractions of HTTP requests answered with a 500 or a 429
+FAKE_RPC_ERROR_RATE = float(os.environ.get('FAKE_RPC_ERROR_RATE', '0'))
+FAKE_RPC_429_RATE = float(os.environ.get('FAKE_RPC_429_RATE', '0'))
+# Requests per second before the server answers 429; 0 means unlimited
+FAKE_RPC_MAX_RPS = float(os.environ.get('FAKE_RPC_MAX_RPS', '0'))
+
+SLOT_SECONDS = 0.4
+SLOTS_PER_EPOCH = 432000
+GENESIS_SLOT = 250_000_000
+SOLANA_VERSION = '1.18.22'
+
+# Programs synthetic transactions call besides the system program
+PROGRAM_IDS = [
+    'TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA',
+    'JUP6LkbZbjS1jKKwapdHNy74zcZ3tLUZoi5QNyVTaV4',
+    'whirLbMiicVdio4qvUfM5KAg6Ct8VwpYzGff3uctyCc',
+    'metaqbxxUerdq28cj1RbAWkYQm3ybzjb6a8bQ518x1s',
+    'MEisE1HzehtrDpAAT8PnLHjpSSkRYakotTuJRPjTpo8',
+    '675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8',
+]
+SYSTEM_PROGRAM_ID = '11111111111111111111111111111111'
+COMPUTE_BUDGET_PROGRAM_ID = 'ComputeBudget111111111111111111111111111111'
+
+
+def _hash(*parts: Any) -> bytes:
+    return hashlib.sha256(':'.join(str(p) for p in (FAKE_RPC_SEED,) + parts).encode()).digest()
+
+
+def _hash_int(*parts: Any) -> int:
+    return int.from_bytes(_hash(*parts)[:8], 'big')
+
+
+class SyntheticChain:
+    """Deterministic wallet histories derived from address and seed"""
+
+    def __init__(self, transactions: int = FAKE_RPC_TRANSACTIONS):
+        self.transactions = transactions
+        self.started = time.time()
+        # History ends at the moment the server started, so results are stable
+        self.anchor_time = int(self.started)
+
+    def current_slot(self) -> int:
+        return GENESIS_SLOT + int((time.time() - self.started) / SLOT_SECONDS)
+
+    def transaction_count(self, wallet: bytes) -> int:
+        if self.transactions <= 0:
+            return 0
+        spread = _hash_int('count', wallet) % (self.transactions + 1)
+        return self.transactions // 2 + spread
+
+    def age_seconds(self, wallet: bytes) -> int:
+        return (1 + _hash_int('age', wallet) % 1000) * 86400
+
+    def balance(self, wallet: bytes) -> int:
+        return _hash_int('balance', wallet) % (500 * 10**9)
+
+    def signature(self, wallet: bytes, index: int) -> str:
+        # 32 bytes of wallet, 4 of position, 28 of padding: decodable, no lookup table
+        padding = _hash('signature', wallet, index)[:28]
+        return str(Signature.from_bytes(wallet + index.to_bytes(4, 'big') + padding))
+
+    @staticmethod
+    def decode_signature(signature: str) -> Optional[Tuple[bytes, int]]:
+        try:
+            raw = bytes(Signature.from_string(signature))
+        except (ValueError, TypeError):
+            return None
+        return raw[:32], int.from_bytes(raw[32:36], 'big')
+
+    def block_time(self, wallet: bytes, index: int) -> int:
+        # Index 0 is the newest; the oldest sits at the wallet's age
+        count = max(self.transaction_count(wallet), 1)
+        return self.anchor_time - int(self.age_seconds(wallet) * index / count)
+
+    def slot(self, wallet: bytes, index: int) -> int:
+        return GENESIS_SLOT - int((self.anchor_time - self.block_time(wallet, index)) / SLOT_SECONDS)
+
+    def signatures(self, wallet: bytes, limit: int, before: Optional[str], until: Optional[str]) -> List[Dict]:
+        count = self.transaction_count(wallet)
+        start = 0
+        end = count
+        if before:
+            decoded = self.decode_signature(before)
+            if decoded is None or decoded[0] != wallet:
+                return []
+            start = decoded[1] + 1
+        if until:
+            decoded = self.decode_signature(until)
+            if decoded is not None and decoded[0] == wallet:
+                end = min(end, decoded[1])
+        return [
+            {
+                'signature': self.signature(wallet, index),
+                'slot': self.slot(wallet, index),
+                'err': None,
+                'memo': None,
+                'blockTime': self.block_time(wallet, index),
+                'confirmationStatus': 'finalized'
+            }
+            for index in range(start, min(end, start + limit))
+        ]
+
+    def transaction(self, signature: str) -> Optional[Dict]:
+        decoded = self.decode_signature(signature)
+        if decoded is None:
+            return None
+        wallet, index = decoded
+        if index >= self.transaction_count(wallet):
+            return None
+
+        wallet_address = str(Pubkey.from_bytes(wallet))
+        counterparty = str(Pubkey.from_bytes(_hash('counterparty', wallet, index)))
+        roll = _hash_int('tx', wallet, index)
+        fee = 5000
+        amount = roll % (5 * 10**9)
+        outgoing = roll % 2 == 0
+        wallet_pre = 10**12
+        wallet_post = wallet_pre - fee - (amount if outgoing else -amount)
+        other_pre = 10**12
+        other_post = other_pre + (amount if outgoing else -amount)
+
+        instructions = [{
+            'programId': COMPUTE_BUDGET_PROGRAM_ID,
+            'accounts': [],
+            'data': '3DdGGhkhJbjm',
+            'stackHeight': None
+        }]
+        if roll % 3 == 0:
+            instructions.append({
+                'program': 'system',
+                'programId': SYSTEM_PROGRAM_ID,
+                'parsed': {
+                    'type': 'transfer',
+                    'info': {
+                        'source': wallet_address if outgoing else counterparty,
+                        'destination': counterparty if outgoing else wallet_address,
+                        'lamports': amount
+                    }
+                },
+                'stackHeight': None
+            })
+        else:
+            instructions.append({
+                'programId': PROGRAM_IDS[(roll >> 8) % len(PROGRAM_IDS)],
+                'accounts': [wallet_address, counterparty],
+                'data': '2ZjTR1vUs2pHXyTM',
+                'stackHeight': None
+            })
+
+        return {
+            'slot': self.slot(wallet, index),
+            'blockTime': self.block_time(wallet, index),
+            'version': 0,
+            'meta': {
+                'err': None,
+                'status': {'Ok': None},
+                'fee': fee,
+                'preBalances': [wallet_pre, other_pre, 1, 1],
+                'postBalances': [wallet_post, other_post, 1, 1],
+                'innerInstructions': [],
+                'logMessages': [],
+                'preTokenBalances': [],
+                'postTokenBalances': [],
+                'rewards': [],
+                'computeUnitsConsumed': 1500
+            },
+            'transaction': {
+                'signatures': [signature],
+                'message': {
+                    'accountKeys': [
+                        {'pubkey': wallet_address, 'signer': True, 'writable': True, 'source': 'transaction'},
+                        {'pubkey': counterparty, 'signer': False, 'writable': True, 'source': 'transaction'},
+                        {'pubkey': SYSTEM_PROGRAM_ID, 'signer': False, 'writable': False, 'source': 'transaction'},
+                        {'pubkey': COMPUTE_BUDGET_PROGRAM_ID, 'signer': False, 'writable': False, 'source': 'transaction'},
+                    ],
+                    'instructions': instructions,
+                    'recentBlockhash': str(Hash(_hash('blockhash', wallet, index))),
+                    'addressTableLookups': []
+                }
+            }
+        }
+
+
+class FaultInjector:
+    """Latency, jitter, 5xx and 429 injection per HTTP request"""
+
+    def __init__(
+        self,
+        latency_ms: float = FAKE_RPC_LATENCY_MS,
+        jitter_ms: float = FAKE_RPC_JITTER_MS,
+        error_rate: float = FAKE_RPC_ERROR_RATE,
+        rate_limit_rate: float = FAKE_RPC_429_RATE,
+        max_rps: float = FAKE_RPC_MAX_RPS
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.max_rps = max_rps
+        self._tokens = max_rps
+        self._updated = time.monotonic()
+        self._random = random.Random(FAKE_RPC_SEED)
+
+    def delay(self) -> float:
+        jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def over_budget(self) -> bool:
+        if self.max_rps <= 0:
+            return False
+        now = time.monotonic()
+        self._tokens = min(self.max_rps, self._tokens + (now - self._updated) * self.max_rps)
+        self._updated = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    def fault(self) -> Optional[int]:
+        """HTTP status to fail this request with, if any"""
+        if self.over_budget() or self._random.random() < self.rate_limit_rate:
+            return 429
+        if self._random.random() < self.error_rate:
+            return 500
+        return None
+
+
+chain = SyntheticChain()
+faults = FaultInjector()
+stats: Counter = Counter()
+
+app = FastAPI(title="SoReL fake Solana RPC")
+
+
+def _result(request_id: Any, result: Any) -> Dict:
+    return {'jsonrpc': '2.0', 'result': result, 'id': request_id}
+
+
+def _error(request_id: Any, code: int, message: str) -> Dict:
+    return {'jsonrpc': '2.0', 'error': {'code': code, 'message': message}, 'id': request_id}
+
+
+def _wallet(params: List) -> Optional[bytes]:
+    try:
+        return bytes(Pubkey.from_string(params[0]))
+    except Exception:
+        return None
+
+
+def handle(call: Dict) -> Dict:
+    request_id = call.get('id')
+    method = call.get('method')
+    params = call.get('params') or []
+    stats[method] += 1
+    slot = chain.current_slot()
+
+    if method == 'getSignaturesForAddress':
+        wallet = _wallet(params)
+        if wallet is None:
+            return _error(request_id, -32602, 'Invalid param: Invalid')
+        config = params[1] if len(params) > 1 and isinstance(params[1], dict) else {}
+        limit = min(int(config.get('limit') or 1000), 1000)
+        return _result(request_id, chain.signatures(wallet, limit, config.get('before'), config.get('until')))
+
+    if method == 'getBalance':
+        wallet = _wallet(params)
+        if wallet is None:
+            return _error(request_id, -32602, 'Invalid param: Invalid')
+        return _result(request_id, {'context': {'slot': slot, 'apiVersion': SOLANA_VERSION}, 'value': chain.balance(wallet)})
+
+    if method == 'getTransaction':
+        signature = params[0] if params else ''
+        return _result(request_id, chain.transaction(signature))
+
+    if method == 'getVersion':
+        return _result(request_id, {'solana-core': SOLANA_VERSION, 'feature-set': 3580551090})
+
+    if method == 'getSlot':
+        return _result(request_id, slot)
+
+    if method == 'getEpochInfo':
+        return _result(request_id, {
+            'absoluteSlot': slot,
+            'blockHeight': slot - 20_000_000,
+            'epoch': slot // SLOTS_PER_EPOCH,
+            'slotIndex': slot % SLOTS_PER_EPOCH,
+            'slotsInEpoch': SLOTS_PER_EPOCH,
+            'transactionCount': slot * 3000
+        })
+
+    stats['unsupported'] += 1
+    return _error(request_id, -32601, 'Method not found')
+
+
+@app.post("/")
+async def json_rpc(request: Request):
+    """JSON-RPC endpoint accepting single calls and batches"""
+    await asyncio.sleep(faults.delay())
+
+    status = faults.fault()
+    if status == 429:
+        stats['injected_429'] += 1
+        return JSONResponse({'jsonrpc': '2.0', 'error': {'code': 429, 'message': 'Too many requests'}, 'id': None},
+                            status_code=429, headers={'Retry-After': '1'})
+    if status == 500:
+        stats['injected_500'] += 1
+        return JSONResponse({'jsonrpc': '2.0', 'error': {'code': -32603, 'message': 'Internal error'}, 'id': None},
+                            status_code=500)
+
+    payload = await request.json()
+    if isinstance(payload, list):
+        stats['batches'] += 1
+        return [handle(call) for call in payload]
+    return handle(payload)
+
+
+@app.get("/stats")
+async def get_stats():
+    """Calls served per method and faults injected"""
+    return {
+        'uptime_seconds': round(time.time() - chain.started, 1),
+        'transactions_per_wallet': chain.transactions,
+        'latency_ms': faults.latency_ms,
+        'jitter_ms': faults.jitter_ms,
+        'error_rate': faults.error_rate,
+        'rate_limit_rate': faults.rate_limit_rate,
+        'max_rps': faults.max_rps,
+        'calls': dict(stats)
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    import uvicorn
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else FAKE_RPC_PORT
+    print(f"🧪 Fake Solana RPC on http://127.0.0.1:{port}")
+    print(f"   - {FAKE_RPC_TRANSACTIONS} transactions per wallet on average, seed '{FAKE_RPC_SEED}'")
+    print(f"   - {FAKE_RPC_LATENCY_MS}±{FAKE_RPC_JITTER_MS}ms latency, {FAKE_RPC_ERROR_RATE:.0%} errors, {FAKE_RPC_429_RATE:.0%} 429s")
+    print(f"💡 Point SoReL at it: HELIUS_RPC_URL=http://127.0.0.1:{port}")
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
@@ -0,0 +1,256 @@
+"""
+Materialized leaderboard snapshots for SoReL
+The ranked leaderboard is rebuilt periodically into a versioned snapshot
+held in memory and in MongoDB: a header in leaderboard_snapshots and the
+entries in fixed-size documents in leaderboard_snapshot_chunks, so a
+snapshot of any size stays under the BSON document limit. One process,
+holding the builder lease, builds snapshots; every other process adopts
+the newest one it finds. Versions are kept for a fixed time so clients
+can finish paging them.
+
+Pages are served by keyset cursor, so deep pages cost the same as page 1.
+Entries are serialized to JSON once per snapshot, so reads join cached
+bytes instead of validating and encoding every entry on every hit.
+"""
+
+import asyncio
+import bisect
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from lease import MongoLease
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_SNAPSHOT_SIZE = int(os.environ.get('LEADERBOARD_SNAPSHOT_SIZE', '10000'))
+LEADERBOARD_REFRESH_SECONDS = int(os.environ.get('LEADERBOARD_REFRESH_SECONDS', '60'))
+# How long a replaced snapshot version stays pageable
+LEADERBOARD_RETENTION_SECONDS = int(os.environ.get('LEADERBOARD_RETENTION_SECONDS', '900'))
+# Entries per chunk document, well under the 16MB BSON limit
+LEADERBOARD_CHUNK_SIZE = int(os.environ.get('LEADERBOARD_CHUNK_SIZE', '1000'))
+
+# Older snapshot versions each process keeps in memory; others load from Mongo
+SNAPSHOTS_CACHED = 3
+
+
+class LeaderboardSnapshot:
+    """An immutable ranked view of the top wallets"""
+
+    def __init__(
+        self,
+        version: int,
+        built_at: datetime,
+        entries: List[Dict],
+        encode_entry: Optional[Callable[[Dict], bytes]] = None
+    ):
+        self.version = version
+        self.built_at = built_at
+        self.entries = entries
+        # Sort keys in leaderboard order: score descending, address ascending
+        self._keys = [(-e['reputation_score'], e['wallet_address']) for e in entries]
+        self._encode_entry = encode_entry
+        # JSON of entries[:len(_encoded)], filled in as deeper ranks are read
+        self._encoded: List[bytes] = []
+
+    def page_bounds(self, limit: int, after_score: Optional[float] = None, after_address: Optional[str] = None) -> Tuple[int, int, Optional[Dict]]:
+        """Index range after the keyset cursor, plus the cursor for the next page"""
+        start = 0
+        if after_score is not None:
+            start = bisect.bisect_right(self._keys, (-after_score, after_address or ''))
+
+        stop = min(start + limit, len(self.entries))
+        next_cursor = None
+        if stop > start and stop < len(self.entries):
+            last = self.entries[stop - 1]
+            next_cursor = {
+                'after_score': last['reputation_score'],
+                'after_address': last['wallet_address']
+            }
+        return start, stop, next_cursor
+
+    def entries_json(self, start: int, stop: int) -> bytes:
+        """A JSON array of entries[start:stop], encoding each entry only once"""
+        if self._encode_entry is None:
+            raise RuntimeError("Snapshot was built without an entry encoder")
+        stop = max(0, min(stop, len(self.entries)))
+        for entry in self.entries[len(self._encoded):stop]:
+            self._encoded.append(self._encode_entry(entry))
+        return b'[' + b','.join(self._encoded[start:stop]) + b']'
+
+    def to_docs(self, chunk_size: int = LEADERBOARD_CHUNK_SIZE) -> Tuple[Dict, List[Dict]]:
+        """The header document and the entry chunk documents for this snapshot"""
+        entries = []
+        for entry in self.entries:
+            stored = dict(entry)
+            stored['last_analyzed'] = entry['last_analyzed'].isoformat()
+            entries.append(stored)
+        chunks = [
+            {'version': self.version, 'chunk': i, 'entries': entries[start:start + chunk_size]}
+            for i, start in enumerate(range(0, len(entries), chunk_size))
+        ]
+        header = {
+            'version': self.version,
+            'built_at': self.built_at.isoformat(),
+            'size': len(entries),
+            'chunks': len(chunks)
+        }
+        return header, chunks
+
+    @classmethod
+    def from_docs(
+        cls,
+        header: Dict,
+        chunks: List[Dict],
+        encode_entry: Optional[Callable[[Dict], bytes]] = None
+    ) -> 'LeaderboardSnapshot':
+        entries = [
+            _parse_entry(entry)
+            for chunk in sorted(chunks, key=lambda c: c['chunk'])
+            for entry in chunk['entries']
+        ]
+        return cls(header['version'], datetime.fromisoformat(header['built_at']), entries, encode_entry)
+
+
+def _parse_entry(wallet: Dict) -> Dict:
+    if isinstance(wallet.get('last_analyzed'), str):
+        wallet['last_analyzed'] = datetime.fromisoformat(wallet['last_analyzed'])
+    return wallet
+
+
+class LeaderboardStore:
+    """Builds, persists and serves leaderboard snapshots"""
+
+    def __init__(self, db, size: int = LEADERBOARD_SNAPSHOT_SIZE, encode_entry: Optional[Callable[[Dict], bytes]] = None):
+        self.db = db
+        self.size = size
+        # Serializes one entry exactly as the API would, for cached JSON reads
+        self.encode_entry = encode_entry
+        self.snapshot: Optional[LeaderboardSnapshot] = None
+        self._retained: Dict[int, LeaderboardSnapshot] = {}
+        self._rebuild_lock = asyncio.Lock()
+        self.lease = MongoLease(db, 'leaderboard_builder', LEADERBOARD_REFRESH_SECONDS * 3)
+
+    async def _load(self, header: Dict) -> Optional[LeaderboardSnapshot]:
+        chunks = await self.db.leaderboard_snapshot_chunks.find(
+            {'version': header['version']}, {'_id': 0}
+        ).to_list(None)
+        if len(chunks) != header['chunks']:
+            # Expired while we were reading it
+            return None
+        return LeaderboardSnapshot.from_docs(header, chunks, self.encode_entry)
+
+    async def load_latest(self) -> Optional[LeaderboardSnapshot]:
+        """Adopt the newest snapshot the builder has persisted"""
+        header = await self.db.leaderboard_snapshots.find_one(
+            {'complete': True}, {'_id': 0}, sort=[('version', -1)]
+        )
+        if header and (self.snapshot is None or header['version'] > self.snapshot.version):
+            snapshot = await self._load(header)
+            if snapshot is not None:
+                if self.snapshot is not None:
+                    self._retain(self.snapshot)
+                self.snapshot = snapshot
+        return self.snapshot
+
+    async def rebuild(self, persist: bool = True) -> LeaderboardSnapshot:
+        """Rank the top wallets into a new snapshot version"""
+        async with self._rebuild_lock:
+            wallets = await self.db.wallets.find({}, {'_id': 0}).sort(
+                [('reputation_score', -1), ('wallet_address', 1)]
+            ).limit(self.size).to_list(self.size)
+
+            for i, wallet in enumerate(wallets):
+                _parse_entry(wallet)
+                wallet['rank'] = i + 1
+
+            built_at = datetime.now(timezone.utc)
+            version = int(built_at.timestamp() * 1000)
+            if self.snapshot is not None and version <= self.snapshot.version:
+                version = self.snapshot.version + 1
+
+            snapshot = LeaderboardSnapshot(version, built_at, wallets, self.encode_entry)
+            if self.snapshot is not None:
+                self._retain(self.snapshot)
+            self.snapshot = snapshot
+
+            if persist:
+                try:
+                    await self._persist(snapshot)
+                    await self._expire(snapshot.version)
+                except Exception as e:
+                    logger.error(f"Failed to persist leaderboard snapshot {version}: {e}")
+
+            return snapshot
+
+    async def _persist(self, snapshot: LeaderboardSnapshot):
+        # Readers only see the header once every chunk is in place
+        header, chunks = snapshot.to_docs()
+        await self.db.leaderboard_snapshots.insert_one(dict(header, complete=False))
+        if chunks:
+            await self.db.leaderboard_snapshot_chunks.insert_many(chunks, ordered=False)
+        await self.db.leaderboard_snapshots.update_one(
+            {'version': snapshot.version}, {'$set': {'complete': True}}
+        )
+
+    async def _expire(self, latest_version: int):
+        """Delete versions built longer ago than the retention window, except the latest"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=LEADERBOARD_RETENTION_SECONDS)).isoformat()
+        stale = await self.db.leaderboard_snapshots.find(
+            {'built_at': {'$lt': cutoff}, 'version': {'$ne': latest_version}}, {'_id': 0, 'version': 1}
+        ).to_list(None)
+        if stale:
+            versions = [doc['version'] for doc in stale]
+            await self.db.leaderboard_snapshots.delete_many({'version': {'$in': versions}})
+            await self.db.leaderboard_snapshot_chunks.delete_many({'version': {'$in': versions}})
+
+    async def get_version(self, version: int) -> Optional[LeaderboardSnapshot]:
+        """A specific retained snapshot, so clients can finish paging it"""
+        if self.snapshot is not None and self.snapshot.version == version:
+            return self.snapshot
+        snapshot = self._retained.get(version)
+        if snapshot is None:
+            header = await self.db.leaderboard_snapshots.find_one({'version': version, 'complete': True}, {'_id': 0})
+            if header is None:
+                return None
+            snapshot = await self._load(header)
+            if snapshot is None:
+                return None
+            self._retain(snapshot)
+        return snapshot
+
+    def _retain(self, snapshot: LeaderboardSnapshot):
+        self._retained[snapshot.version] = snapshot
+        while len(self._retained) > SNAPSHOTS_CACHED:
+            self._retained.pop(min(self._retained))
+
+    async def current(self) -> LeaderboardSnapshot:
+        """The in-memory snapshot, building one if none exists yet"""
+        if self.snapshot is None:
+            await self.load_latest()
+        if self.snapshot is None:
+            # Only the builder persists; others serve theirs until they adopt one
+            await self.rebuild(persist=await self.lease.acquire())
+        return self.snapshot
+
+    async def run_periodic_rebuild(self, interval_seconds: float = LEADERBOARD_REFRESH_SECONDS):
+        """Rebuild on a fixed interval while holding the builder lease, else adopt the builder's snapshots"""
+        poll_seconds = max(interval_seconds / 4, 1)
+        try:
+            while True:
+                try:
+                    if await self.lease.acquire():
+                        age = (
+                            (datetime.now(timezone.utc) - self.snapshot.built_at).total_seconds()
+                            if self.snapshot is not None else None
+                        )
+                        if age is None or age >= interval_seconds:
+                            await self.rebuild()
+                    else:
+                        await self.load_latest()
+                except Exception as e:
+                    logger.error(f"Leaderboard rebuild failed: {e}")
+                await asyncio.sleep(poll_seconds)
+        finally:
+            await self.lease.release()
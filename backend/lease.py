@@ -0,0 +1,69 @@
+"""
+Leader leases for SoReL background work
+Work that must run in one server process at a time, however many workers
+are serving the API, takes a named lease in the leases collection. The
+holder renews it while it works; if the holder dies, the lease expires and
+another process takes over.
+"""
+
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class MongoLease:
+    """A named, expiring lease held by at most one process"""
+
+    def __init__(self, db, name: str, ttl_seconds: float, holder: str = None):
+        self.db = db
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.holder = holder or uuid.uuid4().hex
+        self.held = False
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; False while another process holds it"""
+        now = _now()
+        try:
+            doc = await self.db.leases.find_one_and_update(
+                {"_id": self.name, "$or": [
+                    {"holder": self.holder},
+                    {"expires_at": {"$lt": now.isoformat()}}
+                ]},
+                {"$set": {
+                    "holder": self.holder,
+                    "expires_at": (now + timedelta(seconds=self.ttl_seconds)).isoformat()
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # The upsert lost to a lease another process holds
+            doc = None
+        except Exception as e:
+            logger.error(f"Renewing lease {self.name} failed: {e}")
+            doc = None
+
+        held = doc is not None and doc.get('holder') == self.holder
+        if held != self.held:
+            logger.info(f"{'Took' if held else 'Lost'} lease {self.name}")
+        self.held = held
+        return held
+
+    async def release(self):
+        if not self.held:
+            return
+        self.held = False
+        try:
+            await self.db.leases.delete_one({"_id": self.name, "holder": self.holder})
+        except Exception as e:
+            logger.warning(f"Releasing lease {self.name} failed: {e}")
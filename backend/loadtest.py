@@ -0,0 +1,302 @@
+"""
+Load generator for the SoReL API
+Drives wallet analysis, wallet lookups, the leaderboard, stats and trends
+at a fixed request rate with a weighted mix of operations. Wallets are
+picked from a Zipfian popularity distribution, so a few are hot and most
+are rarely seen. Requests are scheduled open-loop: latency is measured
+from when a request was due, not when a free connection picked it up, so
+a slow server shows up as latency instead of quietly lowering the load.
+Reports are JSON and can be compared between commits.
+
+Usage:
+    python loadtest.py run [rps] [seconds] [report.json]
+    python loadtest.py compare baseline.json current.json
+
+Run against fake_rpc.py for reproducible numbers:
+    python fake_rpc.py &
+    uvicorn server:app --port 8001 &
+    python loadtest.py run 200 60 before.json
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from solders.pubkey import Pubkey
+
+LOADTEST_URL = os.environ.get('LOADTEST_URL', 'http://localhost:8001')
+LOADTEST_WALLETS = int(os.environ.get('LOADTEST_WALLETS', '1000'))
+LOADTEST_ZIPF_S = float(os.environ.get('LOADTEST_ZIPF_S', '1.1'))
+LOADTEST_SEED = int(os.environ.get('LOADTEST_SEED', '42'))
+LOADTEST_MIX = os.environ.get('LOADTEST_MIX', 'analyze=10,wallet=40,leaderboard=25,stats=15,trends=10')
+# Most-popular wallets analyzed before measuring, so lookups mostly hit
+LOADTEST_WARMUP = int(os.environ.get('LOADTEST_WARMUP', '50'))
+LOADTEST_CONNECTIONS = int(os.environ.get('LOADTEST_CONNECTIONS', '200'))
+LOADTEST_TIMEOUT = float(os.environ.get('LOADTEST_TIMEOUT', '30'))
+# Relative p99 or throughput change that `compare` treats as a regression
+LOADTEST_REGRESSION = float(os.environ.get('LOADTEST_REGRESSION', '0.2'))
+
+OPERATIONS = ('analyze', 'wallet', 'leaderboard', 'stats', 'trends')
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}' in mix; expected one of {OPERATIONS}")
+        weights[name] = float(weight)
+    return weights
+
+
+def synthetic_wallets(count: int, seed: int) -> List[str]:
+    """Deterministic valid addresses, the same for every run with the same seed"""
+    return [
+        str(Pubkey.from_bytes(hashlib.sha256(f"sorel-loadtest:{seed}:{i}".encode()).digest()))
+        for i in range(count)
+    ]
+
+
+class ZipfSampler:
+    """Draws ranks 0..n-1 with probability proportional to 1 / (rank + 1) ** s"""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.rng = rng
+        cumulative = 0.0
+        self.cumulative = []
+        for rank in range(1, n + 1):
+            cumulative += 1 / rank ** s
+            self.cumulative.append(cumulative)
+
+    def sample(self) -> int:
+        return bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], statuses: Counter, errors: int, seconds: float) -> Dict:
+    latencies = sorted(latencies)
+    requests = sum(statuses.values())
+    return {
+        'requests': requests,
+        'throughput_rps': round(requests / seconds, 2) if seconds else 0.0,
+        'errors': errors,
+        'error_rate': round(errors / requests, 4) if requests else 0.0,
+        'p50_ms': round(percentile(latencies, 0.5), 2) if latencies else None,
+        'p90_ms': round(percentile(latencies, 0.9), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99), 2) if latencies else None,
+        'max_ms': round(latencies[-1], 2) if latencies else None,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=lambda item: str(item[0]))}
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        base_url: str = LOADTEST_URL,
+        wallets: int = LOADTEST_WALLETS,
+        zipf_s: float = LOADTEST_ZIPF_S,
+        mix: str = LOADTEST_MIX,
+        seed: int = LOADTEST_SEED,
+        connections: int = LOADTEST_CONNECTIONS,
+        timeout: float = LOADTEST_TIMEOUT
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.api_url = f"{self.base_url}/api"
+        self.wallets = synthetic_wallets(wallets, seed)
+        self.zipf_s = zipf_s
+        self.mix = parse_mix(mix)
+        self.seed = seed
+        self.connections = connections
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.popularity = ZipfSampler(len(self.wallets), zipf_s, self.rng)
+        self.latencies: Dict[str, List[float]] = {name: [] for name in self.mix}
+        self.statuses: Dict[str, Counter] = {name: Counter() for name in self.mix}
+        self.errors: Counter = Counter()
+        self.late = 0
+
+    def next_request(self) -> Tuple[str, str, str, Optional[Dict]]:
+        operation = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        wallet = self.wallets[self.popularity.sample()]
+        if operation == 'analyze':
+            return operation, 'POST', '/wallets/analyze', {'wallet_address': wallet}
+        if operation == 'wallet':
+            return operation, 'GET', f'/wallets/{wallet}', None
+        if operation == 'leaderboard':
+            return operation, 'GET', f'/wallets/leaderboard/top?limit={self.rng.choice((10, 50, 100))}', None
+        if operation == 'stats':
+            return operation, 'GET', '/analytics/stats', None
+        return operation, 'GET', f'/analytics/trends?days={self.rng.choice((7, 30))}', None
+
+    @staticmethod
+    def is_error(operation: str, status: int) -> bool:
+        # Lookups of wallets nobody has analyzed yet are expected to 404
+        if operation == 'wallet' and status == 404:
+            return False
+        return status >= 400
+
+    async def send(self, client: httpx.AsyncClient, request: Tuple, due: float):
+        operation, method, path, body = request
+        try:
+            response = await client.request(method, f"{self.api_url}{path}", json=body)
+            status = response.status_code
+        except httpx.TimeoutException:
+            status = 'timeout'
+        except httpx.HTTPError:
+            status = 'connection_error'
+        latency_ms = (time.perf_counter() - due) * 1000
+
+        self.statuses[operation][status] += 1
+        if isinstance(status, str) or self.is_error(operation, status):
+            self.errors[operation] += 1
+        else:
+            self.latencies[operation].append(latency_ms)
+
+    async def warmup(self, client: httpx.AsyncClient, count: int):
+        """Analyze the hottest wallets so lookups are not all 404s"""
+        semaphore = asyncio.Semaphore(20)
+
+        async def analyze(wallet: str):
+            async with semaphore:
+                try:
+                    await client.post(f"{self.api_url}/wallets/analyze", json={'wallet_address': wallet})
+                except httpx.HTTPError:
+                    pass
+
+        await asyncio.gather(*(analyze(wallet) for wallet in self.wallets[:count]))
+
+    async def run(self, rps: float, seconds: float, warmup: int = LOADTEST_WARMUP) -> Dict:
+        limits = httpx.Limits(max_connections=self.connections, max_keepalive_connections=self.connections)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits) as client:
+            if warmup:
+                print(f"🔥 Warming up {warmup} wallets...")
+                await self.warmup(client, warmup)
+
+            total = int(rps * seconds)
+            print(f"🚀 Sending {total} requests at {rps} req/s to {self.base_url}...")
+            tasks = []
+            start = time.perf_counter()
+            for i in range(total):
+                due = start + i / rps
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif delay < -0.01:
+                    # The generator itself fell behind its schedule
+                    self.late += 1
+                tasks.append(asyncio.create_task(self.send(client, self.next_request(), due)))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+
+        return self.report(rps, seconds, elapsed)
+
+    def report(self, rps: float, seconds: float, elapsed: float) -> Dict:
+        all_latencies = [latency for latencies in self.latencies.values() for latency in latencies]
+        all_statuses = sum(self.statuses.values(), Counter())
+        return {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'base_url': self.base_url,
+                'target_rps': rps,
+                'duration_seconds': seconds,
+                'elapsed_seconds': round(elapsed, 2),
+                'wallets': len(self.wallets),
+                'zipf_s': self.zipf_s,
+                'mix': self.mix,
+                'seed': self.seed,
+                'late_sends': self.late
+            },
+            'overall': summarize(all_latencies, all_statuses, sum(self.errors.values()), elapsed),
+            'operations': {
+                operation: summarize(self.latencies[operation], self.statuses[operation], self.errors[operation], elapsed)
+                for operation in self.mix
+            }
+        }
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = LOADTEST_REGRESSION) -> bool:
+    """Print per-operation deltas; returns False if anything regressed past the threshold"""
+    ok = True
+    print(f"📊 {baseline['meta'].get('commit')} -> {current['meta'].get('commit')}")
+    for key in ('target_rps', 'duration_seconds', 'wallets', 'zipf_s', 'mix', 'seed'):
+        if baseline['meta'].get(key) != current['meta'].get(key):
+            print(f"⚠️  Runs used different {key}: {baseline['meta'].get(key)} vs {current['meta'].get(key)}")
+    sections = [('overall', baseline['overall'], current['overall'])] + [
+        (operation, baseline['operations'][operation], current['operations'][operation])
+        for operation in current['operations'] if operation in baseline['operations']
+    ]
+    for name, before, after in sections:
+        line = f"   {name:<12}"
+        for key in ('throughput_rps', 'p50_ms', 'p99_ms'):
+            old, new = before.get(key), after.get(key)
+            if not old or new is None:
+                line += f" {key} n/a"
+                continue
+            change = (new - old) / old
+            line += f" {key} {old}->{new} ({change:+.0%})"
+            worse = change < -threshold if key == 'throughput_rps' else change > threshold
+            if key != 'p50_ms' and worse:
+                ok = False
+                line += " ⚠️"
+        if after['error_rate'] > before['error_rate'] + 0.01:
+            ok = False
+            line += f" error_rate {before['error_rate']}->{after['error_rate']} ⚠️"
+        print(line)
+    print("✅ No regressions" if ok else "❌ Regression detected")
+    return ok
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'run'
+
+    if command == 'compare':
+        if len(sys.argv) < 4:
+            print("Usage: python loadtest.py compare baseline.json current.json")
+            sys.exit(2)
+        with open(sys.argv[2]) as f:
+            baseline = json.load(f)
+        with open(sys.argv[3]) as f:
+            current = json.load(f)
+        sys.exit(0 if compare(baseline, current) else 1)
+
+    rps = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 30
+    report = asyncio.run(LoadGenerator().run(rps, seconds))
+    output = json.dumps(report, indent=2)
+    if len(sys.argv) > 4:
+        with open(sys.argv[4], 'w') as f:
+            f.write(output + '\n')
+        overall = report['overall']
+        print(f"✅ {overall['requests']} requests, {overall['throughput_rps']} req/s, "
+              f"p50 {overall['p50_ms']}ms, p99 {overall['p99_ms']}ms, {overall['error_rate']:.1%} errors")
+        print(f"   Report written to {sys.argv[4]}")
+    else:
+        print(output)
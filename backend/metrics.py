@@ -0,0 +1,370 @@
+"""
+Prometheus-style metrics for SoReL
+Counters, gauges and fixed-bucket histograms rendered in the Prometheus
+text exposition format. Histograms keep only bucket counts, so memory is
+bounded whatever the traffic, and p50/p95/p99 are estimated from the
+buckets the same way histogram_quantile() does.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+# Seconds; covers sub-millisecond cache hits up to slow RPC backfills
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [
+        (name, str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+        for name, value in pairs
+    ]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named metric family with optional labels; safe to update from threads"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Metric):
+    """A settable gauge, or one read from a callback at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], object]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_in_progress(self, **labels) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _current(self) -> List[Tuple[Tuple[str, ...], float]]:
+        if self.callback is None:
+            with self._lock:
+                return list(self._values.items())
+        # Callbacks return a number, or {label value(s): number} for labelled gauges
+        result = self.callback()
+        if isinstance(result, dict):
+            return [
+                (key if isinstance(key, tuple) else (str(key),), value)
+                for key, value in result.items()
+            ]
+        return [((), result)]
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._current()
+        ]
+
+
+class Histogram(Metric):
+    """Cumulative fixed buckets plus count and sum per label set"""
+
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[key] = series
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _snapshot(self) -> List[Tuple[Tuple[str, ...], List[int], float]]:
+        with self._lock:
+            return [(key, list(counts), total[0]) for key, (counts, total) in self._series.items()]
+
+    def quantile(self, q: float, counts: List[int]) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        total = sum(counts)
+        if total == 0:
+            return None
+        target = q * total
+        cumulative = 0
+        lower = 0.0
+        for i, count in enumerate(counts):
+            upper = self.buckets[i] if i < len(self.buckets) else None
+            if cumulative + count >= target and count > 0:
+                if upper is None:
+                    # Beyond the last bucket the best estimate is its bound
+                    return self.buckets[-1]
+                return lower + (upper - lower) * (target - cumulative) / count
+            cumulative += count
+            if upper is not None:
+                lower = upper
+        return self.buckets[-1]
+
+    def summary(self) -> List[Dict]:
+        result = []
+        for key, counts, total in self._snapshot():
+            count = sum(counts)
+            entry = {
+                'labels': dict(zip(self.labelnames, key)),
+                'count': count,
+                'avg_ms': round(total / count * 1000, 3) if count else 0.0
+            }
+            for q in QUANTILES:
+                value = self.quantile(q, counts)
+                entry[f'p{int(q * 100)}_ms'] = round(value * 1000, 3) if value is not None else None
+            result.append(entry)
+        return result
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, counts, total in self._snapshot():
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + [float('inf')], counts):
+                cumulative += count
+                le = ('le', _format_value(bound) if bound != float('inf') else '+Inf')
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> Dict[str, List[Dict]]:
+        """Histogram percentiles as JSON, for humans rather than Prometheus"""
+        return {
+            name: metric.summary()
+            for name, metric in self._metrics.items()
+            if isinstance(metric, Histogram)
+        }
+
+
+REGISTRY = Registry()
+
+# Metrics recorded outside server.py live here so every module shares them
+RPC_LATENCY = REGISTRY.histogram(
+    'sorel_rpc_request_duration_seconds', 'Solana RPC call latency per method and endpoint', ('method', 'endpoint')
+)
+RPC_ERRORS = REGISTRY.counter(
+    'sorel_rpc_errors_total', 'Failed Solana RPC calls per method and endpoint', ('method', 'endpoint')
+)
+MONGO_LATENCY = REGISTRY.histogram(
+    'sorel_mongo_operation_duration_seconds', 'MongoDB command latency per collection and command', ('collection', 'command')
+)
+MONGO_ERRORS = REGISTRY.counter(
+    'sorel_mongo_errors_total', 'Failed MongoDB commands per collection and command', ('collection', 'command')
+)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Times every MongoDB command per collection; pass it as an event listener
+
+    pymongo calls listeners from Motor's worker threads, which is why the
+    metrics take a lock.
+    """
+
+    # Handshakes, heartbeats and session cleanup are not application work
+    IGNORED_COMMANDS = {'hello', 'isMaster', 'ismaster', 'ping', 'endSessions', 'buildInfo', 'saslStart', 'saslContinue'}
+
+    def __init__(self):
+        self._collections: Dict[Tuple[int, object], str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in self.IGNORED_COMMANDS:
+            return
+        target = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            target = event.command.get('collection')
+        collection = target if isinstance(target, str) else event.database_name
+        with self._lock:
+            self._collections[(event.request_id, event.connection_id)] = collection
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            collection = self._collections.pop((event.request_id, event.connection_id), None)
+        if collection is None:
+            return
+        MONGO_LATENCY.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+        if failed:
+            MONGO_ERRORS.inc(collection=collection, command=event.command_name)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+HTTP_LATENCY = REGISTRY.histogram(
+    'sorel_http_request_duration_seconds', 'API request latency per route', ('method', 'route')
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    'sorel_http_requests_total', 'API requests per route and status', ('method', 'route', 'status')
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    'sorel_http_requests_in_flight', 'API requests currently being served'
+)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording latency and status per route template
+
+    Routes are labelled by their path template (/api/wallets/{wallet_address}),
+    never the raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = {'code': 500}
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            HTTP_LATENCY.observe(elapsed, method=scope['method'], route=route)
+            HTTP_REQUESTS.inc(method=scope['method'], route=route, status=status['code'])
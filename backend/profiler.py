@@ -0,0 +1,258 @@
+"""
+Opt-in sampling profiler for SoReL
+When enabled, a fraction of requests (or any request sent with an
+X-Profile: 1 header) is sampled every few milliseconds from a background
+thread. Each sample records the request's coroutine stack, whether it is
+running Python code or suspended on an await, including tasks it spawns.
+Samples are aggregated per route into collapsed-stack files that
+flamegraph.pl, speedscope and inferno read directly; the sampling thread
+rewrites changed files every few seconds, never the event loop. When
+disabled the middleware costs a single attribute check per request.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'false').lower() == 'true'
+# Fraction of requests profiled without the header; 0 profiles only header requests
+PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', '0'))
+PROFILER_INTERVAL_MS = float(os.environ.get('PROFILER_INTERVAL_MS', '5'))
+PROFILER_DIR = Path(os.environ.get('PROFILER_DIR', str(Path(__file__).parent / 'profiles')))
+# Routes with new samples are written out at most this often
+PROFILER_WRITE_SECONDS = float(os.environ.get('PROFILER_WRITE_SECONDS', '5'))
+
+PROFILE_HEADER = b'x-profile'
+# Unique stacks kept per route before new ones are folded into one entry
+MAX_STACKS_PER_ROUTE = 20000
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _await_stack(coro) -> List[str]:
+    """Labels of a suspended coroutine chain, outermost first"""
+    labels = []
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            labels.append(f"<{type(coro).__name__}>")
+            break
+        labels.append(_frame_label(frame))
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return labels
+
+
+class ProfileSession:
+    """The tasks belonging to one profiled request"""
+
+    def __init__(self, root: asyncio.Task):
+        self.tasks: Set[asyncio.Task] = {root}
+        self.samples: Counter = Counter()
+
+
+_session: ContextVar[Optional[ProfileSession]] = ContextVar('profile_session', default=None)
+
+
+class SamplingProfiler:
+    def __init__(
+        self,
+        enabled: bool = PROFILER_ENABLED,
+        sample_rate: float = PROFILER_SAMPLE_RATE,
+        interval_ms: float = PROFILER_INTERVAL_MS,
+        output_dir: Path = PROFILER_DIR,
+        write_seconds: float = PROFILER_WRITE_SECONDS
+    ):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.output_dir = output_dir
+        self.write_seconds = write_seconds
+        self.routes: Dict[str, Counter] = {}
+        self.requests: Counter = Counter()
+        self._sessions: Set[ProfileSession] = set()
+        # Routes with samples not yet written to their .folded file
+        self._dirty: Set[str] = set()
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread_id: Optional[int] = None
+        self._factory_loop = None
+
+    def configure(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None):
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+
+    def wants(self, headers) -> bool:
+        """Whether to profile a request, given its raw ASGI headers"""
+        for name, value in headers:
+            if name == PROFILE_HEADER:
+                return value in (b'1', b'true')
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _install_task_factory(self, loop):
+        # Tasks spawned by a profiled request (gathers, single-flight work)
+        # join its session so their stacks are sampled too
+        if self._factory_loop is loop:
+            return
+        previous = loop.get_task_factory()
+
+        def factory(loop, coro, **kwargs):
+            task = previous(loop, coro, **kwargs) if previous else asyncio.Task(coro, loop=loop, **kwargs)
+            session = _session.get()
+            if session is not None:
+                with self._lock:
+                    session.tasks.add(task)
+            return task
+
+        loop.set_task_factory(factory)
+        self._factory_loop = loop
+
+    def start(self) -> ProfileSession:
+        loop = asyncio.get_running_loop()
+        self._install_task_factory(loop)
+        self._loop_thread_id = threading.get_ident()
+        session = ProfileSession(asyncio.current_task())
+        _session.set(session)
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sample_loop, name='sorel-profiler', daemon=True)
+                self._thread.start()
+        return session
+
+    def stop(self, session: ProfileSession, route: str):
+        with self._lock:
+            self._sessions.discard(session)
+            stacks = self.routes.setdefault(route, Counter())
+            for stack, count in session.samples.items():
+                if stack not in stacks and len(stacks) >= MAX_STACKS_PER_ROUTE:
+                    stack = "[other stacks]"
+                stacks[stack] += count
+            self.requests[route] += 1
+            self._dirty.add(route)
+
+    def flush(self):
+        """Write every route with new samples; blocking, so never on the event loop"""
+        with self._lock:
+            pending = {
+                route: [f"{stack} {count}" for stack, count in self.routes.get(route, {}).items()]
+                for route in self._dirty
+            }
+            self._dirty = set()
+            self._last_write = time.monotonic()
+        for route, lines in pending.items():
+            self._write(route, lines)
+
+    def _write(self, route: str, lines: List[str]):
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            path = self.output_dir / f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', route).strip('_')}.folded"
+            path.write_text('\n'.join(lines) + '\n')
+        except OSError as e:
+            logger.warning(f"Could not write profile for {route}: {e}")
+
+    def _task_stack(self, task: asyncio.Task, running_frame) -> Optional[List[str]]:
+        coro = task.get_coro()
+        root_frame = getattr(coro, 'cr_frame', None)
+        if root_frame is None:
+            return None
+
+        # Running: the loop thread is executing inside this task's coroutine
+        frames = []
+        frame = running_frame
+        while frame is not None:
+            frames.append(frame)
+            if frame is root_frame:
+                return [_frame_label(f) for f in reversed(frames)]
+            frame = frame.f_back
+
+        labels = _await_stack(coro)
+        labels.append('[await]')
+        return labels
+
+    def _sample_loop(self):
+        # Runs until no request is being profiled and every sample is written
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                sessions = list(self._sessions)
+                if not sessions and not self._dirty:
+                    self._thread = None
+                    return
+                snapshots = [(session, list(session.tasks)) for session in sessions]
+                write_due = bool(self._dirty) and time.monotonic() - self._last_write >= self.write_seconds
+
+            if write_due:
+                self.flush()
+
+            running_frame = sys._current_frames().get(self._loop_thread_id)
+            for session, tasks in snapshots:
+                for task in tasks:
+                    if task.done():
+                        continue
+                    try:
+                        stack = self._task_stack(task, running_frame)
+                    except Exception:
+                        # The loop thread moved on while we walked the stack
+                        continue
+                    if stack:
+                        with self._lock:
+                            session.samples[';'.join(stack)] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'sample_rate': self.sample_rate,
+                'interval_ms': self.interval * 1000,
+                'output_dir': str(self.output_dir),
+                'active_sessions': len(self._sessions),
+                'routes': {
+                    route: {'requests': self.requests[route], 'samples': sum(stacks.values())}
+                    for route, stacks in self.routes.items()
+                }
+            }
+
+    def reset(self):
+        with self._lock:
+            self.routes = {}
+            self.requests = Counter()
+            self._dirty = set()
+
+
+profiler = SamplingProfiler()
+
+
+class ProfilerMiddleware:
+    """ASGI middleware profiling selected requests into per-route flamegraphs"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not profiler.enabled or scope['type'] != 'http' or not profiler.wants(scope.get('headers', [])):
+            await self.app(scope, receive, send)
+            return
+
+        session = profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            profiler.stop(session, f"{scope['method']} {route}")
@@ -0,0 +1,129 @@
+"""
+Order-statistics index over reputation scores for SoReL
+A Fenwick tree over fixed-width score buckets gives O(log n) rank and
+percentile lookups for any score, and the score distribution, without
+scanning the wallets collection
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FenwickTree:
+    """Binary indexed tree of bucket counts"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    @classmethod
+    def from_counts(cls, counts: List[int]) -> 'FenwickTree':
+        """Build in O(n) from per-bucket counts"""
+        fenwick = cls(len(counts))
+        tree = fenwick.tree
+        for i, count in enumerate(counts, start=1):
+            tree[i] += count
+            parent = i + (i & -i)
+            if parent <= fenwick.size:
+                tree[parent] += tree[i]
+        return fenwick
+
+    def add(self, index: int, delta: int):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index: int) -> int:
+        """Sum of buckets 0..index inclusive"""
+        total = 0
+        i = min(index, self.size - 1) + 1
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class ScoreRankIndex:
+    """Rank and percentile of any reputation score among all wallets
+
+    Scores are bucketed at the precision they are stored with (0.01), so
+    wallets with equal scores share a rank.
+    """
+
+    def __init__(self, max_score: float = 1000, resolution: float = 0.01):
+        self.max_score = max_score
+        self.resolution = resolution
+        self.buckets = int(round(max_score / resolution)) + 1
+        self.tree = FenwickTree(self.buckets)
+        self.total = 0
+        self.ready = False
+
+    def _bucket(self, score: float) -> int:
+        return max(0, min(self.buckets - 1, int(round(score / self.resolution))))
+
+    def add(self, score: float):
+        self.tree.add(self._bucket(score), 1)
+        self.total += 1
+
+    def remove(self, score: float):
+        self.tree.add(self._bucket(score), -1)
+        self.total -= 1
+
+    def update(self, old_score: Optional[float], new_score: float):
+        """Record an upsert; old_score is None for a wallet seen for the first time"""
+        if old_score is not None:
+            self.remove(old_score)
+        self.add(new_score)
+
+    def count_above(self, score: float) -> int:
+        return self.total - self.tree.prefix_sum(self._bucket(score))
+
+    def rank(self, score: float) -> Optional[int]:
+        """1-based rank; ties share the best rank"""
+        if not self.ready:
+            return None
+        return self.count_above(score) + 1
+
+    def percentile(self, score: float) -> Optional[float]:
+        """Percentage of wallets scoring at or below this score"""
+        if not self.ready or self.total <= 0:
+            return None
+        return round((self.total - self.count_above(score)) / self.total * 100, 2)
+
+    def distribution(self, bins: int = 20) -> List[Dict]:
+        """Wallet counts per equal-width score range"""
+        width = self.max_score / bins
+        result = []
+        previous = 0
+        for i in range(bins):
+            upper = self.max_score if i == bins - 1 else (i + 1) * width
+            # Each bin is [lower, upper); the last one also includes max_score
+            upper_bucket = self.buckets - 1 if i == bins - 1 else self._bucket(upper) - 1
+            cumulative = self.tree.prefix_sum(upper_bucket)
+            result.append({
+                'min_score': round(i * width, 2),
+                'max_score': round(upper, 2),
+                'wallet_count': cumulative - previous
+            })
+            previous = cumulative
+        return result
+
+    async def rebuild(self, db, batch_size: int = 10000):
+        """Recount every stored score and swap in the fresh tree"""
+        counts = [0] * self.buckets
+        total = 0
+        cursor = db.wallets.find({}, {'_id': 0, 'reputation_score': 1}).batch_size(batch_size)
+        async for doc in cursor:
+            score = doc.get('reputation_score')
+            if score is None:
+                continue
+            counts[self._bucket(score)] += 1
+            total += 1
+
+        self.tree = FenwickTree.from_counts(counts)
+        self.total = total
+        self.ready = True
+        logger.info(f"Rank index rebuilt over {total} wallets")
@@ -0,0 +1,168 @@
+"""
+Client-side RPC rate limiting for SoReL
+A token bucket shared by every RPC call that halves its rate when the
+provider answers 429 and creeps back up on success, plus retry helpers
+with jittered exponential backoff
+"""
+
+import asyncio
+import random
+import time
+from typing import Dict, Optional
+
+import httpx
+
+
+class RateLimitedError(Exception):
+    """The RPC provider kept rate limiting after every retry"""
+
+
+def _status_error(exc: BaseException) -> Optional[httpx.HTTPStatusError]:
+    # solana-py wraps httpx errors in SolanaRpcException; walk the chain
+    while exc is not None:
+        if isinstance(exc, httpx.HTTPStatusError):
+            return exc
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    status_error = _status_error(exc)
+    return status_error is not None and status_error.response.status_code == 429
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Retry-After from a 429 response, if the provider sent one"""
+    status_error = _status_error(exc)
+    if status_error is None:
+        return None
+    try:
+        return float(status_error.response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retriable(exc: BaseException) -> bool:
+    """Rate limits, timeouts, connection failures and 5xx are worth retrying"""
+    status_error = _status_error(exc)
+    if status_error is not None:
+        status = status_error.response.status_code
+        return status == 429 or status >= 500
+
+    while exc is not None:
+        if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError)):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """Full-jitter exponential backoff for the given retry attempt"""
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose refill rate adapts to provider rate limiting
+
+    The rate is halved on a 429 (never below min_rate, at most once per
+    second so a burst of in-flight rejections counts once) and recovers by
+    5% of the configured rate per successful call. A rate of 0 disables it.
+    """
+
+    def __init__(self, rate: float, burst: int, min_rate: float = 1.0):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate) if rate > 0 else 0
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self._lock = asyncio.Lock()
+        self.acquired = 0
+        self.tokens_acquired = 0
+        self.queued = 0
+        self.queue_seconds = 0.0
+        self.rate_limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rate > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: int = 1) -> float:
+        """Wait for tokens and return the seconds spent queueing
+
+        A request costing more than the burst (a large JSON-RPC batch) waits
+        for a full bucket and leaves it in debt, which later callers repay.
+        """
+        if not self.enabled:
+            return 0.0
+
+        tokens = max(tokens, 1)
+        start = time.monotonic()
+        # The lock keeps waiters in arrival order
+        async with self._lock:
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+            self._refill()
+            needed = min(tokens, self.burst)
+            if self.tokens < needed:
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+
+        waited = time.monotonic() - start
+        self.acquired += 1
+        self.tokens_acquired += tokens
+        if waited > 0.001:
+            self.queued += 1
+        self.queue_seconds += waited
+        return waited
+
+    def has_headroom(self) -> bool:
+        """True when nobody is queueing and the provider is not throttling us"""
+        if not self.enabled:
+            return True
+        return (
+            not self._lock.locked()
+            and self.rate >= self.max_rate
+            and self.paused_until <= time.monotonic()
+        )
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """Multiplicative decrease after a 429"""
+        if not self.enabled:
+            return
+        self.rate_limited += 1
+        now = time.monotonic()
+        if now - self.last_decrease >= 1.0:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.last_decrease = now
+        self.tokens = min(self.tokens, 0.0)
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+    def on_success(self):
+        """Additive increase back towards the configured rate"""
+        if self.enabled and self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def stats(self) -> Dict:
+        return {
+            'configured_rate': self.max_rate,
+            'current_rate': round(self.rate, 2),
+            'burst': self.burst,
+            'acquired': self.acquired,
+            'tokens_acquired': self.tokens_acquired,
+            'queued': self.queued,
+            'queue_seconds_total': round(self.queue_seconds, 4),
+            'avg_queue_ms': round(self.queue_seconds / self.acquired * 1000, 2) if self.acquired else 0.0,
+            'rate_limited_responses': self.rate_limited
+        }
@@ -0,0 +1,310 @@
+"""
+Background refresh of stale wallets for SoReL
+Periodically ranks leaderboard and frequently requested wallets by how
+stale their last analysis is, where they sit on the leaderboard and how
+often they are requested, and re-analyzes the most important ones with a
+small worker pool that only spends spare RPC budget. Popular wallets are
+refreshed before anyone has to wait; the long tail is only analyzed again
+when someone asks for it.
+
+Only the process holding the refresh lease plans and refreshes. Every
+process publishes its most requested wallets, so the leader sees the
+popularity of the whole deployment.
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from lease import MongoLease
+from rate_limiter import AdaptiveRateLimiter
+
+logger = logging.getLogger(__name__)
+
+REFRESH_ENABLED = os.environ.get('REFRESH_ENABLED', 'true').lower() == 'true'
+# Age at which a leaderboard or popular wallet is worth re-analyzing
+# unprompted; far longer than the response cache's freshness window
+REFRESH_STALE_SECONDS = int(os.environ.get('REFRESH_STALE_SECONDS', str(6 * 3600)))
+REFRESH_WORKERS = int(os.environ.get('REFRESH_WORKERS', '2'))
+# Background refreshes per second, on top of the shared RPC limiter
+REFRESH_RATE = float(os.environ.get('REFRESH_RATE', '0.5'))
+REFRESH_PLAN_SECONDS = int(os.environ.get('REFRESH_PLAN_SECONDS', '30'))
+REFRESH_QUEUE_SIZE = int(os.environ.get('REFRESH_QUEUE_SIZE', '1000'))
+REFRESH_CANDIDATES = int(os.environ.get('REFRESH_CANDIDATES', '500'))
+# Requested wallets are refreshed once this fraction of the response
+# cache's freshness window has passed, so the next visitor still finds a
+# fresh result; leaderboard wallets nobody requests once this fraction of
+# REFRESH_STALE_SECONDS has
+REFRESH_AHEAD = float(os.environ.get('REFRESH_AHEAD', '0.8'))
+
+# Priority boosts: rank 1 gets the full leaderboard weight, fading to 0 at
+# the end of the snapshot; popularity grows with log requests per half-life
+LEADERBOARD_WEIGHT = 10.0
+POPULARITY_WEIGHT = 5.0
+POPULARITY_HALF_LIFE_SECONDS = 3600
+POPULARITY_MAX_WALLETS = 10000
+# Published popularity older than this is from a process that went away
+POPULARITY_PUBLISH_TTL_SECONDS = REFRESH_PLAN_SECONDS * 4
+
+THROUGHPUT_WINDOW_SECONDS = 60
+
+
+class PopularityTracker:
+    """Exponentially decaying request counts for the most requested wallets"""
+
+    def __init__(self, half_life_seconds: float = POPULARITY_HALF_LIFE_SECONDS, max_wallets: int = POPULARITY_MAX_WALLETS):
+        self.decay = math.log(2) / half_life_seconds
+        self.max_wallets = max_wallets
+        self._counts: Dict[str, Tuple[float, float]] = {}
+
+    def _current(self, count: float, updated: float, now: float) -> float:
+        return count * math.exp(-self.decay * (now - updated))
+
+    def record(self, wallet_address: str):
+        now = time.monotonic()
+        count, updated = self._counts.get(wallet_address, (0.0, now))
+        self._counts[wallet_address] = (self._current(count, updated, now) + 1, now)
+        if len(self._counts) > self.max_wallets:
+            # Forget the least requested half in one pass
+            keep = self.top(self.max_wallets // 2)
+            self._counts = {address: (score, now) for address, score in keep}
+
+    def score(self, wallet_address: str) -> float:
+        entry = self._counts.get(wallet_address)
+        if entry is None:
+            return 0.0
+        return self._current(entry[0], entry[1], time.monotonic())
+
+    def top(self, n: int) -> List[Tuple[str, float]]:
+        now = time.monotonic()
+        return heapq.nlargest(
+            n,
+            ((address, self._current(count, updated, now)) for address, (count, updated) in self._counts.items()),
+            key=lambda item: item[1]
+        )
+
+
+def _age_seconds(last_analyzed, now: datetime) -> Optional[float]:
+    if isinstance(last_analyzed, str):
+        last_analyzed = datetime.fromisoformat(last_analyzed)
+    if not isinstance(last_analyzed, datetime):
+        return None
+    if last_analyzed.tzinfo is None:
+        last_analyzed = last_analyzed.replace(tzinfo=timezone.utc)
+    return (now - last_analyzed).total_seconds()
+
+
+class RefreshScheduler:
+    """Priority queue of stale wallets drained by a budgeted worker pool"""
+
+    def __init__(
+        self,
+        db,
+        refresh: Callable[[str], Awaitable[object]],
+        leaderboard_store,
+        rpc_limiter: AdaptiveRateLimiter,
+        stale_after_seconds: float = REFRESH_STALE_SECONDS,
+        freshness_seconds: Optional[float] = None,
+        workers: int = REFRESH_WORKERS,
+        rate: float = REFRESH_RATE,
+        queue_size: int = REFRESH_QUEUE_SIZE,
+        candidates: int = REFRESH_CANDIDATES
+    ):
+        self.db = db
+        self.refresh = refresh
+        self.leaderboard_store = leaderboard_store
+        self.rpc_limiter = rpc_limiter
+        self.stale_after_seconds = max(stale_after_seconds, 1)
+        # The response cache's freshness window, which requested wallets are kept within
+        self.freshness_seconds = freshness_seconds if freshness_seconds and freshness_seconds > 0 else self.stale_after_seconds
+        self.workers = workers
+        self.budget = AdaptiveRateLimiter(rate, max(workers, 1))
+        self.queue_size = queue_size
+        self.candidates = candidates
+        self.popularity = PopularityTracker()
+        self.lease = MongoLease(db, 'refresh_scheduler', REFRESH_PLAN_SECONDS * 3)
+
+        # Max-heap by priority; _queued holds each wallet's due time and
+        # entries missing from it are skipped when popped
+        self._heap: List[Tuple[float, int, str]] = []
+        self._queued: Dict[str, float] = {}
+        self._sequence = 0
+        self._available = asyncio.Event()
+
+        self.planned_at: Optional[datetime] = None
+        self.refreshed = 0
+        self.failed = 0
+        self.superseded = 0
+        self.lag_seconds_total = 0.0
+        self._completed: Deque[float] = deque()
+
+    def record_request(self, wallet_address: str):
+        """Count an API request for a wallet towards its popularity"""
+        self.popularity.record(wallet_address)
+
+    def record_analysis(self, wallet_address: str):
+        """A wallet was just analyzed, so any queued refresh is no longer needed"""
+        if self._queued.pop(wallet_address, None) is not None:
+            self.superseded += 1
+
+    def priority(self, age_seconds: float, rank: Optional[int], popularity: float) -> float:
+        staleness = math.log1p(age_seconds / self.stale_after_seconds)
+        boost = 1.0 + POPULARITY_WEIGHT * math.log1p(popularity)
+        if rank is not None and self.leaderboard_store.size:
+            boost += LEADERBOARD_WEIGHT * max(0.0, 1 - (rank - 1) / self.leaderboard_store.size)
+        return staleness * boost
+
+    async def publish_popularity(self):
+        """Share this process's most requested wallets with the leader"""
+        await self.db.refresh_popularity.update_one(
+            {"_id": self.lease.holder},
+            {"$set": {
+                "wallets": [[address, score] for address, score in self.popularity.top(self.candidates)],
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }},
+            upsert=True
+        )
+
+    async def _deployment_popularity(self, now: datetime) -> Dict[str, float]:
+        """Request counts summed over every live process"""
+        cutoff = datetime.fromtimestamp(now.timestamp() - POPULARITY_PUBLISH_TTL_SECONDS, timezone.utc).isoformat()
+        await self.db.refresh_popularity.delete_many({"updated_at": {"$lt": cutoff}})
+        totals: Dict[str, float] = {}
+        async for doc in self.db.refresh_popularity.find({}, {"wallets": 1}):
+            for address, score in doc.get('wallets', []):
+                totals[address] = totals.get(address, 0.0) + score
+        return totals
+
+    async def _candidates(self, popularity: Dict[str, float]) -> Dict[str, Tuple[object, Optional[int]]]:
+        """last_analyzed and leaderboard rank of leaderboard and popular wallets"""
+        found: Dict[str, Tuple[object, Optional[int]]] = {}
+
+        snapshot = self.leaderboard_store.snapshot
+        if snapshot is not None:
+            for entry in snapshot.entries[:self.candidates]:
+                found[entry['wallet_address']] = (entry['last_analyzed'], entry.get('rank'))
+
+        popular = heapq.nlargest(self.candidates, popularity, key=popularity.get)
+        popular = [address for address in popular if address not in found]
+        if popular:
+            async for doc in self.db.wallets.find(
+                {"wallet_address": {"$in": popular}},
+                {"_id": 0, "wallet_address": 1, "last_analyzed": 1}
+            ):
+                found[doc['wallet_address']] = (doc['last_analyzed'], None)
+
+        return found
+
+    async def plan(self) -> int:
+        """Rebuild the queue from the current candidates; returns its depth"""
+        now = datetime.now(timezone.utc)
+        popularity = await self._deployment_popularity(now)
+        scored = []
+        for address, (last_analyzed, rank) in (await self._candidates(popularity)).items():
+            window = self.freshness_seconds if popularity.get(address, 0.0) > 0 else self.stale_after_seconds
+            refresh_after = window * REFRESH_AHEAD
+            age = _age_seconds(last_analyzed, now)
+            if age is None or age < refresh_after:
+                continue
+            due_at = time.time() - (age - refresh_after)
+            scored.append((self.priority(age, rank, popularity.get(address, 0.0)), address, due_at))
+
+        top = heapq.nlargest(self.queue_size, scored)
+        self._heap = []
+        self._queued = {}
+        for priority, address, due_at in top:
+            self._sequence += 1
+            self._heap.append((-priority, self._sequence, address))
+            self._queued[address] = due_at
+        heapq.heapify(self._heap)
+
+        self.planned_at = now
+        if self._heap:
+            self._available.set()
+        return len(self._queued)
+
+    async def _next(self) -> Tuple[str, float]:
+        while True:
+            while self._heap:
+                _, _, address = heapq.heappop(self._heap)
+                due_at = self._queued.pop(address, None)
+                if due_at is not None:
+                    return address, due_at
+            self._available.clear()
+            await self._available.wait()
+
+    async def _wait_for_headroom(self):
+        # Interactive requests and a throttling provider take precedence
+        while not self.rpc_limiter.has_headroom():
+            await asyncio.sleep(1)
+
+    async def _worker(self):
+        while True:
+            address, due_at = await self._next()
+            await self.budget.acquire()
+            await self._wait_for_headroom()
+            try:
+                await self.refresh(address)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Background refresh of {address} failed: {e}")
+                continue
+
+            completed = time.monotonic()
+            self.refreshed += 1
+            self.lag_seconds_total += max(0.0, time.time() - due_at)
+            self._completed.append(completed)
+
+    async def _plan_periodically(self):
+        while True:
+            try:
+                await self.publish_popularity()
+                if await self.lease.acquire():
+                    await self.plan()
+                else:
+                    # Another process refreshes; drop anything planned while leading
+                    self._heap = []
+                    self._queued = {}
+            except Exception as e:
+                logger.error(f"Refresh planning failed: {e}")
+            await asyncio.sleep(REFRESH_PLAN_SECONDS)
+
+    async def run(self):
+        """Plan and refresh until cancelled"""
+        logger.info(f"Refresh scheduler started with {self.workers} workers at {self.budget.max_rate}/s")
+        try:
+            await asyncio.gather(
+                self._plan_periodically(),
+                *(self._worker() for _ in range(self.workers))
+            )
+        finally:
+            await self.lease.release()
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        while self._completed and self._completed[0] < now - THROUGHPUT_WINDOW_SECONDS:
+            self._completed.popleft()
+        oldest_due = min(self._queued.values()) if self._queued else None
+        return {
+            'leader': self.lease.held,
+            'stale_after_seconds': self.stale_after_seconds,
+            'freshness_seconds': self.freshness_seconds,
+            'queue_depth': len(self._queued),
+            'lag_seconds': round(max(0.0, time.time() - oldest_due), 2) if oldest_due is not None else 0.0,
+            'avg_lag_seconds': round(self.lag_seconds_total / self.refreshed, 2) if self.refreshed else 0.0,
+            'refreshed': self.refreshed,
+            'failed': self.failed,
+            'superseded': self.superseded,
+            'refreshes_per_minute': len(self._completed) * 60 / THROUGHPUT_WINDOW_SECONDS,
+            'workers': self.workers,
+            'rate_limit': self.budget.stats()['current_rate'],
+            'planned_at': self.planned_at.isoformat() if self.planned_at else None
+        }
@@ -0,0 +1,167 @@
+"""
+Bulk re-scoring for SoReL
+Recomputes reputation_score for stored wallets from their saved metrics
+after the scoring caps change, without any RPC calls. Metrics are streamed
+from MongoDB in large batches, scored as NumPy columns and written back
+with unordered bulk writes tagged with the current score_version.
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Dict, List
+
+import numpy as np
+from pymongo import UpdateOne
+
+from server import ReputationEngine, WalletMetrics, client, db, fetcher
+
+RESCORE_BATCH_SIZE = int(os.environ.get('RESCORE_BATCH_SIZE', '20000'))
+
+METRIC_FIELDS = [
+    'transaction_count',
+    'total_volume',
+    'contract_interactions',
+    'wallet_age_days',
+    'activity_frequency',
+    'unique_programs',
+]
+
+
+def metrics_to_columns(docs: List[Dict]) -> Dict[str, np.ndarray]:
+    """One float64 array per metric field, missing values as 0"""
+    count = len(docs)
+    metrics = [doc.get('metrics') or {} for doc in docs]
+    return {
+        field: np.fromiter((m.get(field) or 0 for m in metrics), dtype=np.float64, count=count)
+        for field in METRIC_FIELDS
+    }
+
+
+async def _write_batch(docs: List[Dict], dry_run: bool) -> Dict[str, int]:
+    scores = ReputationEngine.calculate_scores_array(metrics_to_columns(docs))
+
+    operations = []
+    changed = 0
+    for doc, score in zip(docs, scores.tolist()):
+        # Rounded exactly as build_wallet_data rounds freshly analyzed scores
+        score = round(score, 2)
+        if score != doc.get('reputation_score'):
+            changed += 1
+        operations.append(UpdateOne(
+            {'_id': doc['_id']},
+            {'$set': {'reputation_score': score, 'score_version': ReputationEngine.SCORE_VERSION}}
+        ))
+
+    if operations and not dry_run:
+        await db.wallets.bulk_write(operations, ordered=False)
+    return {'scored': len(docs), 'changed': changed}
+
+
+async def rescore_wallets(rescore_all: bool = False, batch_size: int = RESCORE_BATCH_SIZE, dry_run: bool = False) -> Dict:
+    """Re-score every wallet not yet on the current score_version (or all of them)"""
+    query = {} if rescore_all else {'score_version': {'$ne': ReputationEngine.SCORE_VERSION}}
+    total = await db.wallets.count_documents(query)
+    print(f"🧮 Re-scoring {total:,} wallets to score_version {ReputationEngine.SCORE_VERSION}{' (dry run)' if dry_run else ''}")
+
+    scored = 0
+    changed = 0
+    start = time.perf_counter()
+    batch: List[Dict] = []
+
+    cursor = db.wallets.find(query, {'_id': 1, 'reputation_score': 1, 'metrics': 1}).batch_size(batch_size)
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            result = await _write_batch(batch, dry_run)
+            scored += result['scored']
+            changed += result['changed']
+            batch = []
+            elapsed = time.perf_counter() - start
+            print(f"   ⏳ {scored:,}/{total:,} wallets ({scored / elapsed:,.0f}/s)")
+
+    if batch:
+        result = await _write_batch(batch, dry_run)
+        scored += result['scored']
+        changed += result['changed']
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        'scored': scored,
+        'changed': changed,
+        'seconds': round(elapsed, 2),
+        'wallets_per_second': round(scored / elapsed, 2) if elapsed else 0.0
+    }
+    print(f"✅ Re-scored {scored:,} wallets ({changed:,} changed) in {elapsed:.2f}s")
+    print("💡 Rank index, stats and leaderboard pick the new scores up on their next rebuild")
+    return summary
+
+
+def synthetic_metrics(count: int, seed: int = 42) -> List[Dict]:
+    """Metric documents spread across and beyond every scoring cap"""
+    rng = random.Random(seed)
+    return [
+        {
+            'transaction_count': rng.randint(0, 5000),
+            'total_volume': round(rng.uniform(0, 50000), 2),
+            'contract_interactions': rng.randint(0, 200),
+            'wallet_age_days': rng.randint(0, 1500),
+            'activity_frequency': round(rng.uniform(0, 10), 2),
+            'unique_programs': rng.randint(0, 20),
+        }
+        for _ in range(count)
+    ]
+
+
+def benchmark(count: int = 1_000_000) -> Dict:
+    """Compare the per-wallet scalar path with the vectorized one on synthetic metrics"""
+    docs = [{'metrics': metrics} for metrics in synthetic_metrics(count)]
+    print(f"🏁 Scoring {count:,} synthetic wallets")
+
+    start = time.perf_counter()
+    scalar = [ReputationEngine.calculate_score(WalletMetrics(**doc['metrics'])) for doc in docs]
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = ReputationEngine.calculate_scores_array(metrics_to_columns(docs))
+    vectorized_seconds = time.perf_counter() - start
+
+    max_difference = float(np.max(np.abs(np.asarray(scalar) - vectorized))) if count else 0.0
+    result = {
+        'wallets': count,
+        'scalar_seconds': round(scalar_seconds, 4),
+        'vectorized_seconds': round(vectorized_seconds, 4),
+        'scalar_wallets_per_second': round(count / scalar_seconds, 2) if scalar_seconds else 0.0,
+        'vectorized_wallets_per_second': round(count / vectorized_seconds, 2) if vectorized_seconds else 0.0,
+        'speedup': round(scalar_seconds / vectorized_seconds, 2) if vectorized_seconds else 0.0,
+        'max_difference': max_difference
+    }
+    print(f"   - Scalar:     {scalar_seconds:.3f}s ({result['scalar_wallets_per_second']:,.0f} wallets/s)")
+    print(f"   - Vectorized: {vectorized_seconds:.3f}s ({result['vectorized_wallets_per_second']:,.0f} wallets/s, incl. column build)")
+    print(f"   - Speedup:    {result['speedup']}x, max score difference {max_difference}")
+    return result
+
+
+async def main(rescore_all: bool, dry_run: bool):
+    try:
+        await rescore_wallets(rescore_all=rescore_all, dry_run=dry_run)
+    except Exception as e:
+        print(f"❌ Error re-scoring wallets: {e}")
+        raise
+    finally:
+        # Importing server opened the RPC pool's clients as well
+        await fetcher.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        # python rescore.py benchmark [wallet_count]
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000)
+    else:
+        # python rescore.py [all] [dry-run]
+        args = set(sys.argv[1:])
+        asyncio.run(main(rescore_all='all' in args, dry_run='dry-run' in args))
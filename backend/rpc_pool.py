@@ -0,0 +1,302 @@
+"""
+Multi-endpoint Solana RPC pool for SoReL
+Routes each call to the healthiest endpoint using live latency and error
+rates, ejects failing endpoints for a cool-down, and hedges slow calls to a
+second endpoint. Every call passes a shared adaptive rate limiter and is
+retried with jittered backoff on rate limits and transient errors.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+
+import httpx
+from solana.rpc.async_api import AsyncClient
+
+from metrics import RPC_ERRORS, RPC_LATENCY
+from rate_limiter import (
+    AdaptiveRateLimiter,
+    RateLimitedError,
+    backoff_delay,
+    is_rate_limited,
+    is_retriable,
+    retry_after_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+RPC_HEDGE_AFTER_MS = float(os.environ.get('RPC_HEDGE_AFTER_MS', '750'))
+RPC_EJECT_AFTER_ERRORS = int(os.environ.get('RPC_EJECT_AFTER_ERRORS', '3'))
+RPC_EJECT_SECONDS = float(os.environ.get('RPC_EJECT_SECONDS', '30'))
+
+# Provider budget; RPC_RATE_LIMIT=0 disables client-side limiting
+RPC_RATE_LIMIT = float(os.environ.get('RPC_RATE_LIMIT', '10'))
+RPC_RATE_BURST = int(os.environ.get('RPC_RATE_BURST', '10'))
+RPC_MIN_RATE = float(os.environ.get('RPC_MIN_RATE', '1'))
+RPC_MAX_RETRIES = int(os.environ.get('RPC_MAX_RETRIES', '3'))
+RPC_RETRY_BASE_MS = float(os.environ.get('RPC_RETRY_BASE_MS', '250'))
+RPC_RETRY_MAX_MS = float(os.environ.get('RPC_RETRY_MAX_MS', '8000'))
+
+# Weight of each new sample in the moving averages
+EWMA_ALPHA = 0.2
+
+
+class RPCEndpoint:
+    """One RPC provider and its live health statistics"""
+
+    def __init__(self, url: str):
+        self.url = url
+        # Provider URLs carry API keys; only the host is ever reported
+        self.name = urlparse(url).netloc or url
+        self.client = AsyncClient(url)
+        self.latency_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_errors = 0
+        self.ejected_until = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until > time.monotonic()
+
+    def score(self) -> float:
+        """Lower is healthier; unmeasured endpoints are tried first"""
+        latency = self.latency_ms if self.latency_ms is not None else 0.0
+        return latency * (1 + 4 * self.error_rate) + self.in_flight
+
+    def record_latency(self, latency_ms: float):
+        self.latency_ms = latency_ms if self.latency_ms is None else (
+            EWMA_ALPHA * latency_ms + (1 - EWMA_ALPHA) * self.latency_ms
+        )
+
+    def record(self, latency_ms: float, ok: bool):
+        self.requests += 1
+        if ok:
+            self.record_latency(latency_ms)
+            self.error_rate *= (1 - EWMA_ALPHA)
+            self.consecutive_errors = 0
+            self.ejected_until = 0.0
+            return
+
+        self.errors += 1
+        self.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.error_rate
+        self.consecutive_errors += 1
+        if self.consecutive_errors >= RPC_EJECT_AFTER_ERRORS and not self.ejected:
+            self.ejected_until = time.monotonic() + RPC_EJECT_SECONDS
+            logger.warning(f"Ejecting RPC endpoint {self.name} for {RPC_EJECT_SECONDS}s after {self.consecutive_errors} errors")
+
+    def stats(self) -> Dict:
+        return {
+            'endpoint': self.name,
+            'latency_ms': round(self.latency_ms, 2) if self.latency_ms is not None else None,
+            'error_rate': round(self.error_rate, 4),
+            'ejected': self.ejected,
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'errors': self.errors
+        }
+
+
+class RPCPool:
+    """Latency-aware routing, failover and hedging across RPC endpoints"""
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        hedge_after_ms: float = RPC_HEDGE_AFTER_MS,
+        limiter: Optional[AdaptiveRateLimiter] = None,
+        max_retries: int = RPC_MAX_RETRIES
+    ):
+        if not urls:
+            raise ValueError("RPCPool needs at least one endpoint")
+        self.endpoints = [RPCEndpoint(url) for url in urls]
+        self.hedge_after_ms = hedge_after_ms
+        self.limiter = limiter or AdaptiveRateLimiter(RPC_RATE_LIMIT, RPC_RATE_BURST, RPC_MIN_RATE)
+        self.max_retries = max_retries
+        self.http = httpx.AsyncClient(timeout=30.0)
+        self.hedged_requests = 0
+        self.failovers = 0
+        self.retries = 0
+        self.rpc_calls = 0
+        self.rpc_seconds = 0.0
+
+    def pick(self, exclude: Sequence[RPCEndpoint] = ()) -> Optional[RPCEndpoint]:
+        """Healthiest endpoint not in exclude; ejected ones only as a last resort"""
+        candidates = [e for e in self.endpoints if e not in exclude]
+        if not candidates:
+            return None
+        healthy = [e for e in candidates if not e.ejected]
+        if healthy:
+            return min(healthy, key=lambda e: e.score())
+        return min(candidates, key=lambda e: e.ejected_until)
+
+    async def _attempt(self, endpoint: RPCEndpoint, fn: Callable[[RPCEndpoint], Awaitable[Any]], method: str = 'rpc') -> Any:
+        """One call to one endpoint; the caller has already taken its limiter tokens"""
+        endpoint.in_flight += 1
+        start = time.perf_counter()
+        try:
+            result = await fn(endpoint)
+        except asyncio.CancelledError:
+            # A losing hedge was at least this slow, but it did not fail
+            endpoint.record_latency((time.perf_counter() - start) * 1000)
+            raise
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            self.rpc_calls += 1
+            self.rpc_seconds += elapsed
+            endpoint.record(elapsed * 1000, ok=False)
+            RPC_LATENCY.observe(elapsed, method=method, endpoint=endpoint.name)
+            RPC_ERRORS.inc(method=method, endpoint=endpoint.name)
+            if is_rate_limited(e):
+                self.limiter.on_rate_limited(retry_after_seconds(e))
+            raise
+        finally:
+            endpoint.in_flight -= 1
+
+        elapsed = time.perf_counter() - start
+        self.rpc_calls += 1
+        self.rpc_seconds += elapsed
+        endpoint.record(elapsed * 1000, ok=True)
+        RPC_LATENCY.observe(elapsed, method=method, endpoint=endpoint.name)
+        self.limiter.on_success()
+        return result
+
+    async def request(
+        self,
+        fn: Callable[[RPCEndpoint], Awaitable[Any]],
+        hedge: bool = True,
+        method: str = 'rpc',
+        cost: int = 1
+    ) -> Any:
+        """Run fn through the pool, retrying transient failures with backoff
+        
+        method names the RPC method in latency and error metrics; cost is the
+        number of RPC calls fn makes, charged to the rate limiter per attempt.
+
+        Rate limits, timeouts and 5xx responses are retried up to max_retries
+        times with full-jitter exponential backoff. A provider that is still
+        rate limiting afterwards raises RateLimitedError.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._request_once(fn, hedge, method, cost)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retriable(e):
+                    if is_rate_limited(e):
+                        raise RateLimitedError("RPC provider is rate limiting requests") from e
+                    raise
+                self.retries += 1
+                await asyncio.sleep(backoff_delay(attempt, RPC_RETRY_BASE_MS / 1000, RPC_RETRY_MAX_MS / 1000))
+
+    async def _request_once(
+        self,
+        fn: Callable[[RPCEndpoint], Awaitable[Any]],
+        hedge: bool,
+        method: str,
+        cost: int = 1
+    ) -> Any:
+        """Run fn against the best endpoint, hedging and failing over as needed
+
+        If the primary has not answered within hedge_after_ms a second endpoint
+        is raced against it; the first success wins. Errors fail over to the
+        next healthiest endpoint until every endpoint has been tried.
+
+        Each attempt takes its limiter tokens before it starts, so time spent
+        queueing counts towards neither the endpoint's latency nor the hedge
+        delay. Hedges are skipped while the limiter has callers queueing,
+        since they would only spend budget other requests are waiting for.
+        """
+        tried: List[RPCEndpoint] = []
+        pending: Dict[asyncio.Task, RPCEndpoint] = {}
+        last_error: Optional[BaseException] = None
+
+        async def launch() -> bool:
+            endpoint = self.pick(exclude=tried)
+            if endpoint is None:
+                return False
+            await self.limiter.acquire(cost)
+            tried.append(endpoint)
+            pending[asyncio.ensure_future(self._attempt(endpoint, fn, method))] = endpoint
+            return True
+
+        await launch()
+        try:
+            while pending:
+                can_hedge = hedge and len(tried) < len(self.endpoints)
+                timeout = self.hedge_after_ms / 1000 if can_hedge else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if self.limiter.has_headroom():
+                        self.hedged_requests += 1
+                        await launch()
+                    continue
+
+                for task in done:
+                    pending.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+
+                if not pending:
+                    if not await launch():
+                        break
+                    self.failovers += 1
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise last_error
+
+    async def post(self, payload: Any, hedge: bool = False, method: str = 'batch') -> Any:
+        """POST a raw JSON-RPC payload (e.g. a batch) and return the decoded body
+
+        A batch costs one rate limiter token per call in it.
+        """
+        async def send(endpoint: RPCEndpoint):
+            response = await self.http.post(endpoint.url, json=payload)
+            response.raise_for_status()
+            return response.json()
+
+        cost = len(payload) if isinstance(payload, list) else 1
+        return await self.request(send, hedge=hedge, method=method, cost=cost)
+
+    async def probe(self):
+        """Refresh every endpoint's health with a lightweight getSlot call"""
+        async def check(endpoint: RPCEndpoint):
+            try:
+                await self.limiter.acquire()
+                await self._attempt(endpoint, lambda e: e.client.get_slot(), 'getSlot')
+            except Exception as e:
+                logger.warning(f"RPC health probe failed for {endpoint.name}: {e}")
+
+        await asyncio.gather(*(check(endpoint) for endpoint in self.endpoints))
+
+    async def run_health_checks(self, interval_seconds: float):
+        """Probe endpoints periodically so ejected ones can recover"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            await self.probe()
+
+    def stats(self) -> Dict:
+        return {
+            'hedge_after_ms': self.hedge_after_ms,
+            'hedged_requests': self.hedged_requests,
+            'failovers': self.failovers,
+            'retries': self.retries,
+            'rpc_calls': self.rpc_calls,
+            'rpc_seconds_total': round(self.rpc_seconds, 4),
+            'avg_rpc_ms': round(self.rpc_seconds / self.rpc_calls * 1000, 2) if self.rpc_calls else 0.0,
+            'rate_limiter': self.limiter.stats(),
+            'endpoints': [endpoint.stats() for endpoint in self.endpoints]
+        }
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            await endpoint.client.close()
+        await self.http.aclose()
@@ -1,31 +1,93 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Query, Header
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta
 import httpx
-from solana.rpc.async_api import AsyncClient
 from solders.pubkey import Pubkey
+from solders.signature import Signature
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
 import json
+import hashlib
 import asyncio
+import time
+import numpy as np
+
+from cache import TTLCache, SingleFlight
+from tx_parser import summarize_transaction, accumulate_wallet_activity
+from rpc_pool import RPCPool
+from rate_limiter import RateLimitedError, backoff_delay
+from leaderboard import LeaderboardStore
+from rank_index import ScoreRankIndex
+from analytics import AnalyticsCounters, ROLLUP_GRANULARITIES, rollup_updates
+from refresh_scheduler import RefreshScheduler, REFRESH_ENABLED
+from analysis_jobs import AnalysisJobQueue
+from write_buffer import WriteBehindBuffer
+from stage_timing import begin_request, stage, stage_stats
+from metrics import REGISTRY, MongoCommandTimer, RequestMetricsMiddleware
+from profiler import ProfilerMiddleware, profiler
+from http_cache import DataVersion, cache_headers, etag, not_modified
+from export import EXPORT_FORMATS, ExportStats, export_wallets, parse_since
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandTimer()])
 db = client[os.environ['DB_NAME']]
 
-# Solana RPC
+# Solana RPC; HELIUS_RPC_URLS lists fallback providers, comma separated
 HELIUS_RPC = os.environ.get('HELIUS_RPC_URL')
-solana_client = AsyncClient(HELIUS_RPC)
+RPC_ENDPOINTS = [u.strip() for u in os.environ.get('HELIUS_RPC_URLS', HELIUS_RPC or '').split(',') if u.strip()]
+if not RPC_ENDPOINTS:
+    # solana-py's own default, so the app still imports without RPC config
+    RPC_ENDPOINTS = ['http://localhost:8899']
+RPC_HEALTH_CHECK_SECONDS = int(os.environ.get('RPC_HEALTH_CHECK_SECONDS', '30'))
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Batch analysis limits
+ANALYZE_BATCH_CONCURRENCY = int(os.environ.get('ANALYZE_BATCH_CONCURRENCY', '10'))
+ANALYZE_BATCH_MAX_WALLETS = int(os.environ.get('ANALYZE_BATCH_MAX_WALLETS', '500'))
+# Larger leaderboards are materialized in memory; bulk reads use the export
+LEADERBOARD_MAX_LIMIT = int(os.environ.get('LEADERBOARD_MAX_LIMIT', '50000'))
+
+# Wallets analyzed within this window are served without RPC calls
+WALLET_FRESHNESS_SECONDS = int(os.environ.get('WALLET_FRESHNESS_SECONDS', '300'))
+WALLET_CACHE_SIZE = int(os.environ.get('WALLET_CACHE_SIZE', '10000'))
+# Trend bodies are reused until history changes here, or this long for other workers' writes
+TRENDS_CACHE_SECONDS = int(os.environ.get('TRENDS_CACHE_SECONDS', '30'))
+
+# Full recount of the rank index, correcting drift from other workers
+RANK_INDEX_REBUILD_SECONDS = int(os.environ.get('RANK_INDEX_REBUILD_SECONDS', '600'))
+STATS_RECONCILE_SECONDS = int(os.environ.get('STATS_RECONCILE_SECONDS', '300'))
+
+# Signature ingestion paging
+SIGNATURE_PAGE_SIZE = int(os.environ.get('SIGNATURE_PAGE_SIZE', '1000'))
+SIGNATURE_INITIAL_PAGES = int(os.environ.get('SIGNATURE_INITIAL_PAGES', '1'))
+# Transactions parsed per analysis on the request path (0 = no cap). Each
+# getTransaction costs one rate limiter token, so at RPC_RATE_LIMIT=10 a cap
+# of 50 adds up to ~5s; a first analysis can page SIGNATURE_INITIAL_PAGES *
+# SIGNATURE_PAGE_SIZE signatures, ~100s uncapped. The rest wait on the
+# cursor for an analysis job, which parses without a cap.
+ANALYZE_PARSE_LIMIT = int(os.environ.get('ANALYZE_PARSE_LIMIT', '50'))
+
+# Batched getTransaction requests
+RPC_BATCH_SIZE = int(os.environ.get('RPC_BATCH_SIZE', '50'))
+RPC_BATCH_CONCURRENCY = int(os.environ.get('RPC_BATCH_CONCURRENCY', '4'))
+# Times getTransaction items answered with an error or null are asked for again
+RPC_BATCH_ITEM_RETRIES = int(os.environ.get('RPC_BATCH_ITEM_RETRIES', '2'))
+RPC_BATCH_RETRY_MS = float(os.environ.get('RPC_BATCH_RETRY_MS', '500'))
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -53,9 +115,59 @@ class WalletData(BaseModel):
     metrics: WalletMetrics
     last_analyzed: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     rank: Optional[int] = None
+    percentile: Optional[float] = None
+
+class IngestionCursor(BaseModel):
+    """Per-wallet signature ingestion progress"""
+    model_config = ConfigDict(extra="ignore")
+    
+    wallet_address: str
+    newest_signature: Optional[str] = None
+    oldest_signature: Optional[str] = None
+    oldest_block_time: Optional[int] = None
+    transaction_count: int = 0
+    history_complete: bool = False
+    volume_lamports: int = 0
+    contract_interactions: int = 0
+    program_ids: List[str] = Field(default_factory=list)
+    # Ingested signatures whose transactions are not yet parsed, newest first
+    unparsed_signatures: List[str] = Field(default_factory=list)
 
 class WalletAnalysisRequest(BaseModel):
     wallet_address: str
+    force: bool = False
+    backfill: bool = False
+
+class BatchAnalysisRequest(BaseModel):
+    wallet_addresses: List[str] = Field(..., min_length=1, max_length=ANALYZE_BATCH_MAX_WALLETS)
+    force: bool = False
+
+class BatchAnalysisResult(BaseModel):
+    wallet_address: str
+    success: bool
+    data: Optional[WalletData] = None
+    error: Optional[str] = None
+
+class BatchAnalysisResponse(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    results: List[BatchAnalysisResult]
+
+class LeaderboardCursor(BaseModel):
+    after_score: float
+    after_address: str
+
+class LeaderboardPage(BaseModel):
+    version: int
+    built_at: datetime
+    entries: List[WalletData]
+    next_cursor: Optional[LeaderboardCursor] = None
+
+class ScoreBucket(BaseModel):
+    min_score: float
+    max_score: float
+    wallet_count: int
 
 class AnalyticsStats(BaseModel):
     total_wallets_analyzed: int
@@ -67,6 +179,27 @@ class ReputationTrend(BaseModel):
     date: str
     average_score: float
     wallet_count: int
+    min_score: Optional[float] = None
+    max_score: Optional[float] = None
+
+class ProfilerSettings(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)
+
+class AnalysisJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
+    job_id: str
+    wallet_address: str
+    status: str
+    force: bool = False
+    backfill: bool = False
+    attempts: int = 0
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[WalletData] = None
+    error: Optional[str] = None
 
 # Reputation Scoring Algorithm
 class ReputationEngine:
@@ -80,6 +213,9 @@ class ReputationEngine:
     
     MAX_SCORE = 1000
     
+    # Stored with every score; bump whenever the caps or weights below change
+    SCORE_VERSION = 1
+    
     @staticmethod
     def calculate_score(metrics: WalletMetrics) -> float:
         """Calculate reputation score based on wallet metrics"""
@@ -108,62 +244,322 @@ class ReputationEngine:
         )
         
         return min(total_score, ReputationEngine.MAX_SCORE)
+    
+    @staticmethod
+    def calculate_scores(metrics_list: List[WalletMetrics]) -> List[float]:
+        """Calculate reputation scores for a batch of wallet metrics"""
+        return [ReputationEngine.calculate_score(metrics) for metrics in metrics_list]
+    
+    @staticmethod
+    def calculate_scores_array(columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """Vectorized calculate_score over columnar metrics, one array per field"""
+        
+        # Same caps as calculate_score; keep the two in sync
+        volume_score = np.minimum(columns['total_volume'] / 100, 300)
+        frequency_score = np.minimum(columns['activity_frequency'] * 50, 250)
+        age_score = np.minimum(columns['wallet_age_days'] / 2, 150)
+        contract_score = np.minimum(columns['contract_interactions'] * 2, 200)
+        participation_score = np.minimum(columns['unique_programs'] * 10, 100)
+        
+        total_score = (
+            volume_score +
+            frequency_score +
+            age_score +
+            contract_score +
+            participation_score
+        )
+        
+        return np.minimum(total_score, ReputationEngine.MAX_SCORE)
 
 # Solana Data Fetcher
 class SolanaDataFetcher:
-    def __init__(self, rpc_url: str):
-        self.rpc_url = rpc_url
-        self.client = AsyncClient(rpc_url)
+    def __init__(self, rpc_urls, parse_cache=None):
+        if isinstance(rpc_urls, str):
+            rpc_urls = [rpc_urls]
+        self.rpc_url = rpc_urls[0]
+        self.pool = RPCPool(rpc_urls)
+        self.parse_cache = parse_cache
+        self._batch_semaphore = asyncio.Semaphore(RPC_BATCH_CONCURRENCY)
+        self.parse_stats = {
+            'transactions_parsed': 0,
+            'cache_hits': 0,
+            'rpc_batches': 0,
+            'item_retries': 0,
+            'parse_seconds': 0.0
+        }
     
-    async def get_wallet_transactions(self, wallet_address: str, limit: int = 100):
-        """Fetch recent transactions for a wallet"""
-        try:
-            pubkey = Pubkey.from_string(wallet_address)
-            response = await self.client.get_signatures_for_address(pubkey, limit=limit)
+    async def get_signature_pages(
+        self,
+        pubkey: Pubkey,
+        before: Optional[str] = None,
+        until: Optional[str] = None,
+        max_pages: Optional[int] = None
+    ) -> tuple:
+        """Page backwards through signatures, newest first
+        
+        Returns the signatures and whether the start of the range was reached.
+        """
+        signatures = []
+        pages = 0
+        exhausted = False
+        until_sig = Signature.from_string(until) if until else None
+        
+        while max_pages is None or pages < max_pages:
+            before_sig = Signature.from_string(before) if before else None
+            response = await self.pool.request(
+                lambda e: e.client.get_signatures_for_address(
+                    pubkey, before=before_sig, until=until_sig, limit=SIGNATURE_PAGE_SIZE
+                ),
+                method='getSignaturesForAddress'
+            )
+            page = response.value or []
+            pages += 1
+            signatures.extend(page)
             
-            if response.value:
-                return response.value
-            return []
-        except Exception as e:
-            logger.error(f"Error fetching transactions: {e}")
-            return []
+            if len(page) < SIGNATURE_PAGE_SIZE:
+                exhausted = True
+                break
+            before = str(page[-1].signature)
+        
+        return signatures, exhausted
     
-    async def analyze_wallet(self, wallet_address: str) -> WalletMetrics:
-        """Analyze wallet and return metrics"""
+    async def ingest_signatures(
+        self,
+        wallet_address: str,
+        cursor: IngestionCursor,
+        backfill: bool = False,
+        pubkey: Optional[Pubkey] = None
+    ) -> list:
+        """Fetch signatures not yet seen for a wallet and advance its cursor
+        
+        Known wallets only page through activity newer than the cursor; with
+        backfill the remaining history is walked past the oldest signature.
+        The cursor is only updated once every page has been fetched.
+        """
+        pubkey = pubkey or Pubkey.from_string(wallet_address)
+        
+        if cursor.newest_signature is None:
+            new_signatures, exhausted = await self.get_signature_pages(
+                pubkey, max_pages=None if backfill else SIGNATURE_INITIAL_PAGES
+            )
+            older_signatures = []
+            history_complete = exhausted
+        else:
+            new_signatures, _ = await self.get_signature_pages(pubkey, until=cursor.newest_signature)
+            older_signatures = []
+            history_complete = cursor.history_complete
+            if backfill and not history_complete:
+                older_signatures, history_complete = await self.get_signature_pages(
+                    pubkey, before=cursor.oldest_signature
+                )
+        
+        if new_signatures:
+            cursor.newest_signature = str(new_signatures[0].signature)
+        
+        # The oldest reached comes from the backward walk, or from the first scan
+        oldest_batch = older_signatures or (new_signatures if cursor.oldest_signature is None else [])
+        if oldest_batch:
+            cursor.oldest_signature = str(oldest_batch[-1].signature)
+            oldest_with_time = next((s for s in reversed(oldest_batch) if s.block_time), None)
+            if oldest_with_time:
+                cursor.oldest_block_time = oldest_with_time.block_time
+        
+        cursor.transaction_count += len(new_signatures) + len(older_signatures)
+        cursor.history_complete = history_complete
+        
+        return new_signatures + older_signatures
+    
+    async def get_transactions_batch(self, signatures: List[str]) -> Dict[str, Dict]:
+        """Fetch many transactions with JSON-RPC batch requests
+        
+        Items answered with an error or a null result (not yet visible at the
+        node's commitment, or a provider hiccup) are requested again. Any still
+        missing after RPC_BATCH_ITEM_RETRIES raise, failing the analysis so its
+        cursor never moves past transactions that were not counted.
+        """
+        results: Dict[str, Dict] = {}
+        missing = signatures
+        errors: Dict[str, Any] = {}
+        for attempt in range(RPC_BATCH_ITEM_RETRIES + 1):
+            if attempt:
+                self.parse_stats['item_retries'] += len(missing)
+                await asyncio.sleep(backoff_delay(attempt - 1, RPC_BATCH_RETRY_MS / 1000, RPC_BATCH_RETRY_MS * 4 / 1000))
+            fetched, errors = await self._post_transactions(missing)
+            results.update(fetched)
+            missing = [signature for signature in missing if signature not in results]
+            if not missing:
+                return results
+        
+        error = errors.get(missing[0])
+        message = f"{len(missing)} of {len(signatures)} transactions could not be fetched (e.g. {missing[0]}: {error})"
+        if any(isinstance(e, dict) and e.get('code') == 429 for e in errors.values()):
+            raise RateLimitedError(message)
+        raise RuntimeError(message)
+    
+    async def _post_transactions(self, signatures: List[str]) -> tuple:
+        """One getTransaction batch; returns results and per-signature errors"""
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": "getTransaction",
+                "params": [signature, {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0}]
+            }
+            for i, signature in enumerate(signatures)
+        ]
+        
+        async with self._batch_semaphore:
+            response = await self.pool.post(payload, method='getTransaction')
+        self.parse_stats['rpc_batches'] += 1
+        
+        if not isinstance(response, list):
+            # A rejected batch comes back as a single error object
+            error = response.get('error', response) if isinstance(response, dict) else response
+            logger.warning(f"getTransaction batch of {len(signatures)} failed: {error}")
+            return {}, {signature: error for signature in signatures}
+        
+        results = {}
+        errors = {}
+        for item in response:
+            index = item.get('id') if isinstance(item, dict) else None
+            if not isinstance(index, int) or not 0 <= index < len(signatures):
+                continue
+            signature = signatures[index]
+            if item.get('error'):
+                errors[signature] = item['error']
+            elif item.get('result') is None:
+                errors[signature] = 'null result'
+            else:
+                results[signature] = item['result']
+        if errors:
+            logger.warning(f"getTransaction failed for {len(errors)} of {len(signatures)} signatures in a batch")
+        return results, errors
+    
+    async def parse_transactions(self, signatures: List[str]) -> List[Dict]:
+        """Return transaction summaries, fetching only signatures not already cached"""
+        start = time.perf_counter()
+        summaries: Dict[str, Dict] = {}
+        
+        if self.parse_cache is not None:
+            for i in range(0, len(signatures), 1000):
+                chunk = signatures[i:i + 1000]
+                async for doc in self.parse_cache.find({"signature": {"$in": chunk}}, {"_id": 0}):
+                    summaries[doc['signature']] = doc
+        
+        cache_hits = len(summaries)
+        missing = [signature for signature in signatures if signature not in summaries]
+        batches = [missing[i:i + RPC_BATCH_SIZE] for i in range(0, len(missing), RPC_BATCH_SIZE)]
+        fetched = await asyncio.gather(*(self.get_transactions_batch(batch) for batch in batches))
+        
+        parsed = [
+            summarize_transaction(signature, result)
+            for batch_results in fetched
+            for signature, result in batch_results.items()
+        ]
+        
+        if parsed and self.parse_cache is not None:
+            try:
+                # insert_many adds _id to the documents it is given
+                await self.parse_cache.insert_many([dict(summary) for summary in parsed], ordered=False)
+            except BulkWriteError:
+                # Concurrent analyses may cache the same signature first
+                pass
+        
+        for summary in parsed:
+            summaries[summary['signature']] = summary
+        
+        self.parse_stats['transactions_parsed'] += len(parsed)
+        self.parse_stats['cache_hits'] += cache_hits
+        self.parse_stats['parse_seconds'] += time.perf_counter() - start
+        
+        return [summaries[signature] for signature in signatures if signature in summaries]
+    
+    def parse_throughput(self) -> Dict:
+        """Transactions parsed per second, for benchmarks and sizing"""
+        stats = dict(self.parse_stats)
+        seconds = stats['parse_seconds']
+        stats['transactions_per_second'] = round(stats['transactions_parsed'] / seconds, 2) if seconds else 0.0
+        stats['parse_seconds'] = round(seconds, 4)
+        return stats
+    
+    async def get_balance(self, pubkey: Pubkey) -> float:
+        """Current balance in SOL"""
+        with stage('balance'):
+            balance_response = await self.pool.request(
+                lambda e: e.client.get_balance(pubkey), method='getBalance'
+            )
+        return balance_response.value / 1e9 if balance_response.value else 0
+    
+    async def analyze_wallet(
+        self,
+        wallet_address: str,
+        cursor: Optional[IngestionCursor] = None,
+        backfill: bool = False,
+        pubkey: Optional[Pubkey] = None,
+        parse_limit: Optional[int] = None
+    ) -> WalletMetrics:
+        """Analyze wallet and return metrics
+        
+        When a stored cursor is passed only new signatures are fetched and the
+        cursor is advanced in place for the caller to persist. The balance is
+        fetched alongside signature paging for wallets known to have activity,
+        and alongside transaction parsing otherwise. With parse_limit, only
+        that many of the newest unparsed transactions are parsed; the others
+        stay on the cursor's unparsed_signatures for a later analysis.
+        """
+        pubkey = pubkey or Pubkey.from_string(wallet_address)
+        balance_task = None
         try:
-            transactions = await self.get_wallet_transactions(wallet_address)
+            working_cursor = (cursor or IngestionCursor(wallet_address=wallet_address)).model_copy()
+            if working_cursor.transaction_count > 0:
+                balance_task = asyncio.ensure_future(self.get_balance(pubkey))
+            
+            with stage('signatures'):
+                new_signatures = await self.ingest_signatures(
+                    wallet_address, working_cursor, backfill=backfill, pubkey=pubkey
+                )
             
-            if not transactions:
+            if working_cursor.transaction_count == 0:
                 return WalletMetrics()
+            if balance_task is None:
+                balance_task = asyncio.ensure_future(self.get_balance(pubkey))
             
-            # Calculate metrics
-            transaction_count = len(transactions)
+            # Parse only the transactions no analysis has parsed before
+            unparsed = [str(s.signature) for s in new_signatures] + working_cursor.unparsed_signatures
+            if parse_limit is not None:
+                unparsed, working_cursor.unparsed_signatures = unparsed[:parse_limit], unparsed[parse_limit:]
+            else:
+                working_cursor.unparsed_signatures = []
+            with stage('transactions'):
+                summaries = await self.parse_transactions(unparsed)
+            activity = accumulate_wallet_activity(wallet_address, summaries, working_cursor.program_ids)
+            working_cursor.volume_lamports += activity['volume_lamports']
+            working_cursor.contract_interactions += activity['contract_interactions']
+            working_cursor.program_ids = activity['program_ids']
             
-            # Get account info for balance
-            pubkey = Pubkey.from_string(wallet_address)
-            balance_response = await self.client.get_balance(pubkey)
-            balance = balance_response.value / 1e9 if balance_response.value else 0
+            # Calculate metrics
+            transaction_count = working_cursor.transaction_count
+            balance = await balance_task
             
-            # Estimate total volume (simplified)
-            total_volume = balance + (transaction_count * 0.1)
+            # Total volume: current balance plus SOL moved in and out
+            total_volume = balance + working_cursor.volume_lamports / 1e9
             
-            # Calculate wallet age from oldest transaction
-            oldest_tx = transactions[-1] if transactions else None
+            # Calculate wallet age from oldest transaction reached
             wallet_age_days = 0
-            if oldest_tx and oldest_tx.block_time:
-                age_seconds = datetime.now(timezone.utc).timestamp() - oldest_tx.block_time
+            if working_cursor.oldest_block_time:
+                age_seconds = datetime.now(timezone.utc).timestamp() - working_cursor.oldest_block_time
                 wallet_age_days = int(age_seconds / 86400)
             
             # Activity frequency (transactions per day)
             activity_frequency = transaction_count / max(wallet_age_days, 1)
             
-            # Contract interactions (estimate from transaction types)
-            contract_interactions = int(transaction_count * 0.6)  # Simplified estimation
+            # Contract interactions: transactions invoking a non-native program
+            contract_interactions = working_cursor.contract_interactions
             
-            # Unique programs (simplified)
-            unique_programs = min(int(transaction_count * 0.3), 20)
+            # Unique non-native programs invoked
+            unique_programs = len(working_cursor.program_ids)
             
-            return WalletMetrics(
+            metrics = WalletMetrics(
                 transaction_count=transaction_count,
                 total_volume=round(total_volume, 2),
                 contract_interactions=contract_interactions,
@@ -171,172 +567,802 @@ class SolanaDataFetcher:
                 activity_frequency=round(activity_frequency, 2),
                 unique_programs=unique_programs
             )
+            
+            if cursor is not None:
+                for field, value in working_cursor.model_dump().items():
+                    setattr(cursor, field, value)
+            
+            return metrics
         except Exception as e:
+            # Never turn a failed fetch into an all-zero score
             logger.error(f"Error analyzing wallet: {e}")
-            return WalletMetrics()
+            raise
+        finally:
+            if balance_task is not None and not balance_task.done():
+                balance_task.cancel()
     
     async def close(self):
-        await self.client.close()
+        await self.pool.close()
+
+fetcher = SolanaDataFetcher(RPC_ENDPOINTS, parse_cache=db.parsed_transactions)
+wallet_cache = TTLCache(WALLET_CACHE_SIZE, WALLET_FRESHNESS_SECONDS)
+analysis_flight = SingleFlight()
+def wallet_json(wallet: Dict[str, Any]) -> bytes:
+    """Serialize a stored wallet document exactly as response_model=WalletData would"""
+    return WalletData.model_validate(wallet).model_dump_json().encode()
+
+leaderboard_store = LeaderboardStore(db, encode_entry=wallet_json)
+# Bumped after every wallet and history write, for ETags on derived reads
+wallet_version = DataVersion('wallets')
+history_version = DataVersion('history')
+trends_cache = TTLCache(256, TRENDS_CACHE_SECONDS)
+TRENDS_ADAPTER = TypeAdapter(List[ReputationTrend])
+rank_index = ScoreRankIndex(max_score=ReputationEngine.MAX_SCORE)
+analytics_counters = AnalyticsCounters()
+
+# Fields of the previous wallet document the in-memory indexes need
+PREVIOUS_WALLET_PROJECTION = {"_id": 0, "wallet_address": 1, "reputation_score": 1, "metrics.transaction_count": 1}
+
+# Single analyses are persisted in batches off the request path
+write_buffer = WriteBehindBuffer(db, PREVIOUS_WALLET_PROJECTION, on_history_written=history_version.bump)
 
-fetcher = SolanaDataFetcher(HELIUS_RPC)
+# Long-running tasks started with the app and cancelled on shutdown
+background_tasks: List[asyncio.Task] = []
 
 # API Routes
 @api_router.get("/")
 async def root():
     return {"message": "SoReL - Solana Reputation Layer API"}
 
-@api_router.post("/wallets/analyze", response_model=WalletData)
-async def analyze_wallet(request: WalletAnalysisRequest):
-    """Analyze a wallet and calculate reputation score"""
+def validate_wallet_address(wallet_address: str) -> Pubkey:
+    """Parse the address, raising a 400 if it is not a valid Solana public key"""
+    if not wallet_address or len(wallet_address) < 32 or len(wallet_address) > 44:
+        raise HTTPException(status_code=400, detail="Invalid Solana wallet address format")
+    
     try:
-        wallet_address = request.wallet_address
-        
-        # Validate wallet address format
-        if not wallet_address or len(wallet_address) < 32 or len(wallet_address) > 44:
-            raise HTTPException(status_code=400, detail="Invalid Solana wallet address format")
-        
-        # Try to parse the address to validate it
-        try:
-            Pubkey.from_string(wallet_address)
-        except Exception:
-            raise HTTPException(status_code=400, detail="Invalid Solana wallet address")
-        
-        # Check if wallet exists in DB
-        existing_wallet = await db.wallets.find_one({"wallet_address": wallet_address}, {"_id": 0})
-        
-        # Fetch and analyze wallet data from Solana
-        metrics = await fetcher.analyze_wallet(wallet_address)
-        
-        # Calculate reputation score
+        return Pubkey.from_string(wallet_address)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid Solana wallet address")
+
+def build_wallet_data(wallet_address: str, metrics: WalletMetrics, reputation_score: float) -> WalletData:
+    """Create wallet data for a freshly scored wallet"""
+    return WalletData(
+        wallet_address=wallet_address,
+        reputation_score=round(reputation_score, 2),
+        metrics=metrics,
+        last_analyzed=datetime.now(timezone.utc)
+    )
+
+def wallet_to_doc(wallet_data: WalletData) -> Dict[str, Any]:
+    """Serialize wallet data into its stored document shape"""
+    doc = wallet_data.model_dump()
+    doc['last_analyzed'] = doc['last_analyzed'].isoformat()
+    doc['score_version'] = ReputationEngine.SCORE_VERSION
+    return doc
+
+def cache_if_fresh(doc: Dict[str, Any]) -> Optional[WalletData]:
+    """Cache a stored wallet document for the rest of its freshness window"""
+    wallet_data = WalletData(**doc)
+    last_analyzed = wallet_data.last_analyzed
+    if last_analyzed.tzinfo is None:
+        last_analyzed = last_analyzed.replace(tzinfo=timezone.utc)
+    
+    remaining = WALLET_FRESHNESS_SECONDS - (datetime.now(timezone.utc) - last_analyzed).total_seconds()
+    if remaining <= 0:
+        return None
+    
+    wallet_cache.set(wallet_data.wallet_address, wallet_data, ttl_seconds=remaining)
+    return wallet_data
+
+async def get_fresh_wallet(wallet_address: str, check_cache: bool = True) -> Optional[WalletData]:
+    """Return stored wallet data if it was analyzed within the freshness window
+    
+    Callers that have just missed wallet_cache pass check_cache=False, so
+    the miss is not counted twice.
+    """
+    if WALLET_FRESHNESS_SECONDS <= 0:
+        return None
+    
+    if check_cache:
+        cached = wallet_cache.get(wallet_address)
+        if cached is not None:
+            return cached
+    
+    existing_wallet = await db.wallets.find_one({"wallet_address": wallet_address}, {"_id": 0})
+    if not existing_wallet:
+        return None
+    
+    return cache_if_fresh(existing_wallet)
+
+async def get_fresh_wallets(wallet_addresses: List[str]) -> Dict[str, WalletData]:
+    """Batch variant of get_fresh_wallet using a single Mongo query for cache misses"""
+    if WALLET_FRESHNESS_SECONDS <= 0 or not wallet_addresses:
+        return {}
+    
+    fresh: Dict[str, WalletData] = {}
+    misses = []
+    for wallet_address in wallet_addresses:
+        cached = wallet_cache.get(wallet_address)
+        if cached is not None:
+            fresh[wallet_address] = cached
+        else:
+            misses.append(wallet_address)
+    
+    if misses:
+        async for doc in db.wallets.find({"wallet_address": {"$in": misses}}, {"_id": 0}):
+            wallet_data = cache_if_fresh(doc)
+            if wallet_data is not None:
+                fresh[wallet_data.wallet_address] = wallet_data
+    
+    return fresh
+
+def with_rank(wallet_data: WalletData) -> WalletData:
+    """Copy of wallet data with its current rank and percentile filled in"""
+    return wallet_data.model_copy(update={
+        'rank': rank_index.rank(wallet_data.reputation_score),
+        'percentile': rank_index.percentile(wallet_data.reputation_score)
+    })
+
+def record_wallet_write(previous: Optional[Dict[str, Any]], wallet_data: WalletData):
+    """Update the rank index and running analytics after a wallet upsert"""
+    rank_index.update(previous.get('reputation_score') if previous else None, wallet_data.reputation_score)
+    analytics_counters.record_upsert(
+        wallet_data.wallet_address,
+        previous,
+        wallet_data.reputation_score,
+        wallet_data.metrics.transaction_count,
+        wallet_data.last_analyzed
+    )
+    refresh_scheduler.record_analysis(wallet_data.wallet_address)
+    wallet_version.bump()
+
+def history_doc_for(wallet_data: WalletData) -> Dict[str, Any]:
+    """Build the reputation_history entry for a scored wallet"""
+    return {
+        "wallet_address": wallet_data.wallet_address,
+        "score": wallet_data.reputation_score,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+async def load_cursors(wallet_addresses: List[str]) -> Dict[str, IngestionCursor]:
+    """Load stored ingestion cursors, creating empty ones for new wallets
+    
+    Cursors still in the write buffer win over the stored ones.
+    """
+    cursors = {a: IngestionCursor(wallet_address=a) for a in wallet_addresses}
+    if wallet_addresses:
+        async for doc in db.ingestion_cursors.find({"wallet_address": {"$in": wallet_addresses}}, {"_id": 0}):
+            cursors[doc['wallet_address']] = IngestionCursor(**doc)
+        for wallet_address in wallet_addresses:
+            pending = write_buffer.pending_cursor(wallet_address)
+            if pending is not None:
+                cursors[wallet_address] = IngestionCursor(**pending)
+    return cursors
+
+def cursor_to_doc(cursor: IngestionCursor) -> Dict[str, Any]:
+    doc = cursor.model_dump()
+    doc['updated_at'] = datetime.now(timezone.utc).isoformat()
+    return doc
+
+async def run_wallet_analysis(
+    wallet_address: str,
+    backfill: bool = False,
+    pubkey: Optional[Pubkey] = None,
+    cursor: Optional[IngestionCursor] = None,
+    parse_limit: Optional[int] = None
+) -> WalletData:
+    """Fetch, score and persist a single wallet
+    
+    Request handlers pass parse_limit; transactions left unparsed are
+    finished by a queued analysis job.
+    """
+    if cursor is None:
+        with stage('cursor'):
+            cursor = (await load_cursors([wallet_address]))[wallet_address]
+    
+    # Fetch and analyze wallet data from Solana, only paging new signatures
+    metrics = await fetcher.analyze_wallet(
+        wallet_address, cursor=cursor, backfill=backfill, pubkey=pubkey, parse_limit=parse_limit
+    )
+    
+    # Calculate reputation score
+    with stage('score'):
         reputation_score = ReputationEngine.calculate_score(metrics)
         
         # Create wallet data
-        wallet_data = WalletData(
-            wallet_address=wallet_address,
-            reputation_score=round(reputation_score, 2),
-            metrics=metrics,
-            last_analyzed=datetime.now(timezone.utc)
+        wallet_data = build_wallet_data(wallet_address, metrics, reputation_score)
+    
+    with stage('persist'):
+        await persist_wallet_analysis(wallet_data, cursor)
+    
+    wallet_cache.set(wallet_address, wallet_data)
+    if cursor.unparsed_signatures:
+        await enqueue_unparsed([wallet_address])
+    
+    return wallet_data
+
+async def enqueue_unparsed(wallet_addresses: List[str]):
+    """Queue forced analyses that parse the transactions a capped analysis left"""
+    for wallet_address in wallet_addresses:
+        try:
+            await analysis_jobs.enqueue(wallet_address, force=True)
+        except Exception as e:
+            logger.warning(f"Queueing the unparsed transactions of {wallet_address} failed: {e}")
+
+def request_parse_limit(backfill: bool) -> Optional[int]:
+    """The parse cap for an analysis a client is waiting on; backfills walk everything"""
+    return None if backfill or ANALYZE_PARSE_LIMIT <= 0 else ANALYZE_PARSE_LIMIT
+
+async def persist_wallet_analysis(wallet_data: WalletData, cursor: IngestionCursor):
+    """Save a single analysis, through the write buffer when it is enabled"""
+    wallet_address = wallet_data.wallet_address
+    
+    # Save to database
+    doc = wallet_to_doc(wallet_data)
+    history_doc = history_doc_for(wallet_data)
+    
+    if write_buffer.enabled:
+        # Completes after the response; rank and stats update once it lands
+        await write_buffer.add(
+            doc,
+            history_doc,
+            cursor_to_doc(cursor),
+            on_written=lambda previous: record_wallet_write(previous, wallet_data)
         )
-        
-        # Save to database
-        doc = wallet_data.model_dump()
-        doc['last_analyzed'] = doc['last_analyzed'].isoformat()
-        
-        await db.wallets.update_one(
+        return
+    
+    async def save_history():
+        # Save to history and fold it into the trend rollups
+        await db.reputation_history.insert_one(history_doc)
+        await db.reputation_rollups.bulk_write(rollup_updates([history_doc]), ordered=False)
+    
+    # The three collections are independent, so write them concurrently
+    previous, _, _ = await asyncio.gather(
+        db.wallets.find_one_and_update(
             {"wallet_address": wallet_address},
             {"$set": doc},
+            projection=PREVIOUS_WALLET_PROJECTION,
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        ),
+        save_history(),
+        db.ingestion_cursors.update_one(
+            {"wallet_address": wallet_address},
+            {"$set": cursor_to_doc(cursor)},
             upsert=True
         )
+    )
+    record_wallet_write(previous, wallet_data)
+    history_version.bump()
+
+async def refresh_wallet(wallet_address: str) -> WalletData:
+    """Background re-analysis, shared with any request for the same wallet"""
+    return await analysis_flight.do((wallet_address, False), lambda: run_wallet_analysis(wallet_address))
+
+refresh_scheduler = RefreshScheduler(
+    db,
+    refresh_wallet,
+    leaderboard_store,
+    fetcher.pool.limiter,
+    freshness_seconds=WALLET_FRESHNESS_SECONDS
+)
+
+@api_router.post("/wallets/analyze", response_model=WalletData)
+async def analyze_wallet(request: WalletAnalysisRequest, response: Response):
+    """Analyze a wallet and calculate reputation score"""
+    timings = begin_request()
+    try:
+        wallet_address = request.wallet_address
         
-        # Save to history
-        history_doc = {
-            "wallet_address": wallet_address,
-            "score": reputation_score,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-        await db.reputation_history.insert_one(history_doc)
+        # Validate wallet address format, parsing it once for every RPC call
+        pubkey = validate_wallet_address(wallet_address)
+        refresh_scheduler.record_request(wallet_address)
         
-        return wallet_data
+        # Serve recently analyzed wallets without touching the RPC
+        cursor = None
+        if not request.force and not request.backfill:
+            fresh_wallet = wallet_cache.get(wallet_address)
+            if fresh_wallet is None:
+                # Load the ingestion cursor while Mongo is checked for a fresh result
+                with stage('lookup'):
+                    fresh_wallet, cursors = await asyncio.gather(
+                        get_fresh_wallet(wallet_address, check_cache=False), load_cursors([wallet_address])
+                    )
+                cursor = cursors[wallet_address]
+            if fresh_wallet is not None:
+                response.headers["Server-Timing"] = timings.server_timing()
+                return with_rank(fresh_wallet)
+        
+        # Concurrent requests for the same wallet share one analysis
+        wallet_data = await analysis_flight.do(
+            (wallet_address, request.backfill),
+            lambda: run_wallet_analysis(
+                wallet_address,
+                backfill=request.backfill,
+                pubkey=pubkey,
+                cursor=cursor,
+                parse_limit=request_parse_limit(request.backfill)
+            )
+        )
+        response.headers["Server-Timing"] = timings.server_timing()
+        return with_rank(wallet_data)
+    except HTTPException:
+        raise
+    except RateLimitedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         logger.error(f"Error in analyze_wallet: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def run_analysis_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Analyze the wallet of a queued job and return the result document"""
+    wallet_address = job['wallet_address']
+    wallet_data = None
+    if not job.get('force') and not job.get('backfill'):
+        wallet_data = await get_fresh_wallet(wallet_address)
+    if wallet_data is None:
+        backfill = job.get('backfill', False)
+        wallet_data = await analysis_flight.do(
+            (wallet_address, backfill), lambda: run_wallet_analysis(wallet_address, backfill=backfill)
+        )
+    return with_rank(wallet_data).model_dump(mode="json")
+
+analysis_jobs = AnalysisJobQueue(db, run_analysis_job)
+
+@api_router.post("/wallets/analyze/jobs", response_model=AnalysisJob, status_code=202)
+async def enqueue_wallet_analysis(request: WalletAnalysisRequest, response: Response):
+    """Queue a wallet analysis and return its job id without waiting for the RPC"""
+    validate_wallet_address(request.wallet_address)
+    refresh_scheduler.record_request(request.wallet_address)
+    
+    job = await analysis_jobs.enqueue(request.wallet_address, force=request.force, backfill=request.backfill)
+    response.headers["Location"] = f"/api/wallets/analyze/jobs/{job['job_id']}"
+    return job
+
+@api_router.get("/wallets/analyze/jobs/{job_id}", response_model=AnalysisJob)
+async def get_analysis_job(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    """Get an analysis job; wait long-polls up to that many seconds for it to finish"""
+    job = await analysis_jobs.wait(job_id, wait) if wait else await analysis_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+    return job
+
+async def run_batch_analysis(
+    wallet_addresses: List[str],
+    pubkeys: Dict[str, Pubkey]
+) -> Dict[str, BatchAnalysisResult]:
+    """Fetch, score together and bulk-persist a batch of wallets"""
+    results: Dict[str, BatchAnalysisResult] = {}
+    cursors = await load_cursors(wallet_addresses)
+    semaphore = asyncio.Semaphore(ANALYZE_BATCH_CONCURRENCY)
+    
+    async def fetch(wallet_address: str) -> WalletMetrics:
+        async with semaphore:
+            return await fetcher.analyze_wallet(
+                wallet_address,
+                cursor=cursors[wallet_address],
+                pubkey=pubkeys[wallet_address],
+                parse_limit=request_parse_limit(False)
+            )
+    
+    fetched = await asyncio.gather(
+        *(fetch(wallet_address) for wallet_address in wallet_addresses),
+        return_exceptions=True
+    )
+    
+    analyzed_addresses = []
+    analyzed_metrics = []
+    for wallet_address, outcome in zip(wallet_addresses, fetched):
+        if isinstance(outcome, Exception):
+            logger.error(f"Error analyzing wallet {wallet_address} in batch: {outcome}")
+            results[wallet_address] = BatchAnalysisResult(
+                wallet_address=wallet_address, success=False, error=str(outcome)
+            )
+        else:
+            analyzed_addresses.append(wallet_address)
+            analyzed_metrics.append(outcome)
+    
+    # Score the whole batch together
+    scores = ReputationEngine.calculate_scores(analyzed_metrics)
+    wallets = [
+        build_wallet_data(wallet_address, metrics, score)
+        for wallet_address, metrics, score in zip(analyzed_addresses, analyzed_metrics, scores)
+    ]
+    
+    if wallets:
+        # Previous documents keep the in-memory indexes exact across the bulk upsert
+        previous_docs = {
+            doc['wallet_address']: doc
+            async for doc in db.wallets.find(
+                {"wallet_address": {"$in": [w.wallet_address for w in wallets]}},
+                PREVIOUS_WALLET_PROJECTION
+            )
+        }
+        
+        # One bulk upsert into wallets, one insert_many into history
+        failed_indexes: Dict[int, str] = {}
+        try:
+            await db.wallets.bulk_write(
+                [
+                    UpdateOne(
+                        {"wallet_address": wallet_data.wallet_address},
+                        {"$set": wallet_to_doc(wallet_data)},
+                        upsert=True
+                    )
+                    for wallet_data in wallets
+                ],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                failed_indexes[write_error['index']] = write_error.get('errmsg', 'Write failed')
+        except Exception as e:
+            logger.error(f"Error persisting wallet batch: {e}")
+            failed_indexes = {i: str(e) for i in range(len(wallets))}
+        
+        persisted = [wallet_data for i, wallet_data in enumerate(wallets) if i not in failed_indexes]
+        for wallet_data in persisted:
+            record_wallet_write(previous_docs.get(wallet_data.wallet_address), wallet_data)
+        
+        if persisted:
+            try:
+                history_docs = [history_doc_for(wallet_data) for wallet_data in persisted]
+                await db.reputation_history.insert_many(history_docs, ordered=False)
+                await db.reputation_rollups.bulk_write(rollup_updates(history_docs), ordered=False)
+                history_version.bump()
+            except Exception as e:
+                logger.error(f"Error writing reputation history batch: {e}")
+            
+            try:
+                await db.ingestion_cursors.bulk_write(
+                    [
+                        UpdateOne(
+                            {"wallet_address": wallet_data.wallet_address},
+                            {"$set": cursor_to_doc(cursors[wallet_data.wallet_address])},
+                            upsert=True
+                        )
+                        for wallet_data in persisted
+                    ],
+                    ordered=False
+                )
+                await enqueue_unparsed([
+                    wallet_data.wallet_address
+                    for wallet_data in persisted
+                    if cursors[wallet_data.wallet_address].unparsed_signatures
+                ])
+            except Exception as e:
+                logger.error(f"Error saving ingestion cursors: {e}")
+        
+        for i, wallet_data in enumerate(wallets):
+            if i in failed_indexes:
+                results[wallet_data.wallet_address] = BatchAnalysisResult(
+                    wallet_address=wallet_data.wallet_address, success=False, error=failed_indexes[i]
+                )
+            else:
+                wallet_cache.set(wallet_data.wallet_address, wallet_data)
+                results[wallet_data.wallet_address] = BatchAnalysisResult(
+                    wallet_address=wallet_data.wallet_address, success=True, data=wallet_data
+                )
+    
+    return results
+
+@api_router.post("/wallets/analyze/batch", response_model=BatchAnalysisResponse)
+async def analyze_wallets_batch(request: BatchAnalysisRequest):
+    """Analyze many wallets with bounded concurrent RPC fan-out"""
+    # Deduplicate while keeping the caller's order
+    addresses = list(dict.fromkeys(request.wallet_addresses))
+    results: Dict[str, BatchAnalysisResult] = {}
+    
+    valid_addresses = []
+    pubkeys: Dict[str, Pubkey] = {}
+    for wallet_address in addresses:
+        try:
+            pubkeys[wallet_address] = validate_wallet_address(wallet_address)
+            valid_addresses.append(wallet_address)
+        except HTTPException as e:
+            results[wallet_address] = BatchAnalysisResult(
+                wallet_address=wallet_address, success=False, error=e.detail
+            )
+    
+    # Serve recently analyzed wallets without touching the RPC
+    if not request.force:
+        fresh_wallets = await get_fresh_wallets(valid_addresses)
+        for wallet_address, wallet_data in fresh_wallets.items():
+            results[wallet_address] = BatchAnalysisResult(
+                wallet_address=wallet_address, success=True, data=wallet_data
+            )
+        valid_addresses = [a for a in valid_addresses if a not in fresh_wallets]
+    
+    # Wallets another request is already analyzing are joined; the rest are
+    # registered as in flight, so requests arriving meanwhile join this batch
+    joined_addresses = []
+    flights: Dict[str, asyncio.Future] = {}
+    for wallet_address in valid_addresses:
+        flight = analysis_flight.lead((wallet_address, False))
+        if flight is None:
+            joined_addresses.append(wallet_address)
+        else:
+            flights[wallet_address] = flight
+    
+    # Start waiting on joined analyses now, before their flights can finish
+    joining = asyncio.gather(
+        *(analysis_flight.do((a, False), lambda a=a: run_wallet_analysis(a)) for a in joined_addresses),
+        return_exceptions=True
+    )
+    try:
+        results.update(await run_batch_analysis(list(flights), pubkeys))
+    finally:
+        for wallet_address, flight in flights.items():
+            result = results.get(wallet_address)
+            if result is not None and result.success:
+                flight.set_result(result.data)
+            else:
+                flight.set_exception(RuntimeError(result.error if result else "Batch analysis was interrupted"))
+    
+    for wallet_address, outcome in zip(joined_addresses, await joining):
+        if isinstance(outcome, Exception):
+            results[wallet_address] = BatchAnalysisResult(
+                wallet_address=wallet_address, success=False, error=str(outcome)
+            )
+        else:
+            results[wallet_address] = BatchAnalysisResult(
+                wallet_address=wallet_address, success=True, data=outcome
+            )
+    
+    ordered_results = [results[wallet_address] for wallet_address in addresses]
+    for result in ordered_results:
+        if result.data is not None:
+            result.data = with_rank(result.data)
+    succeeded = sum(1 for r in ordered_results if r.success)
+    
+    return BatchAnalysisResponse(
+        total=len(ordered_results),
+        succeeded=succeeded,
+        failed=len(ordered_results) - succeeded,
+        results=ordered_results
+    )
+
+@api_router.get("/wallets/export")
+async def export_wallets_stream(
+    format: str = "ndjson",
+    score_min: Optional[float] = None,
+    since: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Stream every wallet as NDJSON or CSV, one cursor batch at a time"""
+    require_admin(x_admin_token)
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(EXPORT_FORMATS)}")
+    try:
+        since_at = parse_since(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since must be an ISO date or datetime")
+    
+    stats = ExportStats()
+    
+    async def rows():
+        async for chunk in export_wallets(db, format, score_min, since_at, stats=stats):
+            yield chunk
+        summary = stats.summary()
+        logger.info(f"Exported {summary['rows']} wallets as {format} in {summary['seconds']}s ({summary['rows_per_second']} rows/s)")
+    
+    return StreamingResponse(
+        rows(),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="wallets.{format}"'}
+    )
+
 @api_router.get("/wallets/{wallet_address}", response_model=WalletData)
 async def get_wallet(wallet_address: str):
     """Get wallet reputation details"""
-    wallet = await db.wallets.find_one({"wallet_address": wallet_address}, {"_id": 0})
+    # An analysis still waiting in the write buffer is newer than Mongo
+    wallet = write_buffer.pending_wallet(wallet_address)
+    if wallet is not None:
+        wallet = dict(wallet)
+    else:
+        wallet = await db.wallets.find_one({"wallet_address": wallet_address}, {"_id": 0})
     
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     
-    if isinstance(wallet['last_analyzed'], str):
-        wallet['last_analyzed'] = datetime.fromisoformat(wallet['last_analyzed'])
+    refresh_scheduler.record_request(wallet_address)
     
-    return wallet
+    wallet['rank'] = rank_index.rank(wallet['reputation_score'])
+    wallet['percentile'] = rank_index.percentile(wallet['reputation_score'])
+    
+    # Validated and encoded once here, instead of again by response_model
+    return Response(wallet_json(wallet), media_type="application/json")
 
 @api_router.get("/wallets/leaderboard/top", response_model=List[WalletData])
-async def get_leaderboard(limit: int = 100):
+async def get_leaderboard(request: Request, limit: int = 100):
     """Get top wallets by reputation score"""
+    if limit <= leaderboard_store.size:
+        snapshot = await leaderboard_store.current()
+        # A snapshot never changes, so its version fully identifies the body
+        headers = cache_headers(etag('leaderboard', snapshot.version, limit), snapshot.built_at)
+        headers["X-Leaderboard-Version"] = str(snapshot.version)
+        if not_modified(request.headers, headers['ETag'], snapshot.built_at):
+            return Response(status_code=304, headers=headers)
+        # Entry JSON cached on the snapshot; response_model stays for the schema only
+        return Response(snapshot.entries_json(0, limit), media_type="application/json", headers=headers)
+    
+    if limit > LEADERBOARD_MAX_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit may not exceed {LEADERBOARD_MAX_LIMIT}; use /api/wallets/export for bulk reads"
+        )
+    
     wallets = await db.wallets.find({}, {"_id": 0}).sort("reputation_score", -1).limit(limit).to_list(limit)
     
     for i, wallet in enumerate(wallets):
-        if isinstance(wallet['last_analyzed'], str):
-            wallet['last_analyzed'] = datetime.fromisoformat(wallet['last_analyzed'])
         wallet['rank'] = i + 1
     
-    return wallets
+    return Response(b'[' + b','.join(wallet_json(wallet) for wallet in wallets) + b']', media_type="application/json")
+
+@api_router.get("/wallets/leaderboard/page", response_model=LeaderboardPage)
+async def get_leaderboard_page(
+    limit: int = Query(100, ge=1, le=1000),
+    after_score: Optional[float] = None,
+    after_address: Optional[str] = None,
+    version: Optional[int] = None
+):
+    """Page through the leaderboard snapshot by keyset cursor"""
+    if version is not None:
+        snapshot = await leaderboard_store.get_version(version)
+        if snapshot is None:
+            raise HTTPException(status_code=410, detail="Leaderboard snapshot version expired")
+    else:
+        snapshot = await leaderboard_store.current()
+    
+    start, stop, next_cursor = snapshot.page_bounds(limit, after_score=after_score, after_address=after_address)
+    
+    # Serialize the page around an empty entry list, then splice in the
+    # snapshot's cached entry JSON; "entries" follows version and built_at
+    page = LeaderboardPage(
+        version=snapshot.version,
+        built_at=snapshot.built_at,
+        entries=[],
+        next_cursor=next_cursor
+    ).model_dump_json().encode()
+    body = page.replace(b'"entries":[]', b'"entries":' + snapshot.entries_json(start, stop), 1)
+    return Response(body, media_type="application/json")
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Get wallet result cache and analysis coalescing counters"""
+    return {
+        **wallet_cache.stats(),
+        'single_flight': analysis_flight.stats(),
+        'transaction_parse': fetcher.parse_throughput(),
+        'analysis_jobs': analysis_jobs.stats(),
+        'write_buffer': write_buffer.stats()
+    }
+
+@api_router.get("/metrics/summary")
+async def get_metrics_summary():
+    """Get p50/p95/p99 latency per route, RPC method and Mongo collection"""
+    return REGISTRY.summary()
+
+@api_router.get("/wallets/analyze/timings")
+async def get_analysis_timings():
+    """Get latency per analysis stage across all requests"""
+    return stage_stats.stats()
+
+def require_admin(token: Optional[str]):
+    """Raise unless the request carries the configured admin token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@api_router.get("/admin/profiler")
+async def get_profiler_status(x_admin_token: Optional[str] = Header(None)):
+    """Get profiler settings and samples collected per route, writing any pending profiles"""
+    require_admin(x_admin_token)
+    await asyncio.to_thread(profiler.flush)
+    return profiler.stats()
+
+@api_router.post("/admin/profiler")
+async def configure_profiler(settings: ProfilerSettings, x_admin_token: Optional[str] = Header(None)):
+    """Turn request profiling on or off and set the sampled fraction of requests"""
+    require_admin(x_admin_token)
+    profiler.configure(enabled=settings.enabled, sample_rate=settings.sample_rate)
+    return profiler.stats()
+
+@api_router.delete("/admin/profiler")
+async def reset_profiler(x_admin_token: Optional[str] = Header(None)):
+    """Discard collected profiles"""
+    require_admin(x_admin_token)
+    profiler.reset()
+    return profiler.stats()
+
+@api_router.get("/refresh/stats")
+async def get_refresh_stats():
+    """Get background refresh queue depth, lag and throughput"""
+    return {'enabled': REFRESH_ENABLED, **refresh_scheduler.stats()}
+
+@api_router.get("/rpc/endpoints")
+async def get_rpc_endpoints():
+    """Get live health of the configured RPC endpoints"""
+    return fetcher.pool.stats()
+
+@api_router.get("/analytics/distribution", response_model=List[ScoreBucket])
+async def get_score_distribution(bins: int = Query(20, ge=1, le=200)):
+    """Get the reputation score distribution across all wallets"""
+    if not rank_index.ready:
+        await rank_index.rebuild(db)
+    return rank_index.distribution(bins)
 
 @api_router.get("/analytics/stats", response_model=AnalyticsStats)
-async def get_analytics_stats():
+async def get_analytics_stats(request: Request):
     """Get overall platform statistics"""
-    total_wallets = await db.wallets.count_documents({})
-    
-    # Calculate average reputation
-    pipeline = [
-        {"$group": {
-            "_id": None,
-            "avg_reputation": {"$avg": "$reputation_score"},
-            "total_transactions": {"$sum": "$metrics.transaction_count"}
-        }}
-    ]
-    result = await db.wallets.aggregate(pipeline).to_list(1)
+    # Counters are maintained on every write; only the first call scans
+    if not analytics_counters.ready:
+        await analytics_counters.reconcile(db)
     
-    avg_reputation = result[0]['avg_reputation'] if result else 0
-    total_transactions = result[0]['total_transactions'] if result else 0
-    
-    # Active wallets in last 24h
-    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
-    active_wallets = await db.wallets.count_documents({
-        "last_analyzed": {"$gte": yesterday.isoformat()}
-    })
+    active_wallets = analytics_counters.active_wallets()
+    # No Last-Modified: the 24h active count also drops as wallets age out,
+    # so it is part of the tag instead
+    headers = cache_headers(etag(
+        wallet_version.tag,
+        int(analytics_counters.reconciled_at.timestamp()),
+        active_wallets
+    ))
+    if not_modified(request.headers, headers['ETag']):
+        return Response(status_code=304, headers=headers)
     
-    return AnalyticsStats(
-        total_wallets_analyzed=total_wallets,
-        average_reputation=round(avg_reputation, 2),
-        total_transactions=total_transactions,
+    stats = AnalyticsStats(
+        total_wallets_analyzed=analytics_counters.total_wallets,
+        average_reputation=round(analytics_counters.average_score(), 2),
+        total_transactions=analytics_counters.transaction_sum,
         active_wallets_24h=active_wallets
     )
+    return Response(stats.model_dump_json().encode(), media_type="application/json", headers=headers)
 
 @api_router.get("/analytics/trends", response_model=List[ReputationTrend])
-async def get_reputation_trends(days: int = 7):
-    """Get historical reputation trends"""
+async def get_reputation_trends(request: Request, days: int = 7, granularity: str = "day"):
+    """Get historical reputation trends from the daily or hourly rollups"""
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {sorted(ROLLUP_GRANULARITIES)}")
+    
     try:
-        # Get data from last N days
-        start_date = datetime.now(timezone.utc) - timedelta(days=days)
-        
-        pipeline = [
-            {
-                "$match": {
-                    "timestamp": {"$gte": start_date.isoformat()}
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$dateToString": {
-                            "format": "%Y-%m-%d",
-                            "date": {"$toDate": "$timestamp"}
-                        }
-                    },
-                    "average_score": {"$avg": "$score"},
-                    "wallet_count": {"$sum": 1}
-                }
-            },
-            {"$sort": {"_id": 1}}
-        ]
-        
-        results = await db.reputation_history.aggregate(pipeline).to_list(days)
+        # Get buckets for the last N days, today included
+        now = datetime.now(timezone.utc)
+        if granularity == "day":
+            start_bucket = (now - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        else:
+            start_bucket = (now - timedelta(days=days)).strftime('%Y-%m-%dT%H')
         
-        trends = [
-            ReputationTrend(
-                date=r['_id'],
-                average_score=round(r['average_score'], 2),
-                wallet_count=r['wallet_count']
-            )
-            for r in results
-        ]
+        # Polls between history writes reuse the body without touching Mongo
+        cache_key = (granularity, start_bucket, history_version.tag)
+        cached = trends_cache.get(cache_key)
+        if cached is None:
+            rollups = await db.reputation_rollups.find(
+                {"granularity": granularity, "bucket": {"$gte": start_bucket}},
+                {"_id": 0}
+            ).sort("bucket", 1).to_list(None)
+            
+            trends = [
+                ReputationTrend(
+                    date=r['bucket'],
+                    average_score=round(r['score_sum'] / r['count'], 2),
+                    wallet_count=r['count'],
+                    min_score=r.get('min_score'),
+                    max_score=r.get('max_score')
+                )
+                for r in rollups
+                if r.get('count')
+            ]
+            body = TRENDS_ADAPTER.dump_json(trends)
+            # Tagged by content, so every worker reading the same rollups agrees
+            cached = (etag('trends', hashlib.sha1(body).hexdigest()[:16]), body)
+            trends_cache.set(cache_key, cached)
         
-        return trends
+        validator, body = cached
+        headers = cache_headers(validator)
+        if not_modified(request.headers, validator):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
     except Exception as e:
         logger.error(f"Error getting trends: {e}")
         return []
@@ -344,6 +1370,32 @@ async def get_reputation_trends(days: int = 7):
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# Gauges read from live state at scrape time
+REGISTRY.gauge(
+    'sorel_rpc_requests_in_flight', 'Solana RPC calls in flight per endpoint', ('endpoint',),
+    callback=lambda: {endpoint.name: endpoint.in_flight for endpoint in fetcher.pool.endpoints}
+)
+REGISTRY.gauge(
+    'sorel_analyses_in_flight', 'Wallet analyses currently running',
+    callback=lambda: analysis_flight.stats()['in_flight']
+)
+REGISTRY.gauge(
+    'sorel_write_buffer_pending', 'Analyses waiting in the write-behind buffer',
+    callback=lambda: write_buffer.stats()['pending']
+)
+REGISTRY.gauge(
+    'sorel_refresh_queue_depth', 'Wallets queued for background refresh',
+    callback=lambda: refresh_scheduler.stats()['queue_depth']
+)
+
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -358,7 +1410,41 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+async def rebuild_rank_index_periodically():
+    while True:
+        try:
+            await rank_index.rebuild(db)
+        except Exception as e:
+            logger.error(f"Rank index rebuild failed: {e}")
+        await asyncio.sleep(RANK_INDEX_REBUILD_SECONDS)
+
+async def reconcile_analytics_periodically():
+    while True:
+        try:
+            await analytics_counters.reconcile(db)
+        except Exception as e:
+            logger.error(f"Analytics reconciliation failed: {e}")
+        await asyncio.sleep(STATS_RECONCILE_SECONDS)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    write_buffer.start()
+    if len(fetcher.pool.endpoints) > 1:
+        background_tasks.append(asyncio.create_task(
+            fetcher.pool.run_health_checks(RPC_HEALTH_CHECK_SECONDS)
+        ))
+    background_tasks.append(asyncio.create_task(leaderboard_store.run_periodic_rebuild()))
+    background_tasks.append(asyncio.create_task(rebuild_rank_index_periodically()))
+    background_tasks.append(asyncio.create_task(reconcile_analytics_periodically()))
+    if REFRESH_ENABLED:
+        background_tasks.append(asyncio.create_task(refresh_scheduler.run()))
+    if analysis_jobs.workers > 0:
+        background_tasks.append(asyncio.create_task(analysis_jobs.run_workers()))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await write_buffer.close()
     client.close()
     await fetcher.close()
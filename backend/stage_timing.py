@@ -0,0 +1,81 @@
+"""
+Per-stage latency accounting for SoReL analyses
+Stages of an analysis (cache lookup, signature paging, balance, parsing,
+persistence...) are timed into the current request's breakdown through a
+context variable, so concurrent stages and nested helpers need no extra
+parameters. Totals per stage are kept for the timings endpoint.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+
+class StageTimings:
+    """Wall-clock milliseconds per stage for one request"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.start = time.perf_counter()
+
+    def record(self, stage: str, milliseconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + milliseconds
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, readable in browser dev tools"""
+        entries = [f"{stage};dur={ms:.1f}" for stage, ms in self.stages.items()]
+        entries.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(entries)
+
+
+class StageStats:
+    """Running count, total and max per stage across all requests"""
+
+    def __init__(self):
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def record(self, stage: str, milliseconds: float):
+        entry = self._stages.setdefault(stage, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        entry['count'] += 1
+        entry['total_ms'] += milliseconds
+        entry['max_ms'] = max(entry['max_ms'], milliseconds)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            stage: {
+                'count': int(entry['count']),
+                'avg_ms': round(entry['total_ms'] / entry['count'], 2),
+                'max_ms': round(entry['max_ms'], 2),
+                'total_ms': round(entry['total_ms'], 2)
+            }
+            for stage, entry in self._stages.items()
+        }
+
+
+stage_stats = StageStats()
+_current: ContextVar[Optional[StageTimings]] = ContextVar('stage_timings', default=None)
+
+
+def begin_request() -> StageTimings:
+    """Start a breakdown for the current request; tasks it spawns share it"""
+    timings = StageTimings()
+    _current.set(timings)
+    return timings
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block into the current request's breakdown and the global totals"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        milliseconds = (time.perf_counter() - start) * 1000
+        stage_stats.record(name, milliseconds)
+        timings = _current.get()
+        if timings is not None:
+            timings.record(name, milliseconds)
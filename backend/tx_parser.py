@@ -0,0 +1,85 @@
+"""
+Transaction parsing for SoReL
+Reduces jsonParsed getTransaction results to the small summaries used for
+wallet metrics. Confirmed transactions are immutable, so summaries are
+cached by signature and never fetched twice.
+"""
+
+from typing import Dict, List, Optional
+
+# Programs every transaction touches; they don't count as contract interactions
+NATIVE_PROGRAM_IDS = {
+    '11111111111111111111111111111111',
+    'ComputeBudget111111111111111111111111111111',
+    'Vote111111111111111111111111111111111111111',
+}
+
+# Bound on the program set kept per wallet cursor
+MAX_TRACKED_PROGRAMS = 256
+
+
+def _account_key(key) -> str:
+    # jsonParsed returns {"pubkey": ...}; plain json returns the string
+    return key['pubkey'] if isinstance(key, dict) else key
+
+
+def _program_id(instruction: Dict, account_keys: List[str]) -> Optional[str]:
+    if 'programId' in instruction:
+        return instruction['programId']
+    if 'programIdIndex' in instruction:
+        return account_keys[instruction['programIdIndex']]
+    return None
+
+
+def summarize_transaction(signature: str, result: Dict) -> Dict:
+    """Reduce a getTransaction result to the fields wallet metrics need"""
+    transaction = result.get('transaction') or {}
+    message = transaction.get('message') or {}
+    meta = result.get('meta') or {}
+
+    account_keys = [_account_key(k) for k in message.get('accountKeys', [])]
+    pre_balances = meta.get('preBalances') or []
+    post_balances = meta.get('postBalances') or []
+
+    balance_changes = {}
+    for account, pre, post in zip(account_keys, pre_balances, post_balances):
+        if post != pre:
+            balance_changes[account] = post - pre
+
+    instructions = list(message.get('instructions', []))
+    for inner in meta.get('innerInstructions') or []:
+        instructions.extend(inner.get('instructions', []))
+
+    program_ids = {_program_id(i, account_keys) for i in instructions} - {None}
+
+    return {
+        'signature': signature,
+        'block_time': result.get('blockTime'),
+        'slot': result.get('slot'),
+        'fee': meta.get('fee', 0),
+        'failed': meta.get('err') is not None,
+        'program_ids': sorted(program_ids - NATIVE_PROGRAM_IDS),
+        'balance_changes': balance_changes
+    }
+
+
+def accumulate_wallet_activity(wallet_address: str, summaries: List[Dict], program_ids: Optional[List[str]] = None) -> Dict:
+    """Fold transaction summaries into per-wallet volume and program totals"""
+    programs = set(program_ids or [])
+    volume_lamports = 0
+    contract_interactions = 0
+
+    for summary in summaries:
+        volume_lamports += abs(summary['balance_changes'].get(wallet_address, 0))
+        if summary['program_ids']:
+            contract_interactions += 1
+            for program_id in summary['program_ids']:
+                if len(programs) >= MAX_TRACKED_PROGRAMS:
+                    break
+                programs.add(program_id)
+
+    return {
+        'volume_lamports': volume_lamports,
+        'contract_interactions': contract_interactions,
+        'program_ids': sorted(programs)
+    }
@@ -0,0 +1,360 @@
+"""
+Write-behind persistence for SoReL
+Wallet upserts, reputation history, trend rollups and ingestion cursors
+from single analyses are buffered in memory and flushed together as bulk
+writes when the buffer fills or a short interval passes, taking the Mongo
+round trips off the request path. Writers wait when the buffer is full,
+and the buffer is drained on shutdown. Writes that fail go back into the
+buffer and are retried from the step that failed, up to
+WRITE_BUFFER_MAX_ATTEMPTS flushes. Rollup increments are not idempotent,
+so only the bucket updates a bulk write reports as failed are retried.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from analytics import rollup_updates
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+WRITE_BUFFER_FLUSH_SIZE = int(os.environ.get('WRITE_BUFFER_FLUSH_SIZE', '500'))
+WRITE_BUFFER_FLUSH_MS = float(os.environ.get('WRITE_BUFFER_FLUSH_MS', '250'))
+# Writers block once this many analyses are waiting to be flushed
+WRITE_BUFFER_MAX_PENDING = int(os.environ.get('WRITE_BUFFER_MAX_PENDING', '5000'))
+# Flushes an analysis may fail before it is dropped
+WRITE_BUFFER_MAX_ATTEMPTS = int(os.environ.get('WRITE_BUFFER_MAX_ATTEMPTS', '3'))
+DUPLICATE_KEY_ERROR = 11000
+
+
+class PendingWrite:
+    """One analysis waiting to be persisted, and how far its writes got"""
+
+    __slots__ = (
+        'wallet_address', 'wallet_doc', 'history_doc', 'cursor_doc', 'on_written',
+        'attempts', 'wallet_written', 'history_written'
+    )
+
+    def __init__(self, wallet_address: str, wallet_doc: Dict, history_doc: Dict, cursor_doc: Optional[Dict], on_written):
+        self.wallet_address = wallet_address
+        self.wallet_doc = wallet_doc
+        self.history_doc = history_doc
+        self.cursor_doc = cursor_doc
+        self.on_written = on_written
+        self.attempts = 0
+        self.wallet_written = False
+        self.history_written = False
+
+
+class WriteBehindBuffer:
+    """Batches analysis writes into bulk operations on a size or time threshold"""
+
+    def __init__(
+        self,
+        db,
+        previous_projection: Dict,
+        flush_size: int = WRITE_BUFFER_FLUSH_SIZE,
+        flush_seconds: float = WRITE_BUFFER_FLUSH_MS / 1000,
+        max_pending: int = WRITE_BUFFER_MAX_PENDING,
+        enabled: bool = WRITE_BEHIND_ENABLED,
+        on_history_written: Optional[Callable[[], Any]] = None,
+        max_attempts: int = WRITE_BUFFER_MAX_ATTEMPTS
+    ):
+        self.db = db
+        # Fields of the previous wallet document passed to on_written callbacks
+        self.previous_projection = previous_projection
+        self.flush_size = max(flush_size, 1)
+        self.flush_seconds = flush_seconds
+        self.max_pending = max(max_pending, self.flush_size)
+        self.enabled = enabled
+        self.max_attempts = max(max_attempts, 1)
+        # Called once a flush has written reputation history and rollups
+        self.on_history_written = on_history_written
+        self._pending: List[PendingWrite] = []
+        self._latest: Dict[str, Dict] = {}
+        self._latest_cursors: Dict[str, Dict] = {}
+        # Rollup bucket updates that failed, with the flushes each has failed
+        self._failed_rollups: List[Tuple[UpdateOne, int]] = []
+        self._flush_lock = asyncio.Lock()
+        self._size_reached = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.buffered = 0
+        self.flushes = 0
+        self.flushed = 0
+        self.failed = 0
+        self.retried = 0
+        self.rollups_dropped = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+        self.flush_seconds_total = 0.0
+
+    def pending_wallet(self, wallet_address: str) -> Optional[Dict]:
+        """The newest buffered wallet document, so reads see their own writes"""
+        return self._latest.get(wallet_address)
+
+    def pending_cursor(self, wallet_address: str) -> Optional[Dict]:
+        """The newest buffered ingestion cursor, so the next analysis resumes from it"""
+        return self._latest_cursors.get(wallet_address)
+
+    async def add(
+        self,
+        wallet_doc: Dict,
+        history_doc: Dict,
+        cursor_doc: Optional[Dict] = None,
+        on_written: Optional[Callable[[Optional[Dict]], Any]] = None
+    ):
+        """Buffer one analysis; on_written gets the wallet's previous document once flushed"""
+        if len(self._pending) >= self.max_pending:
+            self.backpressure_waits += 1
+            start = time.perf_counter()
+            self._size_reached.set()
+            async with self._space:
+                await self._space.wait_for(lambda: len(self._pending) < self.max_pending)
+            self.backpressure_seconds += time.perf_counter() - start
+
+        wallet_address = wallet_doc['wallet_address']
+        self._pending.append(PendingWrite(wallet_address, wallet_doc, history_doc, cursor_doc, on_written))
+        self._latest[wallet_address] = wallet_doc
+        if cursor_doc is not None:
+            self._latest_cursors[wallet_address] = cursor_doc
+        self.buffered += 1
+        if len(self._pending) >= self.flush_size:
+            self._size_reached.set()
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of analyses fully written
+
+        Analyses whose writes failed go back to the front of the buffer for
+        the next flush, or are dropped once they have used max_attempts.
+        """
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch and not self._failed_rollups:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                retry = await self._write(batch)
+            except Exception as e:
+                logger.error(f"Flushing {len(batch)} buffered analyses failed: {e}")
+                retry = batch
+
+            requeue = []
+            for write in retry:
+                write.attempts += 1
+                if write.attempts < self.max_attempts:
+                    requeue.append(write)
+                else:
+                    logger.error(f"Dropping buffered analysis of {write.wallet_address} after {write.attempts} failed flushes")
+                    self.failed += 1
+            self.retried += len(requeue)
+            self.flushed += len(batch) - len(retry)
+            # Retries go first, ahead of newer analyses of the same wallets
+            self._pending[:0] = requeue
+
+            retry_ids = {id(write) for write in requeue}
+            for write in batch:
+                # Reads fall through to Mongo once the wallet document is there
+                if write.wallet_written or id(write) not in retry_ids:
+                    if self._latest.get(write.wallet_address) is write.wallet_doc:
+                        del self._latest[write.wallet_address]
+                if id(write) not in retry_ids and self._latest_cursors.get(write.wallet_address) is write.cursor_doc:
+                    del self._latest_cursors[write.wallet_address]
+            self.flushes += 1
+            self.flush_seconds_total += time.perf_counter() - start
+            async with self._space:
+                self._space.notify_all()
+            return len(batch) - len(retry)
+
+    async def drain(self):
+        """Flush until nothing is buffered, pausing between flushes that retry"""
+        while self._pending or self._failed_rollups:
+            retried = self.retried
+            await self.flush()
+            if self.retried > retried or self._failed_rollups:
+                await asyncio.sleep(self.flush_seconds)
+
+    async def _write(self, batch: List[PendingWrite]) -> List[PendingWrite]:
+        """Run each write's remaining steps; returns the writes that need a retry"""
+        retry: List[PendingWrite] = []
+        wallet_writes = [write for write in batch if not write.wallet_written]
+        if wallet_writes:
+            retry.extend(await self._write_wallets(wallet_writes))
+
+        history_changed = False
+        if self._failed_rollups:
+            failed_rollups, self._failed_rollups = self._failed_rollups, []
+            history_changed = await self._apply_rollups(failed_rollups)
+
+        history_writes = [write for write in batch if write.wallet_written and not write.history_written]
+        if history_writes:
+            try:
+                await self._write_history(history_writes)
+            except Exception as e:
+                logger.error(f"Flushing buffered reputation history failed: {e}")
+                retry.extend(history_writes)
+            else:
+                for write in history_writes:
+                    write.history_written = True
+                history_changed = True
+
+        if history_changed and self.on_history_written is not None:
+            self.on_history_written()
+
+        cursors = {
+            write.wallet_address: write.cursor_doc
+            for write in batch
+            if write.history_written and write.cursor_doc is not None
+        }
+        if cursors:
+            try:
+                await self.db.ingestion_cursors.bulk_write(
+                    [
+                        UpdateOne({"wallet_address": address}, {"$set": cursor_doc}, upsert=True)
+                        for address, cursor_doc in cursors.items()
+                    ],
+                    ordered=False
+                )
+            except Exception as e:
+                logger.error(f"Flushing buffered ingestion cursors failed: {e}")
+                retry.extend(write for write in batch if write.history_written and write.cursor_doc is not None)
+        return retry
+
+    async def _write_wallets(self, batch: List[PendingWrite]) -> List[PendingWrite]:
+        """Upsert wallet documents; returns the writes that failed"""
+        addresses = list(dict.fromkeys(write.wallet_address for write in batch))
+        previous_docs = {
+            doc['wallet_address']: doc
+            async for doc in self.db.wallets.find({"wallet_address": {"$in": addresses}}, self.previous_projection)
+        }
+
+        # The last analysis of a wallet wins; earlier ones only feed history
+        latest: Dict[str, PendingWrite] = {}
+        for write in batch:
+            latest[write.wallet_address] = write
+
+        failed_addresses = set()
+        try:
+            await self.db.wallets.bulk_write(
+                [
+                    UpdateOne({"wallet_address": address}, {"$set": write.wallet_doc}, upsert=True)
+                    for address, write in latest.items()
+                ],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            ordered_addresses = list(latest)
+            for write_error in e.details.get('writeErrors', []):
+                failed_addresses.add(ordered_addresses[write_error['index']])
+                logger.error(f"Buffered wallet write failed: {write_error.get('errmsg')}")
+        except Exception as e:
+            logger.error(f"Flushing {len(batch)} buffered wallet writes failed: {e}")
+            failed_addresses = set(latest)
+
+        failed = []
+        for write in batch:
+            if write.wallet_address in failed_addresses:
+                failed.append(write)
+                continue
+            write.wallet_written = True
+            if write.on_written is not None:
+                write.on_written(previous_docs.get(write.wallet_address))
+            # A second analysis of the same wallet in this batch replaces the first
+            previous_docs[write.wallet_address] = write.wallet_doc
+        return failed
+
+    async def _write_history(self, batch: List[PendingWrite]):
+        """Insert history, then apply its rollups; raises if the insert fails
+
+        Once the rows are in, failed rollup updates are kept by the buffer
+        rather than retried with the history.
+        """
+        history_docs = [write.history_doc for write in batch]
+        try:
+            await self.db.reputation_history.insert_many(history_docs, ordered=False)
+        except BulkWriteError as e:
+            # Duplicates are rows a failed earlier attempt already inserted
+            errors = [error for error in e.details.get('writeErrors', []) if error.get('code') != DUPLICATE_KEY_ERROR]
+            if errors:
+                raise
+        await self._apply_rollups([(operation, 0) for operation in rollup_updates(history_docs)])
+
+    async def _apply_rollups(self, operations: List[Tuple[UpdateOne, int]]) -> bool:
+        """Apply rollup bucket updates; returns whether any landed
+
+        Updates reported failed in the BulkWriteError are kept for the next
+        flush. The rest were applied and are not sent again, as their $inc
+        would count the same history twice.
+        """
+        try:
+            await self.db.reputation_rollups.bulk_write([operation for operation, _ in operations], ordered=False)
+        except BulkWriteError as e:
+            failed_indexes = {error['index'] for error in e.details.get('writeErrors', [])}
+            for index in sorted(failed_indexes):
+                operation, attempts = operations[index]
+                if attempts + 1 < self.max_attempts:
+                    self._failed_rollups.append((operation, attempts + 1))
+                else:
+                    self.rollups_dropped += 1
+                    logger.error(f"Dropping a rollup update after {attempts + 1} failed flushes")
+            return len(failed_indexes) < len(operations)
+        except Exception as e:
+            # The driver has already retried the write; which buckets it
+            # reached is unknown, so skip them rather than double count.
+            # python db_setup.py rollups rebuilds them from history.
+            self.rollups_dropped += len(operations)
+            logger.error(f"Applying {len(operations)} rollup updates failed, buckets may undercount: {e}")
+            return False
+        return True
+
+    async def run(self):
+        """Flush whenever the size threshold is reached or the interval passes"""
+        while True:
+            try:
+                await asyncio.wait_for(self._size_reached.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._size_reached.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Write buffer flush failed: {e}")
+
+    def start(self):
+        if self.enabled and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self.run())
+
+    async def close(self):
+        """Stop the flush loop and drain whatever is still buffered"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.drain()
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'pending': len(self._pending),
+            'buffered': self.buffered,
+            'flushed': self.flushed,
+            'failed': self.failed,
+            'retried': self.retried,
+            'pending_rollups': len(self._failed_rollups),
+            'rollups_dropped': self.rollups_dropped,
+            'flushes': self.flushes,
+            'avg_batch_size': round(self.flushed / self.flushes, 2) if self.flushes else 0.0,
+            'avg_flush_ms': round(self.flush_seconds_total / self.flushes * 1000, 2) if self.flushes else 0.0,
+            'backpressure_waits': self.backpressure_waits,
+            'backpressure_seconds_total': round(self.backpressure_seconds, 4)
+        }
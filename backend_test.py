@@ -165,6 +165,51 @@ class SoReLAPITester:
                 
         return success, response
 
+    def test_conditional_polling(self):
+        """Test that repeated polls get 304s without re-reading the database"""
+        def rollup_reads():
+            summary = requests.get(f"{self.api_url}/metrics/summary", timeout=30).json()
+            return sum(
+                entry['count']
+                for entry in summary.get('sorel_mongo_operation_duration_seconds', [])
+                if entry['labels'].get('collection') == 'reputation_rollups'
+            )
+
+        self.tests_run += 1
+        print(f"\n🔍 Testing Conditional Polling...")
+        try:
+            passed = True
+            for endpoint in ["wallets/leaderboard/top?limit=10", "analytics/stats", "analytics/trends?days=7"]:
+                first = requests.get(f"{self.api_url}/{endpoint}", timeout=30)
+                etag = first.headers.get('ETag')
+                if not etag or 'stale-while-revalidate' not in first.headers.get('Cache-Control', ''):
+                    print(f"❌ {endpoint}: missing ETag or Cache-Control")
+                    passed = False
+                    continue
+                repeat = requests.get(f"{self.api_url}/{endpoint}", headers={'If-None-Match': etag}, timeout=30)
+                print(f"   {endpoint}: {repeat.status_code} for ETag {etag}")
+                if repeat.status_code != 304:
+                    passed = False
+
+            # Polls between writes are answered from memory, not Mongo
+            before = rollup_reads()
+            for _ in range(10):
+                requests.get(f"{self.api_url}/analytics/trends?days=7", timeout=30)
+            reads = rollup_reads() - before
+            print(f"   10 trend polls issued {reads} rollup reads")
+            if reads > 1:
+                passed = False
+
+            if passed:
+                self.tests_passed += 1
+                print("✅ Passed")
+            else:
+                print("❌ Failed - Repeated polls were not served conditionally")
+            return passed, {}
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return False, {}
+
     def test_invalid_wallet(self):
         """Test with invalid wallet address"""
         success, response = self.run_test(
@@ -200,6 +245,7 @@ def main():
         tester.test_analyze_wallet,  # This creates data for other tests
         tester.test_get_wallet,
         tester.test_leaderboard,
+        tester.test_conditional_polling,
         tester.test_invalid_wallet,
         tester.test_missing_wallet,
     ]
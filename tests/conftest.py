@@ -0,0 +1,83 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+# The backend is a flat set of modules run from its own directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+# server.py creates its Motor client at import; tests swap in mongomock
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'sorel_test')
+
+ANALYSIS_SECONDS = 0.05
+
+
+@pytest.fixture
+def mongo():
+    """An empty in-memory database; test modules may override it to wrap it"""
+    return AsyncMongoMockClient()['sorel_test']
+
+
+@pytest.fixture
+def server_db(monkeypatch, mongo):
+    """server.py bound to the in-memory database, with empty in-process state"""
+    import server
+    from analytics import AnalyticsCounters
+    from cache import TTLCache
+    from lease import MongoLease
+    from rank_index import ScoreRankIndex
+
+    monkeypatch.setattr(server, 'db', mongo)
+    for name in dir(server):
+        value = getattr(server, name)
+        if isinstance(value, type) or 'db' not in getattr(value, '__dict__', {}):
+            continue
+        monkeypatch.setattr(value, 'db', mongo)
+        for attribute in vars(value).values():
+            if isinstance(attribute, MongoLease):
+                monkeypatch.setattr(attribute, 'db', mongo)
+
+    # Persist directly, so history rows exist as soon as an analysis returns
+    monkeypatch.setattr(server.write_buffer, 'enabled', False)
+
+    monkeypatch.setattr(server, 'wallet_cache', TTLCache(server.WALLET_CACHE_SIZE, server.WALLET_FRESHNESS_SECONDS))
+    monkeypatch.setattr(server, 'trends_cache', TTLCache(256, server.TRENDS_CACHE_SECONDS))
+    monkeypatch.setattr(server, 'analytics_counters', AnalyticsCounters())
+    monkeypatch.setattr(server, 'rank_index', ScoreRankIndex(max_score=server.ReputationEngine.MAX_SCORE))
+    monkeypatch.setattr(server.leaderboard_store, 'snapshot', None)
+    monkeypatch.setattr(server.leaderboard_store, '_retained', {})
+    return mongo
+
+
+@pytest.fixture
+def wallet_metrics() -> Dict:
+    """Metrics the stubbed fetcher returns per address; others get a default"""
+    return {}
+
+
+@pytest.fixture
+def analysis_calls(monkeypatch, server_db, wallet_metrics) -> List[Tuple[str, bool]]:
+    """(address, backfill) of every stubbed RPC analysis, in call order"""
+    import server
+
+    recorded: List[Tuple[str, bool]] = []
+
+    async def analyze_wallet(wallet_address, cursor=None, backfill=False, pubkey=None, parse_limit=None):
+        recorded.append((wallet_address, backfill))
+        await asyncio.sleep(ANALYSIS_SECONDS)
+        return wallet_metrics.get(wallet_address) or server.WalletMetrics(
+            transaction_count=10,
+            total_volume=5.0,
+            contract_interactions=6,
+            wallet_age_days=30,
+            activity_frequency=0.3,
+            unique_programs=3
+        )
+
+    monkeypatch.setattr(server.fetcher, 'analyze_wallet', analyze_wallet)
+    return recorded
@@ -0,0 +1,128 @@
+"""
+Concurrent single and batch analyses of a wallet share one RPC analysis
+The fetcher is stubbed with a slow analysis that counts its calls, and
+Mongo is replaced with mongomock, so no RPC provider or database is needed.
+"""
+
+import asyncio
+from typing import Dict, List
+
+import pytest
+from fastapi import Response
+from solders.pubkey import Pubkey
+
+import server
+from server import BatchAnalysisRequest, WalletAnalysisRequest
+
+from .conftest import ANALYSIS_SECONDS
+
+
+def new_address() -> str:
+    return str(Pubkey.new_unique())
+
+
+async def wait_in_flight(key):
+    while not server.analysis_flight.in_flight(key):
+        await asyncio.sleep(0.001)
+
+
+async def history_counts(addresses: List[str]) -> Dict[str, int]:
+    return {
+        address: await server.db.reputation_history.count_documents({"wallet_address": address})
+        for address in addresses
+    }
+
+
+def test_single_request_joins_running_batch(analysis_calls):
+    first, second = new_address(), new_address()
+
+    async def scenario():
+        batch = asyncio.create_task(
+            server.analyze_wallets_batch(BatchAnalysisRequest(wallet_addresses=[first, second]))
+        )
+        await wait_in_flight((first, False))
+        single = await server.analyze_wallet(WalletAnalysisRequest(wallet_address=first), Response())
+        return single, await batch
+
+    single, batch = asyncio.run(scenario())
+
+    assert sorted(analysis_calls) == sorted([(first, False), (second, False)])
+    assert batch.succeeded == 2
+    assert single.reputation_score == batch.results[0].data.reputation_score
+    assert asyncio.run(history_counts([first, second])) == {first: 1, second: 1}
+
+
+def test_batch_joins_running_single_request(analysis_calls):
+    first, second = new_address(), new_address()
+
+    async def scenario():
+        single = asyncio.create_task(
+            server.analyze_wallet(WalletAnalysisRequest(wallet_address=first), Response())
+        )
+        await wait_in_flight((first, False))
+        batch = await server.analyze_wallets_batch(BatchAnalysisRequest(wallet_addresses=[first, second]))
+        return await single, batch
+
+    single, batch = asyncio.run(scenario())
+
+    assert sorted(analysis_calls) == sorted([(first, False), (second, False)])
+    assert batch.succeeded == 2
+    assert batch.results[0].data.reputation_score == single.reputation_score
+    assert asyncio.run(history_counts([first, second])) == {first: 1, second: 1}
+
+
+def test_concurrent_single_requests_share_one_analysis(analysis_calls):
+    address = new_address()
+
+    async def scenario():
+        return await asyncio.gather(*(
+            server.analyze_wallet(WalletAnalysisRequest(wallet_address=address), Response())
+            for _ in range(5)
+        ))
+
+    results = asyncio.run(scenario())
+
+    assert analysis_calls == [(address, False)]
+    assert len({result.reputation_score for result in results}) == 1
+    assert asyncio.run(history_counts([address])) == {address: 1}
+
+
+def test_backfill_does_not_join_incremental_analysis(analysis_calls):
+    address = new_address()
+
+    async def scenario():
+        backfill = asyncio.create_task(
+            server.analyze_wallet(WalletAnalysisRequest(wallet_address=address, backfill=True), Response())
+        )
+        await wait_in_flight((address, True))
+        await server.analyze_wallet(WalletAnalysisRequest(wallet_address=address), Response())
+        await backfill
+
+    asyncio.run(scenario())
+
+    assert sorted(analysis_calls) == [(address, False), (address, True)]
+
+
+def test_failed_batch_analysis_fails_joined_request(analysis_calls, monkeypatch):
+    address = new_address()
+
+    async def failing_analysis(wallet_address, cursor=None, backfill=False, pubkey=None, parse_limit=None):
+        analysis_calls.append((wallet_address, backfill))
+        await asyncio.sleep(ANALYSIS_SECONDS)
+        raise RuntimeError("RPC unavailable")
+
+    monkeypatch.setattr(server.fetcher, 'analyze_wallet', failing_analysis)
+
+    async def scenario():
+        batch = asyncio.create_task(server.analyze_wallets_batch(BatchAnalysisRequest(wallet_addresses=[address])))
+        await wait_in_flight((address, False))
+        with pytest.raises(server.HTTPException) as error:
+            await server.analyze_wallet(WalletAnalysisRequest(wallet_address=address), Response())
+        return error.value, await batch
+
+    error, batch = asyncio.run(scenario())
+
+    assert analysis_calls == [(address, False)]
+    assert error.status_code == 500
+    assert batch.failed == 1
+    assert not server.analysis_flight.in_flight((address, False))
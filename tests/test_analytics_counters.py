@@ -0,0 +1,126 @@
+"""
+Running platform totals kept by AnalyticsCounters
+Inserts and re-scores of the same wallet must leave the totals a full
+recount would give, and the 24h active set must expire on time, however
+often a wallet is analyzed.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import analytics
+from analytics import ACTIVE_WINDOW_SECONDS, AnalyticsCounters
+
+
+class Clock:
+    """Stands in for the time module inside analytics"""
+
+    def __init__(self):
+        self.now = datetime.now(timezone.utc).timestamp()
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(analytics, 'time', clock)
+    return clock
+
+
+def at(clock: Clock, seconds_ago: float = 0) -> datetime:
+    return datetime.fromtimestamp(clock.now - seconds_ago, timezone.utc)
+
+
+def test_insert_then_rescore_keeps_running_totals(clock):
+    counters = AnalyticsCounters()
+
+    counters.record_upsert('a', None, 400.0, 10, at(clock))
+    counters.record_upsert('b', None, 600.0, 30, at(clock))
+    assert counters.total_wallets == 2
+    assert counters.average_score() == 500.0
+    assert counters.transaction_sum == 40
+
+    # Re-scoring replaces the wallet's score and transaction count
+    counters.record_upsert('a', {'reputation_score': 400.0, 'metrics': {'transaction_count': 10}}, 700.0, 25, at(clock))
+
+    assert counters.total_wallets == 2
+    assert counters.score_sum == 1300.0
+    assert counters.average_score() == 650.0
+    assert counters.transaction_sum == 55
+    assert counters.active_wallets() == 2
+
+
+def test_running_totals_match_reconcile(clock):
+    db = AsyncMongoMockClient()['sorel_test']
+    counters = AnalyticsCounters()
+    stored = {}
+
+    async def write(address, score, transactions, seconds_ago):
+        analyzed_at = at(clock, seconds_ago)
+        previous = stored.get(address)
+        counters.record_upsert(address, previous, score, transactions, analyzed_at)
+        stored[address] = {'reputation_score': score, 'metrics': {'transaction_count': transactions}}
+        await db.wallets.update_one(
+            {'wallet_address': address},
+            {'$set': {**stored[address], 'wallet_address': address, 'last_analyzed': analyzed_at.isoformat()}},
+            upsert=True
+        )
+
+    async def scenario():
+        await write('a', 100.0, 1, 0)
+        await write('b', 200.0, 2, 3600)
+        await write('a', 300.0, 4, 0)
+        await write('c', 50.0, 9, ACTIVE_WINDOW_SECONDS + 60)
+        recounted = AnalyticsCounters()
+        await recounted.reconcile(db)
+        return recounted
+
+    recounted = asyncio.run(scenario())
+
+    assert (counters.total_wallets, counters.score_sum, counters.transaction_sum) == (
+        recounted.total_wallets, recounted.score_sum, recounted.transaction_sum
+    )
+    assert counters.active_wallets() == recounted.active_wallets() == 2
+
+
+def test_active_set_expires_after_24_hours(clock):
+    counters = AnalyticsCounters()
+    counters.record_upsert('old', None, 1.0, 1, at(clock, ACTIVE_WINDOW_SECONDS - 60))
+    counters.record_upsert('new', None, 1.0, 1, at(clock))
+
+    assert counters.active_wallets() == 2
+
+    clock.now += 120
+    assert counters.active_wallets() == 1
+
+    clock.now += ACTIVE_WINDOW_SECONDS
+    assert counters.active_wallets() == 0
+    # Expiry only shrinks the active set, never the totals
+    assert counters.total_wallets == 2
+
+
+def test_reanalysis_keeps_a_wallet_active(clock):
+    counters = AnalyticsCounters()
+    counters.record_upsert('a', None, 1.0, 1, at(clock, ACTIVE_WINDOW_SECONDS - 60))
+    counters.record_upsert('a', {'reputation_score': 1.0}, 2.0, 1, at(clock))
+
+    # The first analysis's heap entry expires, but it was superseded
+    clock.now += 120
+    assert counters.active_wallets() == 1
+
+    clock.now += ACTIVE_WINDOW_SECONDS
+    assert counters.active_wallets() == 0
+
+
+def test_out_of_order_write_does_not_shorten_activity(clock):
+    counters = AnalyticsCounters()
+    counters.record_upsert('a', None, 1.0, 1, at(clock))
+    counters.record_upsert('a', {'reputation_score': 1.0}, 1.0, 1, at(clock, ACTIVE_WINDOW_SECONDS - 60))
+
+    clock.now += 120
+    assert counters.active_wallets() == 1
@@ -0,0 +1,130 @@
+"""
+Conditional polls of the cached read endpoints are answered without Mongo
+Clients repeating a request with If-None-Match get an empty 304, and the
+wallets and reputation_rollups collections are not read again until a
+write changes the data behind the endpoint. Every collection call is
+counted through a proxy around the mongomock database.
+"""
+
+import asyncio
+from collections import Counter
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from solders.pubkey import Pubkey
+
+import server
+
+POLLED_PATHS = ['/api/analytics/trends', '/api/analytics/stats', '/api/wallets/leaderboard/top']
+POLLS = 5
+
+
+class CountingCollection:
+    """Collection proxy counting each method called on it"""
+
+    def __init__(self, collection, name: str, calls: Counter):
+        self._collection = collection
+        self._name = name
+        self._calls = calls
+
+    def __getattr__(self, attribute):
+        value = getattr(self._collection, attribute)
+        if not callable(value):
+            return value
+
+        def counted(*args, **kwargs):
+            self._calls[self._name] += 1
+            return value(*args, **kwargs)
+        return counted
+
+
+class CountingDatabase:
+    """Database proxy whose calls per collection are in .calls"""
+
+    def __init__(self, database):
+        self._database = database
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        return CountingCollection(getattr(self._database, name), name, self.calls)
+
+    def __getitem__(self, name):
+        return self.__getattr__(name)
+
+
+@pytest.fixture
+def mongo():
+    return CountingDatabase(AsyncMongoMockClient()['sorel_test'])
+
+
+@pytest.fixture
+def client(analysis_calls):
+    # Not entered as a context manager, so no background tasks start
+    return TestClient(server.app)
+
+
+def analyze(client: TestClient) -> str:
+    address = str(Pubkey.new_unique())
+    response = client.post('/api/wallets/analyze', json={'wallet_address': address})
+    assert response.status_code == 200
+    return address
+
+
+def reads(mongo: CountingDatabase) -> Counter:
+    return Counter({name: mongo.calls[name] for name in ('wallets', 'reputation_rollups')})
+
+
+def test_repeated_polls_get_304_without_reading_mongo(client, mongo):
+    analyze(client)
+    analyze(client)
+
+    etags = {}
+    for path in POLLED_PATHS:
+        response = client.get(path)
+        assert response.status_code == 200
+        etags[path] = response.headers['ETag']
+
+    before = reads(mongo)
+    for _ in range(POLLS):
+        for path in POLLED_PATHS:
+            response = client.get(path, headers={'If-None-Match': etags[path]})
+            assert response.status_code == 304, path
+            assert response.content == b''
+            assert response.headers['ETag'] == etags[path]
+
+    assert reads(mongo) == before
+
+
+def test_write_invalidates_only_what_it_changed(client, mongo):
+    analyze(client)
+    etags = {path: client.get(path).headers['ETag'] for path in POLLED_PATHS}
+
+    analyze(client)
+    before = reads(mongo)
+
+    # New history: the trend body changes and the rollups are read once
+    trends = client.get('/api/analytics/trends', headers={'If-None-Match': etags['/api/analytics/trends']})
+    assert trends.status_code == 200
+    assert trends.json()[-1]['wallet_count'] == 2
+    for _ in range(POLLS):
+        assert client.get('/api/analytics/trends', headers={'If-None-Match': trends.headers['ETag']}).status_code == 304
+    assert mongo.calls['reputation_rollups'] == before['reputation_rollups'] + 1
+
+    # New wallet version: stats change, served from the running counters
+    stats = client.get('/api/analytics/stats', headers={'If-None-Match': etags['/api/analytics/stats']})
+    assert stats.status_code == 200
+    assert stats.json()['total_wallets_analyzed'] == 2
+    for _ in range(POLLS):
+        assert client.get('/api/analytics/stats', headers={'If-None-Match': stats.headers['ETag']}).status_code == 304
+
+    # The leaderboard only changes when a new snapshot version is built
+    leaderboard = '/api/wallets/leaderboard/top'
+    assert client.get(leaderboard, headers={'If-None-Match': etags[leaderboard]}).status_code == 304
+    assert mongo.calls['wallets'] == before['wallets']
+
+    asyncio.run(server.leaderboard_store.rebuild(persist=False))
+    rebuilt = client.get(leaderboard, headers={'If-None-Match': etags[leaderboard]})
+    assert rebuilt.status_code == 200
+    assert len(rebuilt.json()) == 2
+    assert mongo.calls['wallets'] == before['wallets'] + 1
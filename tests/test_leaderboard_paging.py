@@ -0,0 +1,151 @@
+"""
+Keyset paging of leaderboard snapshots
+Pages follow score descending with ties broken by address, the last page
+carries no next cursor, and a pinned version stays pageable until it
+expires, after which the page endpoint answers 410.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from leaderboard import LEADERBOARD_RETENTION_SECONDS, SNAPSHOTS_CACHED, LeaderboardSnapshot
+
+SCORES = {
+    'wallet-e': 900.0,
+    'wallet-c': 750.0,
+    'wallet-a': 750.0,
+    'wallet-d': 750.0,
+    'wallet-b': 500.0,
+    'wallet-f': 500.0,
+}
+# Score descending, then address ascending
+ORDER = ['wallet-e', 'wallet-a', 'wallet-c', 'wallet-d', 'wallet-b', 'wallet-f']
+
+
+def wallet_doc(address: str, score: float) -> Dict:
+    return {
+        'wallet_address': address,
+        'reputation_score': score,
+        'metrics': {
+            'transaction_count': 10,
+            'total_volume': 5.0,
+            'contract_interactions': 6,
+            'wallet_age_days': 30,
+            'activity_frequency': 0.3,
+            'unique_programs': 3
+        },
+        'last_analyzed': datetime.now(timezone.utc).isoformat()
+    }
+
+
+@pytest.fixture
+def ranked_wallets(server_db):
+    asyncio.run(server_db.wallets.insert_many([wallet_doc(a, s) for a, s in SCORES.items()]))
+    return server_db
+
+
+def snapshot_of(scores: Dict[str, float]) -> LeaderboardSnapshot:
+    entries = sorted(
+        ({'wallet_address': a, 'reputation_score': s} for a, s in scores.items()),
+        key=lambda e: (-e['reputation_score'], e['wallet_address'])
+    )
+    return LeaderboardSnapshot(1, datetime.now(timezone.utc), entries)
+
+
+def walk(snapshot: LeaderboardSnapshot, limit: int) -> List[List[str]]:
+    pages, cursor = [], {}
+    while True:
+        start, stop, cursor = snapshot.page_bounds(limit, **(cursor or {}))
+        pages.append([e['wallet_address'] for e in snapshot.entries[start:stop]])
+        if cursor is None:
+            return pages
+
+
+def test_ties_on_score_are_broken_by_address():
+    snapshot = snapshot_of(SCORES)
+
+    # Every page boundary falls inside or next to the run of 750s
+    for limit in range(1, len(ORDER) + 1):
+        pages = walk(snapshot, limit)
+        assert [address for page in pages for address in page] == ORDER
+        assert all(len(page) == limit for page in pages[:-1])
+
+
+def test_cursor_inside_a_tie_resumes_after_that_address():
+    snapshot = snapshot_of(SCORES)
+
+    start, stop, cursor = snapshot.page_bounds(2, after_score=750.0, after_address='wallet-a')
+
+    assert [e['wallet_address'] for e in snapshot.entries[start:stop]] == ['wallet-c', 'wallet-d']
+    assert cursor == {'after_score': 750.0, 'after_address': 'wallet-d'}
+
+
+def test_no_next_cursor_at_the_end_of_the_snapshot():
+    snapshot = snapshot_of(SCORES)
+
+    # A last page that exactly fills the limit does not point at an empty page
+    assert snapshot.page_bounds(len(ORDER))[2] is None
+    assert snapshot.page_bounds(3, after_score=750.0, after_address='wallet-c')[2] is None
+    assert walk(snapshot, 3) == [ORDER[:3], ORDER[3:]]
+
+    # Past the last entry, and on an empty snapshot
+    assert snapshot.page_bounds(3, after_score=500.0, after_address='wallet-f') == (6, 6, None)
+    assert snapshot_of({}).page_bounds(3) == (0, 0, None)
+
+
+def test_page_endpoint_walks_the_snapshot(ranked_wallets):
+    client = TestClient(server.app)
+    seen, params = [], {'limit': 4}
+
+    first = client.get('/api/wallets/leaderboard/page', params=params).json()
+    seen += [e['wallet_address'] for e in first['entries']]
+    assert first['next_cursor'] == {'after_score': 750.0, 'after_address': 'wallet-d'}
+
+    params.update(first['next_cursor'], version=first['version'])
+    last = client.get('/api/wallets/leaderboard/page', params=params).json()
+    seen += [e['wallet_address'] for e in last['entries']]
+
+    assert seen == ORDER
+    assert [e['rank'] for e in first['entries'] + last['entries']] == list(range(1, 7))
+    assert last['next_cursor'] is None
+
+
+def test_pinned_version_pages_until_it_expires(ranked_wallets):
+    client = TestClient(server.app)
+    store = server.leaderboard_store
+
+    pinned = asyncio.run(store.rebuild()).version
+    first = client.get('/api/wallets/leaderboard/page', params={'limit': 2, 'version': pinned}).json()
+
+    # A newer snapshot does not disturb a client paging the pinned one
+    asyncio.run(ranked_wallets.wallets.update_one({'wallet_address': 'wallet-b'}, {'$set': {'reputation_score': 999.0}}))
+    asyncio.run(store.rebuild())
+    response = client.get(
+        '/api/wallets/leaderboard/page', params={'limit': 2, 'version': pinned, **first['next_cursor']}
+    )
+    assert response.status_code == 200
+    assert [e['wallet_address'] for e in response.json()['entries']] == ORDER[2:4]
+
+    # Once past retention, later rebuilds delete it and push it out of memory
+    expired_at = (datetime.now(timezone.utc) - timedelta(seconds=LEADERBOARD_RETENTION_SECONDS + 60)).isoformat()
+    asyncio.run(ranked_wallets.leaderboard_snapshots.update_one({'version': pinned}, {'$set': {'built_at': expired_at}}))
+    for _ in range(SNAPSHOTS_CACHED):
+        asyncio.run(store.rebuild())
+
+    response = client.get(
+        '/api/wallets/leaderboard/page', params={'limit': 2, 'version': pinned, **first['next_cursor']}
+    )
+    assert response.status_code == 410
+    assert response.json()['detail'] == "Leaderboard snapshot version expired"
+    assert asyncio.run(ranked_wallets.leaderboard_snapshot_chunks.count_documents({'version': pinned})) == 0
+
+
+def test_unknown_version_is_gone(ranked_wallets):
+    response = TestClient(server.app).get('/api/wallets/leaderboard/page', params={'version': 1})
+
+    assert response.status_code == 410
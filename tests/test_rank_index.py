@@ -0,0 +1,150 @@
+"""
+Rank and percentile lookups from the Fenwick score index
+Checked against a brute-force count over the same scores, including ties,
+the bounds of the score range and scores moving between buckets.
+"""
+
+import asyncio
+import random
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from rank_index import FenwickTree, ScoreRankIndex
+
+
+def index_of(*scores: float) -> ScoreRankIndex:
+    index = ScoreRankIndex(max_score=1000)
+    for score in scores:
+        index.add(score)
+    index.ready = True
+    return index
+
+
+def brute_rank(scores, score: float) -> int:
+    return sum(1 for s in scores if round(s, 2) > round(score, 2)) + 1
+
+
+def test_equal_scores_share_a_rank():
+    index = index_of(900.0, 750.5, 750.5, 750.5, 100.0)
+
+    assert index.rank(900.0) == 1
+    assert index.rank(750.5) == 2
+    assert index.rank(100.0) == 5
+    # A score nobody has ranks after everyone above it
+    assert index.rank(800.0) == 2
+    assert index.rank(750.49) == 5
+
+
+def test_scores_in_the_same_hundredth_tie():
+    index = index_of(500.004, 500.0, 499.996)
+
+    assert index.rank(500.0) == 1
+    assert index.percentile(500.0) == 100.0
+
+
+def test_percentile_bounds():
+    index = index_of(0.0, 250.0, 500.0, 1000.0)
+
+    assert index.percentile(1000.0) == 100.0
+    assert index.percentile(0.0) == 25.0
+    assert index.rank(1000.0) == 1
+    assert index.rank(0.0) == 4
+
+
+def test_percentile_is_zero_below_every_score_and_100_above():
+    index = index_of(200.0, 300.0)
+
+    assert index.percentile(100.0) == 0.0
+    assert index.percentile(999.99) == 100.0
+    assert index.rank(999.99) == 1
+
+
+def test_out_of_range_scores_clamp_to_the_end_buckets():
+    index = index_of(-5.0, 1005.0)
+
+    assert index.percentile(0.0) == 50.0
+    assert index.percentile(1000.0) == 100.0
+
+
+def test_update_moves_a_score_between_buckets():
+    index = index_of(900.0, 750.5, 750.5, 100.0)
+
+    index.update(750.5, 950.0)
+
+    assert index.total == 4
+    assert index.rank(950.0) == 1
+    assert index.rank(900.0) == 2
+    assert index.rank(750.5) == 3
+    assert index.rank(100.0) == 4
+
+    index.update(950.0, 50.0)
+
+    assert index.rank(900.0) == 1
+    assert index.rank(50.0) == 4
+    assert index.percentile(50.0) == 25.0
+
+
+def test_first_write_adds_and_remove_restores():
+    index = index_of(400.0)
+
+    index.update(None, 600.0)
+    assert index.total == 2
+    assert index.rank(400.0) == 2
+
+    index.remove(600.0)
+    assert index.total == 1
+    assert index.rank(400.0) == 1
+    assert index.percentile(400.0) == 100.0
+
+
+def test_not_ready_index_has_no_rank():
+    index = ScoreRankIndex()
+    index.add(500.0)
+
+    assert index.rank(500.0) is None
+    assert index.percentile(500.0) is None
+
+
+def test_matches_brute_force_through_random_updates():
+    rng = random.Random(9)
+    scores = [round(rng.uniform(0, 1000), 2) for _ in range(300)]
+    index = index_of(*scores)
+
+    for _ in range(300):
+        i = rng.randrange(len(scores))
+        new_score = round(rng.choice([scores[rng.randrange(len(scores))], rng.uniform(0, 1000)]), 2)
+        index.update(scores[i], new_score)
+        scores[i] = new_score
+
+    for score in scores[:50] + [0.0, 1000.0, 512.34]:
+        assert index.rank(score) == brute_rank(scores, score)
+        expected = sum(1 for s in scores if round(s, 2) <= round(score, 2)) / len(scores) * 100
+        assert index.percentile(score) == pytest.approx(round(expected, 2))
+
+
+def test_tree_built_from_counts_matches_incremental_adds():
+    counts = [3, 0, 5, 1, 0, 0, 7, 2, 4]
+    incremental = FenwickTree(len(counts))
+    for bucket, count in enumerate(counts):
+        incremental.add(bucket, count)
+
+    built = FenwickTree.from_counts(counts)
+
+    assert [built.prefix_sum(i) for i in range(len(counts))] == [incremental.prefix_sum(i) for i in range(len(counts))]
+
+
+def test_rebuild_counts_stored_scores():
+    db = AsyncMongoMockClient()['sorel_test']
+    scores = [10.0, 20.0, 20.0, 990.0]
+    asyncio.run(db.wallets.insert_many(
+        [{'wallet_address': f'w{i}', 'reputation_score': s} for i, s in enumerate(scores)] + [{'wallet_address': 'unscored'}]
+    ))
+    index = ScoreRankIndex()
+
+    asyncio.run(index.rebuild(db))
+
+    assert index.ready
+    assert index.total == 4
+    assert index.rank(20.0) == 2
+    assert index.percentile(10.0) == 25.0
@@ -0,0 +1,135 @@
+"""
+Daily and hourly reputation rollups
+History written by the batch endpoint is folded into day and hour
+buckets as it lands, and `python db_setup.py rollups` rebuilds the same
+bucket documents from raw history, however often it is re-run.
+"""
+
+import asyncio
+from typing import Dict, List
+
+import pytest
+from fastapi.testclient import TestClient
+from pymongo import InsertOne
+from solders.pubkey import Pubkey
+
+import db_setup
+import server
+from analytics import rollup_updates
+from server import BatchAnalysisRequest, WalletMetrics
+
+HISTORY = [
+    {'wallet_address': 'a', 'score': 100.0, 'timestamp': '2026-03-01T09:15:00+00:00'},
+    {'wallet_address': 'b', 'score': 300.0, 'timestamp': '2026-03-01T09:45:00+00:00'},
+    {'wallet_address': 'a', 'score': 200.0, 'timestamp': '2026-03-01T23:59:59+00:00'},
+    {'wallet_address': 'c', 'score': 50.0, 'timestamp': '2026-03-02T00:00:00+00:00'},
+]
+
+
+async def buckets(db) -> Dict[tuple, Dict]:
+    return {
+        (doc['granularity'], doc['bucket']): doc
+        async for doc in db.reputation_rollups.find({}, {'_id': 0})
+    }
+
+
+def test_history_folds_into_day_and_hour_buckets(mongo):
+    async def scenario():
+        await mongo.reputation_rollups.bulk_write(rollup_updates(HISTORY[:2]), ordered=False)
+        await mongo.reputation_rollups.bulk_write(rollup_updates(HISTORY[2:]), ordered=False)
+        return await buckets(mongo)
+
+    rollups = asyncio.run(scenario())
+
+    assert set(rollups) == {
+        ('day', '2026-03-01'), ('day', '2026-03-02'),
+        ('hour', '2026-03-01T09'), ('hour', '2026-03-01T23'), ('hour', '2026-03-02T00'),
+    }
+    day = rollups[('day', '2026-03-01')]
+    assert (day['count'], day['score_sum'], day['min_score'], day['max_score']) == (3, 600.0, 100.0, 300.0)
+    hour = rollups[('hour', '2026-03-01T09')]
+    assert (hour['count'], hour['score_sum'], hour['min_score'], hour['max_score']) == (2, 400.0, 100.0, 300.0)
+    assert rollups[('hour', '2026-03-02T00')]['count'] == 1
+
+
+def test_one_update_per_bucket_in_a_batch():
+    operations = rollup_updates(HISTORY)
+
+    # Two days and three hours, however many rows land in each
+    assert len(operations) == 5
+
+
+@pytest.fixture
+def batch_wallets(wallet_metrics) -> List[str]:
+    addresses = [str(Pubkey.new_unique()) for _ in range(3)]
+    for i, address in enumerate(addresses):
+        wallet_metrics[address] = WalletMetrics(
+            transaction_count=10 * (i + 1),
+            total_volume=1000.0 * (i + 1),
+            contract_interactions=5 * (i + 1),
+            wallet_age_days=30 * (i + 1),
+            activity_frequency=0.5 * (i + 1),
+            unique_programs=i + 1
+        )
+    return addresses
+
+
+def test_batch_analysis_folds_history_into_rollups(analysis_calls, batch_wallets):
+    async def scenario():
+        first = await server.analyze_wallets_batch(BatchAnalysisRequest(wallet_addresses=batch_wallets))
+        again = await server.analyze_wallets_batch(BatchAnalysisRequest(wallet_addresses=batch_wallets, force=True))
+        return first, again, await buckets(server.db)
+
+    first, again, rollups = asyncio.run(scenario())
+
+    scores = [result.data.reputation_score for result in first.results + again.results]
+    [day] = [doc for (granularity, _), doc in rollups.items() if granularity == 'day']
+    hours = [doc for (granularity, _), doc in rollups.items() if granularity == 'hour']
+    assert day['count'] == 6
+    assert day['score_sum'] == pytest.approx(sum(scores))
+    assert (day['min_score'], day['max_score']) == (min(scores), max(scores))
+    assert sum(hour['count'] for hour in hours) == 6
+    assert sum(hour['score_sum'] for hour in hours) == pytest.approx(sum(scores))
+
+    trends = TestClient(server.app).get('/api/analytics/trends', params={'days': 1}).json()
+    assert trends[-1]['wallet_count'] == 6
+    assert trends[-1]['average_score'] == round(sum(scores) / 6, 2)
+
+
+class MockMotorClient:
+    """What db_setup's AsyncIOMotorClient(url)[DB_NAME] resolves to in tests"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __getitem__(self, name):
+        return self.db
+
+    def close(self):
+        pass
+
+
+def test_rollups_command_rebuilds_the_same_documents(analysis_calls, batch_wallets, monkeypatch):
+    monkeypatch.setattr(db_setup, 'AsyncIOMotorClient', lambda url: MockMotorClient(server.db))
+
+    async def scenario():
+        await server.analyze_wallets_batch(BatchAnalysisRequest(wallet_addresses=batch_wallets))
+        # History from another day, written before rollups existed
+        await server.db.reputation_history.bulk_write([InsertOne(dict(doc)) for doc in HISTORY])
+        await server.db.reputation_rollups.bulk_write(rollup_updates(HISTORY), ordered=False)
+        incremental = await buckets(server.db)
+
+        await db_setup.backfill_trend_rollups()
+        rebuilt = await buckets(server.db)
+        await db_setup.backfill_trend_rollups()
+        rerun = await buckets(server.db)
+        return incremental, rebuilt, rerun
+
+    incremental, rebuilt, rerun = asyncio.run(scenario())
+
+    assert rerun == rebuilt
+    assert set(rebuilt) == set(incremental)
+    for key, doc in incremental.items():
+        assert rebuilt[key]['count'] == doc['count']
+        assert rebuilt[key]['score_sum'] == pytest.approx(doc['score_sum'])
+        assert (rebuilt[key]['min_score'], rebuilt[key]['max_score']) == (doc['min_score'], doc['max_score'])
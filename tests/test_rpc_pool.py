@@ -0,0 +1,214 @@
+"""
+RPC pool routing, ejection, failover, hedging and retries
+Each endpoint is a stub provider behind an httpx MockTransport with its own
+injected latency and error status, so the pool's real HTTP path runs
+without a network.
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+import httpx
+import pytest
+
+import rpc_pool
+from rate_limiter import AdaptiveRateLimiter, RateLimitedError
+from rpc_pool import RPCPool
+
+PAYLOAD = [{"jsonrpc": "2.0", "id": 0, "method": "getSlot"}]
+
+
+class StubProvider:
+    """One fake RPC host answering after latency_ms, or with status when set"""
+
+    def __init__(self, name: str, latency_ms: float = 5, status: Optional[int] = None):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.status = status
+        self.hits = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.hits += 1
+        await asyncio.sleep(self.latency_ms / 1000)
+        if self.status is not None:
+            return httpx.Response(self.status, json={"error": "injected"})
+        return httpx.Response(200, json=[{"jsonrpc": "2.0", "id": 0, "result": self.name}])
+
+
+def make_pool(*providers: StubProvider, hedge_after_ms: float = 10_000, max_retries: int = 0) -> RPCPool:
+    by_host: Dict[str, StubProvider] = {provider.name: provider for provider in providers}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return await by_host[request.url.host].handle(request)
+
+    pool = RPCPool(
+        [f"http://{provider.name}" for provider in providers],
+        hedge_after_ms=hedge_after_ms,
+        # Rate 0 disables client-side limiting, so only the stubs set the pace
+        limiter=AdaptiveRateLimiter(0, 1),
+        max_retries=max_retries
+    )
+    pool.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return pool
+
+
+def run(pool: RPCPool, scenario):
+    async def wrapped():
+        try:
+            return await scenario()
+        finally:
+            await pool.close()
+    return asyncio.run(wrapped())
+
+
+def test_routes_to_lowest_latency_endpoint():
+    slow, fast = StubProvider('slow', latency_ms=40), StubProvider('fast', latency_ms=2)
+    pool = make_pool(slow, fast)
+
+    async def scenario():
+        return [(await pool.post(PAYLOAD))[0]['result'] for _ in range(20)]
+
+    results = run(pool, scenario)
+
+    # Each endpoint is measured once, then the fast one takes the traffic
+    assert slow.hits == 1
+    assert results.count('fast') == 19
+    assert pool.endpoints[1].latency_ms < pool.endpoints[0].latency_ms
+
+
+def test_fails_over_to_healthy_endpoint():
+    broken, healthy = StubProvider('broken', status=500), StubProvider('healthy')
+    pool = make_pool(broken, healthy)
+
+    async def scenario():
+        return await pool.post(PAYLOAD)
+
+    result = run(pool, scenario)
+
+    assert result[0]['result'] == 'healthy'
+    assert pool.failovers == 1
+    assert pool.endpoints[0].errors == 1
+
+
+def test_ejects_endpoint_after_consecutive_errors():
+    broken, healthy = StubProvider('broken', status=503), StubProvider('healthy')
+    pool = make_pool(broken, healthy)
+
+    async def scenario():
+        for _ in range(10):
+            await pool.post(PAYLOAD)
+
+    run(pool, scenario)
+
+    # Unmeasured and erroring, it is tried first until ejected, then skipped
+    assert broken.hits == rpc_pool.RPC_EJECT_AFTER_ERRORS
+    assert pool.endpoints[0].ejected
+    assert healthy.hits == 10
+    assert pool.stats()['endpoints'][0]['ejected'] is True
+
+
+def test_ejected_endpoint_recovers_after_cool_down():
+    flaky, healthy = StubProvider('flaky', status=503), StubProvider('healthy', latency_ms=20)
+    pool = make_pool(flaky, healthy)
+
+    async def scenario():
+        for _ in range(rpc_pool.RPC_EJECT_AFTER_ERRORS):
+            await pool.post(PAYLOAD)
+        assert pool.endpoints[0].ejected
+
+        # Skip the cool-down, then send the single call probe() would make;
+        # probe() itself speaks getSlot through solana-py, not the stub
+        flaky.status = None
+        pool.endpoints[0].ejected_until = time.monotonic() - 1
+        await pool._attempt(pool.endpoints[0], lambda e: _post_json(pool, e.url), 'getSlot')
+
+    run(pool, scenario)
+
+    assert not pool.endpoints[0].ejected
+    assert pool.endpoints[0].consecutive_errors == 0
+
+
+def test_hedges_slow_primary():
+    slow, fast = StubProvider('slow', latency_ms=500), StubProvider('fast', latency_ms=5)
+    pool = make_pool(slow, fast, hedge_after_ms=50)
+
+    async def scenario():
+        start = time.perf_counter()
+        result = await pool.request(
+            lambda e: _post_json(pool, e.url), hedge=True, method='getSlot'
+        )
+        return result, time.perf_counter() - start
+
+    result, elapsed = run(pool, scenario)
+
+    assert result[0]['result'] == 'fast'
+    assert pool.hedged_requests == 1
+    assert elapsed < 0.4
+    # The losing primary was cancelled, not counted as a failure
+    assert pool.endpoints[0].errors == 0
+
+
+def test_no_hedge_when_primary_answers_in_time():
+    first, second = StubProvider('first', latency_ms=5), StubProvider('second', latency_ms=5)
+    pool = make_pool(first, second, hedge_after_ms=200)
+
+    async def scenario():
+        for _ in range(5):
+            await pool.request(lambda e: _post_json(pool, e.url), hedge=True)
+
+    run(pool, scenario)
+
+    assert pool.hedged_requests == 0
+    assert first.hits + second.hits == 5
+
+
+def test_retries_then_raises_when_every_endpoint_fails(monkeypatch):
+    monkeypatch.setattr(rpc_pool, 'RPC_RETRY_BASE_MS', 1)
+    a, b = StubProvider('a', status=502), StubProvider('b', status=502)
+    pool = make_pool(a, b, max_retries=2)
+
+    async def scenario():
+        with pytest.raises(httpx.HTTPStatusError):
+            await pool.post(PAYLOAD)
+
+    run(pool, scenario)
+
+    # Every attempt fails over across both endpoints
+    assert pool.retries == 2
+    assert a.hits + b.hits == 6
+
+
+def test_rate_limited_provider_raises_rate_limited_error(monkeypatch):
+    monkeypatch.setattr(rpc_pool, 'RPC_RETRY_BASE_MS', 1)
+    limited = StubProvider('limited', status=429)
+    pool = make_pool(limited, max_retries=1)
+
+    async def scenario():
+        with pytest.raises(RateLimitedError):
+            await pool.post(PAYLOAD)
+
+    run(pool, scenario)
+
+    assert limited.hits == 2
+
+
+def test_batch_post_charges_one_token_per_call():
+    provider = StubProvider('rpc')
+    pool = make_pool(provider)
+    pool.limiter = AdaptiveRateLimiter(1000, 100)
+    batch = [dict(PAYLOAD[0], id=i) for i in range(50)]
+
+    async def scenario():
+        await pool.post(batch)
+        await pool.post(PAYLOAD)
+
+    run(pool, scenario)
+
+    assert pool.limiter.stats()['tokens_acquired'] == 51
+
+
+async def _post_json(pool: RPCPool, url: str):
+    response = await pool.http.post(url, json=PAYLOAD)
+    response.raise_for_status()
+    return response.json()
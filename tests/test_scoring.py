@@ -0,0 +1,82 @@
+"""
+The vectorized re-scoring path scores exactly like calculate_score
+rescore.py writes calculate_scores_array results over scores that
+analyses produced with calculate_score, so the two must agree at every
+cap and on empty or missing metrics.
+"""
+
+import pytest
+
+from rescore import METRIC_FIELDS, metrics_to_columns, synthetic_metrics
+from server import ReputationEngine, WalletMetrics
+
+EDGE_CASES = {
+    'zero transactions': WalletMetrics(),
+    'volume at cap': WalletMetrics(transaction_count=5, total_volume=30000.0),
+    'volume above cap': WalletMetrics(transaction_count=5, total_volume=30000.01),
+    'age at cap': WalletMetrics(transaction_count=1, wallet_age_days=300),
+    'age above cap': WalletMetrics(transaction_count=1, wallet_age_days=301),
+    'every cap': WalletMetrics(
+        transaction_count=5000,
+        total_volume=30000.0,
+        contract_interactions=100,
+        wallet_age_days=300,
+        activity_frequency=5.0,
+        unique_programs=10
+    ),
+    'far past every cap': WalletMetrics(
+        transaction_count=10 ** 9,
+        total_volume=1e12,
+        contract_interactions=10 ** 6,
+        wallet_age_days=10 ** 5,
+        activity_frequency=1e6,
+        unique_programs=10 ** 4
+    ),
+    'just under every cap': WalletMetrics(
+        transaction_count=4999,
+        total_volume=29999.99,
+        contract_interactions=99,
+        wallet_age_days=299,
+        activity_frequency=4.99,
+        unique_programs=9
+    ),
+}
+
+
+def vectorized(metrics):
+    docs = [{'metrics': m.model_dump()} for m in metrics]
+    return ReputationEngine.calculate_scores_array(metrics_to_columns(docs)).tolist()
+
+
+@pytest.mark.parametrize('name', list(EDGE_CASES))
+def test_vectorized_score_matches_scalar_on_edge_cases(name):
+    metrics = EDGE_CASES[name]
+
+    [score] = vectorized([metrics])
+
+    assert score == pytest.approx(ReputationEngine.calculate_score(metrics), abs=1e-9)
+    assert round(score, 2) == round(ReputationEngine.calculate_score(metrics), 2)
+
+
+def test_scores_at_the_bounds():
+    [zero, capped, beyond] = vectorized([
+        EDGE_CASES['zero transactions'], EDGE_CASES['every cap'], EDGE_CASES['far past every cap']
+    ])
+
+    assert zero == 0.0
+    assert capped == beyond == ReputationEngine.MAX_SCORE
+
+
+def test_missing_metrics_score_as_zero():
+    docs = [{'metrics': None}, {}, {'metrics': {field: None for field in METRIC_FIELDS}}]
+
+    assert ReputationEngine.calculate_scores_array(metrics_to_columns(docs)).tolist() == [0.0, 0.0, 0.0]
+
+
+def test_vectorized_score_matches_scalar_on_synthetic_metrics():
+    docs = [{'metrics': metrics} for metrics in synthetic_metrics(2000, seed=7)]
+
+    scores = ReputationEngine.calculate_scores_array(metrics_to_columns(docs)).tolist()
+
+    for doc, score in zip(docs, scores):
+        assert round(score, 2) == round(ReputationEngine.calculate_score(WalletMetrics(**doc['metrics'])), 2)